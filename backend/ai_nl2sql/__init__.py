@@ -1,6 +1,6 @@
 from .db_introspection import introspect_database
 from .graph_builder import build_graph
-from .pipeline import run_pipeline
+from .pipeline import clear_plan_cache, run_pipeline
 from .rag import clear_store, get_rag_stats, invalidate_query, load_store
 from .sql_executor import execute_with_retry
-from .sql_generator import generate_sql
+from .sql_generator import clear_table_hints, generate_sql
@@ -92,6 +92,32 @@ def route_query_template(
             "path": ["suppliers", "purchase_orders"],
         }
 
+    if "monthly dispensing trend" in q and "drug_daily_usage" in tables:
+        if "2024" in q:
+            return {
+                "intent": "monthly_dispensing_2024",
+                "sql": (
+                    "SELECT EXTRACT(MONTH FROM usage_date) AS month, "
+                    "SUM(dispensed_quantity) AS total_quantity_dispensed "
+                    "FROM drug_daily_usage "
+                    "WHERE EXTRACT(YEAR FROM usage_date) = 2024 "
+                    "GROUP BY EXTRACT(MONTH FROM usage_date) "
+                    "ORDER BY month"
+                ),
+                "path": ["drug_daily_usage"],
+            }
+        return {
+            "intent": "monthly_dispensing",
+            "sql": (
+                "SELECT EXTRACT(YEAR FROM usage_date) AS year, EXTRACT(MONTH FROM usage_date) AS month, "
+                "SUM(dispensed_quantity) AS total_quantity_dispensed "
+                "FROM drug_daily_usage "
+                "GROUP BY EXTRACT(YEAR FROM usage_date), EXTRACT(MONTH FROM usage_date) "
+                "ORDER BY year, month"
+            ),
+            "path": ["drug_daily_usage"],
+        }
+
     if "monthly dispensing trend" in q and "dispensing_records" in tables:
         if "2024" in q:
             return {
@@ -64,6 +64,7 @@ TABLE_DESCRIPTIONS = {
     "prescriptions": "prescriptions written by doctors",
     "prescription_items": "drug and quantity prescribed",
     "dispensing_records": "dispensed drugs quantities and dates",
+    "drug_daily_usage": "daily dispensed and prescribed quantities per drug",
     "audit_logs": "audit history and actions",
     "notifications": "notifications and alerts",
 }
@@ -89,6 +89,10 @@ def _cache_set(query: str, excluded: set[str], candidates: list[dict]) -> None:
         _PLAN_CACHE.popitem(last=False)
 
 
+def clear_plan_cache() -> None:
+    _PLAN_CACHE.clear()
+
+
 def _intent_priority_tables(query: str) -> list[str]:
     q = _normalize_query(query)
     priorities: list[str] = []
@@ -65,6 +65,7 @@ TABLE_DESCRIPTIONS = {
     "prescriptions": "prescriptions written by doctors",
     "prescription_items": "drug and quantity prescribed",
     "dispensing_records": "dispensed drugs quantities and dates",
+    "drug_daily_usage": "daily dispensed and prescribed quantities per drug",
     "audit_logs": "audit history and actions",
     "notifications": "notifications and alerts",
 }
@@ -185,6 +186,7 @@ def _is_legacy_table(table: str) -> bool:
         "prescriptions",
         "prescription_items",
         "dispensing_records",
+        "drug_daily_usage",
         "audit_logs",
         "notifications",
     }
@@ -9,6 +9,10 @@ _TABLE_HINT_CACHE: dict[tuple[str, str], tuple[datetime, str]] = {}
 HINT_CACHE_TTL_SECONDS = int(os.getenv("AI_HINT_CACHE_TTL_SECONDS", "900"))
 
 
+def clear_table_hints() -> None:
+    _TABLE_HINT_CACHE.clear()
+
+
 def _extract_top_n(query: str, default: int = 10) -> int:
     match = re.search(r"\btop\s+(\d+)\b", (query or "").lower())
     if not match:
@@ -224,6 +228,24 @@ def generate_sql(
             "ORDER BY total_prescriptions DESC"
         )
 
+    if "monthly dispensing trend" in q and "drug_daily_usage" in schema:
+        if "2024" in q:
+            return (
+                "SELECT EXTRACT(MONTH FROM usage_date) AS month, "
+                "SUM(dispensed_quantity) AS total_quantity_dispensed "
+                "FROM drug_daily_usage "
+                "WHERE EXTRACT(YEAR FROM usage_date) = 2024 "
+                "GROUP BY EXTRACT(MONTH FROM usage_date) "
+                "ORDER BY month"
+            )
+        return (
+            "SELECT EXTRACT(YEAR FROM usage_date) AS year, EXTRACT(MONTH FROM usage_date) AS month, "
+            "SUM(dispensed_quantity) AS total_quantity_dispensed "
+            "FROM drug_daily_usage "
+            "GROUP BY EXTRACT(YEAR FROM usage_date), EXTRACT(MONTH FROM usage_date) "
+            "ORDER BY year, month"
+        )
+
     if "monthly dispensing trend" in q and "dispensing_records" in schema:
         if "2024" in q:
             return (
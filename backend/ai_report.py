@@ -18,7 +18,9 @@ from sqlalchemy.orm import Session
 
 from ai_nl2sql import (
     build_graph,
+    clear_plan_cache,
     clear_store,
+    clear_table_hints,
     execute_with_retry,
     generate_sql,
     get_rag_stats,
@@ -30,6 +32,7 @@ from ai_nl2sql import (
 from ai_nl2sql.intent_router import route_query_template
 from ai_nl2sql.schema_linker import get_relevant_tables
 from audit import log_action
+from change_feed import SCHEMA_TOPIC, subscribe
 from database import get_db
 from deps import get_current_user, require_permission
 from models import User
@@ -78,12 +81,25 @@ class QueryDebugResponse(BaseModel):
 
 def _ensure_loaded() -> tuple[dict, object]:
     global _SCHEMA, _GRAPH
-    if _SCHEMA is None:
-        _SCHEMA = introspect_database()
-        _GRAPH = build_graph(_SCHEMA)
-    assert _SCHEMA is not None
-    assert _GRAPH is not None
-    return _SCHEMA, _GRAPH
+    # Read both once: _reset_schema may clear them from the change-feed thread at any point.
+    schema, graph = _SCHEMA, _GRAPH
+    if schema is None or graph is None:
+        schema = introspect_database()
+        graph = build_graph(schema)
+        _SCHEMA, _GRAPH = schema, graph
+    return schema, graph
+
+
+def _reset_schema(_topic: str) -> None:
+    """Drop the introspected schema and everything derived from it after a migration."""
+    global _SCHEMA, _GRAPH
+    _SCHEMA = None
+    _GRAPH = None
+    clear_plan_cache()
+    clear_table_hints()
+
+
+subscribe([SCHEMA_TOPIC], _reset_schema)
 
 
 def _is_cached(question: str, sql: str) -> bool:
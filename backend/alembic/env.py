@@ -2,20 +2,29 @@ from logging.config import fileConfig
 import os
 
 from alembic import context
-from sqlalchemy import engine_from_config, pool
+from sqlalchemy import engine_from_config, pool, text
 
+from change_feed import CHANNEL, SCHEMA_TOPIC
 from database import Base
 from models import (  # noqa: F401 — import all models for alembic autogenerate
     AuditLog,
+    BulkImportError,
+    BulkImportJob,
     DispensingRecord,
     Drug,
     DrugBatch,
+    DrugDailyUsage,
+    DrugForecastModel,
+    DrugForecastState,
+    DrugStock,
+    ForecastBacktestMetric,
     Notification,
     Patient,
     Prescription,
     PrescriptionItem,
     PurchaseOrder,
     PurchaseOrderItem,
+    ReorderSnapshot,
     Role,
     Supplier,
     User,
@@ -63,6 +72,8 @@ def run_migrations_online() -> None:
 
         with context.begin_transaction():
             context.run_migrations()
+            # Running workers drop their schema-derived caches once the upgrade commits.
+            connection.execute(text("SELECT pg_notify(:channel, :topic)"), {"channel": CHANNEL, "topic": SCHEMA_TOPIC})
 
 
 if context.is_offline_mode():
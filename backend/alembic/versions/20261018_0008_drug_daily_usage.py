@@ -0,0 +1,64 @@
+"""Add drug_daily_usage rollup table and backfill it from history
+
+Revision ID: 20261018_0008
+Revises: 20260326_0007
+Create Date: 2026-10-18 09:00:00.000000
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+revision: str = "20261018_0008"
+down_revision: Union[str, Sequence[str], None] = "20260326_0007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if "drug_daily_usage" in inspector.get_table_names():
+        return
+
+    op.create_table(
+        "drug_daily_usage",
+        sa.Column("drug_id", sa.Integer(), sa.ForeignKey("drugs.drug_id"), primary_key=True),
+        sa.Column("usage_date", sa.Date(), primary_key=True),
+        sa.Column("dispensed_quantity", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("dispensed_events", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("prescribed_quantity", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("prescribed_events", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.create_index("ix_drug_daily_usage_usage_date", "drug_daily_usage", ["usage_date"])
+
+    op.execute(
+        """
+        INSERT INTO drug_daily_usage (drug_id, usage_date, dispensed_quantity, dispensed_events)
+        SELECT db.drug_id, CAST(dr.dispensed_at AS DATE), SUM(dr.quantity_dispensed), COUNT(dr.record_id)
+        FROM dispensing_records dr
+        JOIN drug_batches db ON db.batch_id = dr.batch_id
+        GROUP BY db.drug_id, CAST(dr.dispensed_at AS DATE)
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO drug_daily_usage (drug_id, usage_date, prescribed_quantity, prescribed_events)
+        SELECT pi.drug_id, CAST(p.created_at AS DATE), SUM(pi.quantity_prescribed), COUNT(pi.item_id)
+        FROM prescription_items pi
+        JOIN prescriptions p ON p.prescription_id = pi.prescription_id
+        WHERE pi.quantity_prescribed > 0
+        GROUP BY pi.drug_id, CAST(p.created_at AS DATE)
+        ON CONFLICT (drug_id, usage_date) DO UPDATE
+        SET prescribed_quantity = EXCLUDED.prescribed_quantity,
+            prescribed_events = EXCLUDED.prescribed_events
+        """
+    )
+
+
+def downgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if "drug_daily_usage" in inspector.get_table_names():
+        op.drop_index("ix_drug_daily_usage_usage_date", table_name="drug_daily_usage")
+        op.drop_table("drug_daily_usage")
@@ -0,0 +1,41 @@
+"""Add reorder_snapshots table for precomputed reorder recommendations
+
+Revision ID: 20261018_0009
+Revises: 20261018_0008
+Create Date: 2026-10-18 10:00:00.000000
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+revision: str = "20261018_0009"
+down_revision: Union[str, Sequence[str], None] = "20261018_0008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if "reorder_snapshots" in inspector.get_table_names():
+        return
+
+    op.create_table(
+        "reorder_snapshots",
+        sa.Column("snapshot_id", sa.Integer(), primary_key=True),
+        sa.Column("as_of_date", sa.Date(), nullable=False),
+        sa.Column("window_days", sa.Integer(), nullable=False),
+        sa.Column("payload_version", sa.Integer(), nullable=False),
+        sa.Column("version", sa.Integer(), nullable=False),
+        sa.Column("payload", sa.Text(), nullable=False),
+        sa.Column("computed_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.UniqueConstraint("as_of_date", "window_days", "payload_version", "version", name="uq_reorder_snapshots_key_version"),
+    )
+
+
+def downgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if "reorder_snapshots" in inspector.get_table_names():
+        op.drop_table("reorder_snapshots")
@@ -0,0 +1,52 @@
+"""Add drug_forecast_state table for incremental reorder forecasting
+
+Revision ID: 20261018_0011
+Revises: 20261018_0010
+Create Date: 2026-10-18 12:00:00.000000
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+revision: str = "20261018_0011"
+down_revision: Union[str, Sequence[str], None] = "20261018_0010"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if "drug_forecast_state" in inspector.get_table_names():
+        return
+
+    # Rows are seeded by the first reorder recompute, so there is nothing to backfill here.
+    op.create_table(
+        "drug_forecast_state",
+        sa.Column("drug_id", sa.Integer(), sa.ForeignKey("drugs.drug_id"), primary_key=True),
+        sa.Column("window_days", sa.Integer(), nullable=False),
+        sa.Column("window_end", sa.Date(), nullable=False),
+        sa.Column("fitted_on", sa.Date(), nullable=False),
+        sa.Column("clip_upper", sa.Float(), nullable=False),
+        sa.Column("mean", sa.Float(), nullable=False),
+        sa.Column("m2", sa.Float(), nullable=False),
+        sa.Column("sum_ty", sa.Float(), nullable=False),
+        sa.Column("head_sum", sa.Float(), nullable=False),
+        sa.Column("head_sq", sa.Float(), nullable=False),
+        sa.Column("lag_products", sa.Float(), nullable=False),
+        sa.Column("clipped_count", sa.Integer(), nullable=False),
+        sa.Column("last_raw", sa.Float(), nullable=False),
+        sa.Column("mae", sa.Float(), nullable=False),
+        sa.Column("rmse", sa.Float(), nullable=False),
+        sa.Column("mape", sa.Float(), nullable=False),
+        sa.Column("tail", sa.Text(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+    )
+
+
+def downgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if "drug_forecast_state" in inspector.get_table_names():
+        op.drop_table("drug_forecast_state")
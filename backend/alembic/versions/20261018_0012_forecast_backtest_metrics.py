@@ -0,0 +1,42 @@
+"""Add forecast_backtest_metrics table for rolling-origin forecast evaluation
+
+Revision ID: 20261018_0012
+Revises: 20261018_0011
+Create Date: 2026-10-18 13:00:00.000000
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+revision: str = "20261018_0012"
+down_revision: Union[str, Sequence[str], None] = "20261018_0011"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if "forecast_backtest_metrics" in inspector.get_table_names():
+        return
+
+    op.create_table(
+        "forecast_backtest_metrics",
+        sa.Column("drug_id", sa.Integer(), sa.ForeignKey("drugs.drug_id"), primary_key=True),
+        sa.Column("horizon_days", sa.Integer(), primary_key=True),
+        sa.Column("as_of_date", sa.Date(), nullable=False),
+        sa.Column("window_days", sa.Integer(), nullable=False),
+        sa.Column("cutoffs", sa.Integer(), nullable=False),
+        sa.Column("mae", sa.Float(), nullable=False),
+        sa.Column("rmse", sa.Float(), nullable=False),
+        sa.Column("mape", sa.Float(), nullable=False),
+        sa.Column("evaluated_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+    )
+
+
+def downgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if "forecast_backtest_metrics" in inspector.get_table_names():
+        op.drop_table("forecast_backtest_metrics")
@@ -0,0 +1,59 @@
+"""Add drug_forecast_models and key forecast_backtest_metrics by forecaster
+
+Revision ID: 20261018_0013
+Revises: 20261018_0012
+Create Date: 2026-10-18 14:00:00.000000
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+revision: str = "20261018_0013"
+down_revision: Union[str, Sequence[str], None] = "20261018_0012"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+
+    metric_columns = {c["name"] for c in inspector.get_columns("forecast_backtest_metrics")}
+    if "model" not in metric_columns:
+        op.add_column(
+            "forecast_backtest_metrics",
+            sa.Column("model", sa.String(length=30), nullable=False, server_default="trend"),
+        )
+        pk_name = inspector.get_pk_constraint("forecast_backtest_metrics").get("name") or "forecast_backtest_metrics_pkey"
+        op.drop_constraint(pk_name, "forecast_backtest_metrics", type_="primary")
+        op.create_primary_key(
+            "forecast_backtest_metrics_pkey", "forecast_backtest_metrics", ["drug_id", "horizon_days", "model"]
+        )
+
+    if "drug_forecast_models" not in inspector.get_table_names():
+        op.create_table(
+            "drug_forecast_models",
+            sa.Column("drug_id", sa.Integer(), sa.ForeignKey("drugs.drug_id"), primary_key=True),
+            sa.Column("model", sa.String(length=30), nullable=False),
+            sa.Column("window_days", sa.Integer(), nullable=False),
+            sa.Column("fitted_through", sa.Date(), nullable=False),
+            sa.Column("clip_upper", sa.Float(), nullable=False),
+            sa.Column("params", sa.Text(), nullable=False),
+            sa.Column("selection_mae", sa.Float(), nullable=False),
+            sa.Column("updated_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        )
+
+
+def downgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if "drug_forecast_models" in inspector.get_table_names():
+        op.drop_table("drug_forecast_models")
+
+    metric_columns = {c["name"] for c in inspector.get_columns("forecast_backtest_metrics")}
+    if "model" in metric_columns:
+        op.execute("DELETE FROM forecast_backtest_metrics WHERE model <> 'trend'")
+        op.drop_constraint("forecast_backtest_metrics_pkey", "forecast_backtest_metrics", type_="primary")
+        op.drop_column("forecast_backtest_metrics", "model")
+        op.create_primary_key("forecast_backtest_metrics_pkey", "forecast_backtest_metrics", ["drug_id", "horizon_days"])
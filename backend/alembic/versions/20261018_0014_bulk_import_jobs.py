@@ -0,0 +1,62 @@
+"""Add bulk_import_jobs and bulk_import_errors
+
+Revision ID: 20261018_0014
+Revises: 20261018_0013
+Create Date: 2026-10-18 15:00:00.000000
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+revision: str = "20261018_0014"
+down_revision: Union[str, Sequence[str], None] = "20261018_0013"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    tables = inspector.get_table_names()
+
+    if "bulk_import_jobs" not in tables:
+        op.create_table(
+            "bulk_import_jobs",
+            sa.Column("job_id", sa.Integer(), primary_key=True),
+            sa.Column("filename", sa.String(length=255), nullable=False),
+            sa.Column("file_path", sa.String(length=500), nullable=False),
+            sa.Column("status", sa.String(length=20), nullable=False, server_default="queued"),
+            sa.Column("created_by_user_id", sa.Integer(), sa.ForeignKey("users.user_id"), nullable=True),
+            sa.Column("rows_parsed", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("rows_inserted", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("rows_failed", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("created_drugs", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("created_suppliers", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("error", sa.Text(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+            sa.Column("started_at", sa.DateTime(), nullable=True),
+            sa.Column("finished_at", sa.DateTime(), nullable=True),
+        )
+        op.create_index("ix_bulk_import_jobs_job_id", "bulk_import_jobs", ["job_id"])
+
+    if "bulk_import_errors" not in tables:
+        op.create_table(
+            "bulk_import_errors",
+            sa.Column("error_id", sa.Integer(), primary_key=True),
+            sa.Column("job_id", sa.Integer(), sa.ForeignKey("bulk_import_jobs.job_id"), nullable=False),
+            sa.Column("row_no", sa.Integer(), nullable=False),
+            sa.Column("error", sa.Text(), nullable=False),
+        )
+        op.create_index("ix_bulk_import_errors_error_id", "bulk_import_errors", ["error_id"])
+        op.create_index("ix_bulk_import_errors_job_id", "bulk_import_errors", ["job_id"])
+
+
+def downgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    tables = inspector.get_table_names()
+    if "bulk_import_errors" in tables:
+        op.drop_table("bulk_import_errors")
+    if "bulk_import_jobs" in tables:
+        op.drop_table("bulk_import_jobs")
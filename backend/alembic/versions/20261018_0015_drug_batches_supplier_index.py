@@ -0,0 +1,29 @@
+"""Index drug_batches.supplier_id for filtered inventory pages
+
+Revision ID: 20261018_0015
+Revises: 20261018_0014
+Create Date: 2026-10-18 16:00:00.000000
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+revision: str = "20261018_0015"
+down_revision: Union[str, Sequence[str], None] = "20261018_0014"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if "ix_drug_batches_supplier_id" not in {ix["name"] for ix in inspector.get_indexes("drug_batches")}:
+        op.create_index("ix_drug_batches_supplier_id", "drug_batches", ["supplier_id"])
+
+
+def downgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if "ix_drug_batches_supplier_id" in {ix["name"] for ix in inspector.get_indexes("drug_batches")}:
+        op.drop_index("ix_drug_batches_supplier_id", table_name="drug_batches")
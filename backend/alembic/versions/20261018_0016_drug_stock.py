@@ -0,0 +1,52 @@
+"""Add drug_stock per-drug stock counters
+
+Revision ID: 20261018_0016
+Revises: 20261018_0015
+Create Date: 2026-10-18 17:00:00.000000
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+revision: str = "20261018_0016"
+down_revision: Union[str, Sequence[str], None] = "20261018_0015"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if "drug_stock" in inspector.get_table_names():
+        return
+
+    op.create_table(
+        "drug_stock",
+        sa.Column("drug_id", sa.Integer(), sa.ForeignKey("drugs.drug_id"), primary_key=True),
+        sa.Column("total_quantity", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("usable_quantity", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("active_batches", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("earliest_expiry", sa.Date(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+    )
+    op.execute(
+        """
+        INSERT INTO drug_stock (drug_id, total_quantity, usable_quantity, active_batches, earliest_expiry)
+        SELECT
+            drug_id,
+            COALESCE(SUM(quantity_available), 0),
+            COALESCE(SUM(quantity_available) FILTER (WHERE NOT is_expired), 0),
+            COUNT(*) FILTER (WHERE NOT is_expired AND quantity_available > 0),
+            MIN(expiry_date) FILTER (WHERE NOT is_expired AND quantity_available > 0)
+        FROM drug_batches
+        GROUP BY drug_id
+        """
+    )
+
+
+def downgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if "drug_stock" in inspector.get_table_names():
+        op.drop_table("drug_stock")
@@ -0,0 +1,49 @@
+"""Add trigram search indexes on drugs and patients
+
+Revision ID: 20261018_0017
+Revises: 20261018_0016
+Create Date: 2026-10-18 18:00:00.000000
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+revision: str = "20261018_0017"
+down_revision: Union[str, Sequence[str], None] = "20261018_0016"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TRIGRAM_INDEXES = (
+    ("ix_drugs_drug_name_trgm", "drugs", "drug_name"),
+    ("ix_drugs_generic_name_trgm", "drugs", "generic_name"),
+    ("ix_patients_name_trgm", "patients", "name"),
+    ("ix_patients_contact_trgm", "patients", "contact"),
+)
+
+# Case-insensitive exact lookups used by the bulk importer.
+LOWER_INDEXES = (
+    ("ix_drugs_lower_drug_name", "drugs", "drug_name"),
+    ("ix_suppliers_lower_name", "suppliers", "name"),
+)
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    for name, table, column in LOWER_INDEXES:
+        op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} (lower({column}))")
+
+    available = bind.execute(sa.text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")).scalar()
+    if not available:
+        # Search falls back to ILIKE matching until the server ships pg_trgm (postgresql-contrib).
+        return
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, table, column in TRIGRAM_INDEXES:
+        op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin ({column} gin_trgm_ops)")
+
+
+def downgrade() -> None:
+    for name, _table, _column in (*TRIGRAM_INDEXES, *LOWER_INDEXES):
+        op.execute(f"DROP INDEX IF EXISTS {name}")
@@ -0,0 +1,40 @@
+"""Move patient and batch id allocation onto their sequences
+
+Revision ID: 20261018_0018
+Revises: 20261018_0017
+Create Date: 2026-10-18 19:00:00.000000
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+revision: str = "20261018_0018"
+down_revision: Union[str, Sequence[str], None] = "20261018_0017"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Ids that used to be allocated as MAX + 1 left their sequences behind. Patient ids keep
+# starting above 10000, as they did before.
+SEQUENCE_FLOORS = (
+    ("patients", "patient_id", 10000),
+    ("drug_batches", "batch_id", 0),
+)
+
+
+def upgrade() -> None:
+    for table, column, floor in SEQUENCE_FLOORS:
+        op.execute(
+            f"""
+            SELECT setval(
+                pg_get_serial_sequence('{table}', '{column}'),
+                GREATEST((SELECT COALESCE(MAX({column}), 0) FROM {table}), {floor}, 1),
+                GREATEST((SELECT COALESCE(MAX({column}), 0) FROM {table}), {floor}) > 0
+            )
+            """
+        )
+
+
+def downgrade() -> None:
+    pass
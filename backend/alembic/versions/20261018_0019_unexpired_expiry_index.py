@@ -0,0 +1,34 @@
+"""Partial index on drug_batches (expiry_date, batch_id) for unexpired batches
+
+Revision ID: 20261018_0019
+Revises: 20261018_0018
+Create Date: 2026-10-18 20:00:00.000000
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+revision: str = "20261018_0019"
+down_revision: Union[str, Sequence[str], None] = "20261018_0018"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if "ix_drug_batches_unexpired_expiry" not in {ix["name"] for ix in inspector.get_indexes("drug_batches")}:
+        op.create_index(
+            "ix_drug_batches_unexpired_expiry",
+            "drug_batches",
+            ["expiry_date", "batch_id"],
+            postgresql_where=sa.text("NOT is_expired"),
+        )
+
+
+def downgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if "ix_drug_batches_unexpired_expiry" in {ix["name"] for ix in inspector.get_indexes("drug_batches")}:
+        op.drop_index("ix_drug_batches_unexpired_expiry", table_name="drug_batches")
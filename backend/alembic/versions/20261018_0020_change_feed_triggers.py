@@ -0,0 +1,48 @@
+"""NOTIFY healthora_changes when cached tables change
+
+Revision ID: 20261018_0020
+Revises: 20261018_0019
+Create Date: 2026-10-18 21:00:00.000000
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+revision: str = "20261018_0020"
+down_revision: Union[str, Sequence[str], None] = "20261018_0019"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+NOTIFY_TABLES = ("drug_batches", "dispensing_records", "purchase_orders", "drugs", "patients")
+
+
+def upgrade() -> None:
+    # Statement-level, and Postgres folds identical payloads within a transaction, so a bulk import
+    # sends one notification per table on commit.
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION healthora_notify_change() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('healthora_changes', TG_TABLE_NAME);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    for table in NOTIFY_TABLES:
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_notify_change ON {table}")
+        op.execute(
+            f"""
+            CREATE TRIGGER {table}_notify_change
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+            FOR EACH STATEMENT EXECUTE FUNCTION healthora_notify_change()
+            """
+        )
+
+
+def downgrade() -> None:
+    for table in NOTIFY_TABLES:
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_notify_change ON {table}")
+    op.execute("DROP FUNCTION IF EXISTS healthora_notify_change()")
@@ -0,0 +1,39 @@
+"""Add users.token_version for token revocation
+
+Revision ID: 20261018_0021
+Revises: 20261018_0020
+Create Date: 2026-10-18 22:00:00.000000
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+revision: str = "20261018_0021"
+down_revision: Union[str, Sequence[str], None] = "20261018_0020"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if "token_version" not in {col["name"] for col in inspector.get_columns("users")}:
+        op.add_column("users", sa.Column("token_version", sa.Integer(), nullable=False, server_default="0"))
+    # Cached token claims in every worker are dropped when a change could revoke them (not on logins).
+    op.execute("DROP TRIGGER IF EXISTS users_notify_change ON users")
+    op.execute(
+        """
+        CREATE TRIGGER users_notify_change
+        AFTER UPDATE OF username, role_id, is_active, token_version OR DELETE OR TRUNCATE ON users
+        FOR EACH STATEMENT EXECUTE FUNCTION healthora_notify_change()
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS users_notify_change ON users")
+    inspector = sa.inspect(op.get_bind())
+    if "token_version" in {col["name"] for col in inspector.get_columns("users")}:
+        op.drop_column("users", "token_version")
@@ -0,0 +1,44 @@
+"""Track wall-clock refits and usage watermarks on drug_forecast_state
+
+Revision ID: 20261018_0022
+Revises: 20261018_0021
+Create Date: 2026-10-18 23:00:00.000000
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+revision: str = "20261018_0022"
+down_revision: Union[str, Sequence[str], None] = "20261018_0021"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+NEW_COLUMNS = (
+    ("refitted_at", sa.DateTime()),
+    ("last_record_id", sa.Integer()),
+    ("last_item_id", sa.Integer()),
+)
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if "drug_forecast_state" not in inspector.get_table_names():
+        return
+    existing = {col["name"] for col in inspector.get_columns("drug_forecast_state")}
+    for name, column_type in NEW_COLUMNS:
+        if name not in existing:
+            # Existing rows stay NULL, so every drug is refitted on the next reorder refresh.
+            op.add_column("drug_forecast_state", sa.Column(name, column_type, nullable=True))
+
+
+def downgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if "drug_forecast_state" not in inspector.get_table_names():
+        return
+    existing = {col["name"] for col in inspector.get_columns("drug_forecast_state")}
+    for name, _column_type in NEW_COLUMNS:
+        if name in existing:
+            op.drop_column("drug_forecast_state", name)
@@ -0,0 +1,43 @@
+"""Add owner and heartbeat_at to bulk_import_jobs
+
+Revision ID: 20261018_0023
+Revises: 20261018_0022
+Create Date: 2026-10-18 23:30:00.000000
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+revision: str = "20261018_0023"
+down_revision: Union[str, Sequence[str], None] = "20261018_0022"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+NEW_COLUMNS = (
+    ("owner", sa.String(length=100)),
+    ("heartbeat_at", sa.DateTime()),
+)
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if "bulk_import_jobs" not in inspector.get_table_names():
+        return
+    existing = {col["name"] for col in inspector.get_columns("bulk_import_jobs")}
+    for name, column_type in NEW_COLUMNS:
+        if name not in existing:
+            # Jobs left running before the upgrade have no heartbeat and are taken over at startup.
+            op.add_column("bulk_import_jobs", sa.Column(name, column_type, nullable=True))
+
+
+def downgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if "bulk_import_jobs" not in inspector.get_table_names():
+        return
+    existing = {col["name"] for col in inspector.get_columns("bulk_import_jobs")}
+    for name, _column_type in NEW_COLUMNS:
+        if name in existing:
+            op.drop_column("bulk_import_jobs", name)
@@ -0,0 +1,32 @@
+"""NOTIFY healthora_changes when notifications change
+
+Revision ID: 20261018_0024
+Revises: 20261018_0023
+Create Date: 2026-10-19 00:00:00.000000
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+revision: str = "20261018_0024"
+down_revision: Union[str, Sequence[str], None] = "20261018_0023"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Dashboard streams in every worker resend a user's notifications when they are read or cleared.
+    op.execute("DROP TRIGGER IF EXISTS notifications_notify_change ON notifications")
+    op.execute(
+        """
+        CREATE TRIGGER notifications_notify_change
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON notifications
+        FOR EACH STATEMENT EXECUTE FUNCTION healthora_notify_change()
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS notifications_notify_change ON notifications")
@@ -5,6 +5,7 @@ import json
 from datetime import datetime
 from typing import Any, Optional
 
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 
 from models import AuditLog
@@ -31,3 +32,30 @@ def log_action(
     db.add(entry)
     # Flush but let the calling route commit so it's part of the same transaction
     db.flush()
+
+
+def log_actions(
+    db: Session,
+    action: str,
+    targets: list[tuple[Any, Optional[dict]]],
+    actor_user_id: Optional[int] = None,
+    target_table: Optional[str] = None,
+) -> None:
+    """Batch form of log_action for one action over many (target_id, detail) pairs."""
+    if not targets:
+        return
+    now = datetime.utcnow()
+    db.execute(
+        insert(AuditLog),
+        [
+            {
+                "actor_user_id": actor_user_id,
+                "action": action,
+                "target_table": target_table,
+                "target_id": str(target_id) if target_id is not None else None,
+                "detail": json.dumps(detail) if detail else None,
+                "timestamp": now,
+            }
+            for target_id, detail in targets
+        ],
+    )
@@ -59,7 +59,7 @@ def register_sysadmin(payload: RegisterSysAdminRequest, db: Session = Depends(ge
     db.commit()
     db.refresh(user)
 
-    token = create_access_token(subject=user.username, role=role.name)
+    token = create_access_token(subject=user.username, role=role.name, user_id=user.user_id, token_version=user.token_version)
     return LoginResponse(
         access_token=token,
         token=token,
@@ -100,7 +100,7 @@ def login(payload: LoginRequest, db: Session = Depends(get_db)):
 
     role_name = user.role.name
     display_name = user.role.display_name
-    token = create_access_token(subject=user.username, role=role_name)
+    token = create_access_token(subject=user.username, role=role_name, user_id=user.user_id, token_version=user.token_version)
     return LoginResponse(
         access_token=token,
         token=token,
@@ -0,0 +1,228 @@
+"""
+Forecast backtesting — rolling-origin evaluation of the reorder forecaster.
+
+For every active drug, every registered forecaster and each horizon in HORIZONS the model is
+refitted at several past cutoffs and scored against the usage that actually followed. The
+forecaster with the lowest error at ESTIMATE_HORIZON is then fitted on the latest window and its
+parameters are cached in drug_forecast_models. Drug shards are evaluated in a process pool; the
+pooled errors go to forecast_backtest_metrics, where the reorder payload picks them up.
+Run `python backtesting.py` to evaluate on demand.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from itertools import repeat
+
+import numpy as np
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import Drug, DrugForecastModel, ForecastBacktestMetric
+from reorder_recommendation import (
+    DEFAULT_FORECASTER,
+    ESTIMATE_HORIZON,
+    FORECASTERS,
+    _clip_outliers,
+    _clip_upper,
+    _fit_forecast,
+    _get_reference_date,
+    _load_usage_matrix,
+    _params_row,
+    _window_days,
+)
+
+logger = logging.getLogger("healthora.backtesting")
+
+HORIZONS = (7, 30, 60, 90)
+MIN_TRAIN_DAYS = 30
+BACKTEST_CUTOFFS = max(1, int(os.getenv("REORDER_BACKTEST_CUTOFFS", "8")))
+BACKTEST_STEP_DAYS = max(1, int(os.getenv("REORDER_BACKTEST_STEP_DAYS", "7")))
+BACKTEST_WORKERS = max(1, int(os.getenv("REORDER_BACKTEST_WORKERS", str(min(4, os.cpu_count() or 1)))))
+BACKTEST_SHARD_SIZE = max(1, int(os.getenv("REORDER_BACKTEST_SHARD_SIZE", "250")))
+SAVE_CHUNK_ROWS = 1000
+
+
+def _cutoffs(total_days: int, horizon: int, cutoffs: int, step_days: int) -> list[int]:
+    """Column indexes where training stops (exclusive), newest first; each leaves `horizon` days to score."""
+    points = []
+    for k in range(cutoffs):
+        cut = total_days - horizon - k * step_days
+        if cut < MIN_TRAIN_DAYS:
+            break
+        points.append(cut)
+    return points
+
+
+def evaluate_shard(
+    history: np.ndarray, window_days: int, horizons: tuple[int, ...], cutoffs: int, step_days: int
+) -> dict:
+    """Score every forecaster on one shard of drugs (rows of `history`) and fit the winner per drug.
+
+    Runs in a worker process, so it only touches the arrays it is given. Returns pooled
+    (cutoffs used, mae, rmse, mape) per (model, horizon) plus the chosen model and its parameters per row.
+    """
+    rows = history.shape[0]
+    metrics = {}
+    for name in FORECASTERS:
+        for horizon in horizons:
+            abs_sum = np.zeros(rows)
+            sq_sum = np.zeros(rows)
+            ape_sum = np.zeros(rows)
+            ape_count = np.zeros(rows)
+            used = 0
+            for cut in _cutoffs(history.shape[1], horizon, cutoffs, step_days):
+                train = history[:, max(0, cut - window_days) : cut]
+                actual = history[:, cut : cut + horizon]
+                errors = actual - _fit_forecast(name, train, horizon)
+                abs_sum += np.sum(np.abs(errors), axis=1)
+                sq_sum += np.sum(errors**2, axis=1)
+                positive = actual > 0
+                ape_sum += np.sum(np.where(positive, np.abs(errors) / np.where(positive, actual, 1.0) * 100.0, 0.0), axis=1)
+                ape_count += np.sum(positive, axis=1)
+                used += 1
+            if not used:
+                continue
+            points = used * horizon
+            mape = np.divide(ape_sum, ape_count, out=np.zeros(rows), where=ape_count > 0)
+            metrics[(name, horizon)] = (
+                used,
+                np.round(abs_sum / points, 2),
+                np.round(np.sqrt(sq_sum / points), 2),
+                np.round(np.minimum(999.0, mape), 2),
+            )
+
+    # Lowest MAE at the published horizon wins; ties keep the earlier-registered (simpler) model.
+    names = list(FORECASTERS)
+    scores = np.full((rows, len(names)), np.inf)
+    for col, name in enumerate(names):
+        if (name, ESTIMATE_HORIZON) in metrics:
+            scores[:, col] = metrics[(name, ESTIMATE_HORIZON)][1]
+    best = np.argmin(scores, axis=1)
+    if not np.isfinite(scores).any():
+        best[:] = names.index(DEFAULT_FORECASTER)
+
+    latest = history[:, -window_days:]
+    cleaned, _ = _clip_outliers(latest)
+    upper = _clip_upper(latest)
+    selected = [None] * rows
+    for col, name in enumerate(names):
+        members = np.flatnonzero(best == col)
+        if not len(members):
+            continue
+        params = FORECASTERS[name]["fit"](cleaned[members])
+        for pos, row in enumerate(members.tolist()):
+            selected[row] = (name, _params_row(params, pos), float(upper[row]), float(scores[row, col]))
+    return {"metrics": metrics, "selected": selected}
+
+
+def run_backtest(
+    db: Session,
+    workers: int = BACKTEST_WORKERS,
+    cutoffs: int = BACKTEST_CUTOFFS,
+    step_days: int = BACKTEST_STEP_DAYS,
+) -> int:
+    """Evaluate every active drug, upsert its metrics and chosen model; returns the metric rows written (caller commits)."""
+    as_of_date = _get_reference_date(db)
+    window_days = _window_days()
+    drug_ids = [d for (d,) in db.query(Drug.drug_id).filter(Drug.is_active.is_(True)).order_by(Drug.drug_id.asc()).all()]
+    if not drug_ids:
+        return 0
+
+    span = window_days + max(HORIZONS) + (cutoffs - 1) * step_days
+    start = as_of_date - timedelta(days=span - 1)
+    history, _ = _load_usage_matrix(db, drug_ids, start, as_of_date, only_listed=True)
+    shards = [(drug_ids[i : i + BACKTEST_SHARD_SIZE], history[i : i + BACKTEST_SHARD_SIZE]) for i in range(0, len(drug_ids), BACKTEST_SHARD_SIZE)]
+
+    shard_args = ([h for _, h in shards], repeat(window_days), repeat(HORIZONS), repeat(cutoffs), repeat(step_days))
+    if workers > 1 and len(shards) > 1:
+        # spawn, not fork: this also runs from the API process, whose threads must not be forked.
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=min(workers, len(shards)), mp_context=context) as pool:
+            results = list(pool.map(evaluate_shard, *shard_args))
+    else:
+        results = list(map(evaluate_shard, *shard_args))
+
+    evaluated_at = datetime.utcnow()
+    metric_rows = []
+    model_rows = []
+    for (shard_ids, _), shard_result in zip(shards, results):
+        for (name, horizon), (used, mae, rmse, mape) in shard_result["metrics"].items():
+            for row, drug_id in enumerate(shard_ids):
+                metric_rows.append(
+                    {
+                        "drug_id": drug_id,
+                        "horizon_days": horizon,
+                        "model": name,
+                        "as_of_date": as_of_date,
+                        "window_days": window_days,
+                        "cutoffs": used,
+                        "mae": float(mae[row]),
+                        "rmse": float(rmse[row]),
+                        "mape": float(mape[row]),
+                        "evaluated_at": evaluated_at,
+                    }
+                )
+        for drug_id, (name, params, upper, score) in zip(shard_ids, shard_result["selected"]):
+            model_rows.append(
+                {
+                    "drug_id": drug_id,
+                    "model": name,
+                    "window_days": window_days,
+                    "fitted_through": as_of_date,
+                    "clip_upper": upper,
+                    "params": json.dumps(params),
+                    "selection_mae": score if np.isfinite(score) else 0.0,
+                    "updated_at": evaluated_at,
+                }
+            )
+
+    _upsert(db, ForecastBacktestMetric, metric_rows, ["drug_id", "horizon_days", "model"])
+    _upsert(db, DrugForecastModel, model_rows, ["drug_id"])
+    return len(metric_rows)
+
+
+def _upsert(db: Session, model, values: list[dict], keys: list[str]) -> None:
+    for offset in range(0, len(values), SAVE_CHUNK_ROWS):
+        stmt = insert(model).values(values[offset : offset + SAVE_CHUNK_ROWS])
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[getattr(model, key) for key in keys],
+                set_={col: getattr(stmt.excluded, col) for col in values[0] if col not in keys},
+            )
+        )
+
+
+def run_scheduled_backtest() -> None:
+    """Scheduler entry point."""
+    db = SessionLocal()
+    try:
+        written = run_backtest(db)
+        db.commit()
+        logger.info("Stored %d forecast backtest metrics", written)
+    except Exception:
+        db.rollback()
+        logger.exception("Error running forecast backtest")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    parser = argparse.ArgumentParser(description="Backtest reorder forecasts over rolling origins and store the error metrics.")
+    parser.add_argument("--workers", type=int, default=BACKTEST_WORKERS, help="worker processes (1 runs inline)")
+    parser.add_argument("--cutoffs", type=int, default=BACKTEST_CUTOFFS, help="rolling origins per horizon")
+    parser.add_argument("--step-days", type=int, default=BACKTEST_STEP_DAYS, help="days between rolling origins")
+    args = parser.parse_args()
+
+    session = SessionLocal()
+    try:
+        total = run_backtest(session, workers=args.workers, cutoffs=args.cutoffs, step_days=args.step_days)
+        session.commit()
+        logger.info("Stored %d forecast backtest metrics", total)
+    finally:
+        session.close()
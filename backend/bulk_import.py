@@ -0,0 +1,592 @@
+"""
+Set-based drug batch import — resolves an upload against the database a chunk of rows at a time.
+
+Uploads are read as a stream of row dicts (`iter_csv_rows` / `iter_xlsx_rows`) and imported in
+chunks of BULK_IMPORT_CHUNK_ROWS, so memory stays flat however large the file is. Within a chunk,
+rows are checked in file order exactly as the one-row-at-a-time import did, but existing batch
+numbers, drugs and suppliers are prefetched with one IN query each, and new drugs, suppliers,
+batches and their audit rows are written with multi-row INSERT … RETURNING statements.
+
+Each chunk runs in a SAVEPOINT, so a row the database rejects only fails that row. Large uploads
+can run as background jobs instead: `create_job` stores the upload and queues it on a small thread
+pool, and `run_import_job` commits each chunk together with the job's progress and row errors
+(bulk_import_jobs / bulk_import_errors), so a failed or interrupted job resumes where it stopped.
+A running job is owned by one worker process, which refreshes the job's heartbeat with every chunk;
+`resume_interrupted_jobs` only takes over jobs whose heartbeat is older than BULK_IMPORT_STALE_SECONDS.
+"""
+import csv
+import logging
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from io import TextIOWrapper
+from itertools import chain, islice
+from typing import BinaryIO, Callable, Iterable, Iterator
+from xml.etree import ElementTree as ET
+from zipfile import ZipFile
+
+from sqlalchemy import func, insert, or_, update
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from audit import log_actions
+from database import SessionLocal
+from drug_stock import refresh_drug_stock
+from events import publish_on_commit
+from models import BulkImportError, BulkImportJob, Drug, DrugBatch, Supplier
+
+logger = logging.getLogger("healthora.bulk_import")
+
+CHUNK_ROWS = int(os.getenv("BULK_IMPORT_CHUNK_ROWS", "1000"))
+MAX_REPORTED_ERRORS = 100
+IMPORT_DIR = os.getenv("BULK_IMPORT_DIR", os.path.join(tempfile.gettempdir(), "healthora_imports"))
+IMPORT_WORKERS = int(os.getenv("BULK_IMPORT_WORKERS", "1"))
+# A running job whose heartbeat is older than this is treated as abandoned by a dead worker.
+STALE_SECONDS = int(os.getenv("BULK_IMPORT_STALE_SECONDS", "300"))
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+REQUIRED_COLUMNS = {
+    "drug_name",
+    "batch_no",
+    "expiry_date",
+    "purchase_price",
+    "selling_price",
+    "quantity_available",
+}
+
+_XLSX_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_XLSX_REL_ID = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+
+
+def _normalize_row_keys(row: dict[str, str]) -> dict[str, str]:
+    normalized = {}
+    for key, value in row.items():
+        norm = (key or "").strip().lower().replace(" ", "_")
+        normalized[norm] = (value or "").strip()
+    return normalized
+
+
+def iter_csv_rows(stream: BinaryIO) -> Iterator[dict[str, str]]:
+    """Rows of a CSV upload, decoded incrementally from the (spooled) binary stream."""
+    text = TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    try:
+        reader = csv.DictReader(text)
+        if not reader.fieldnames:
+            return
+        for row in reader:
+            yield _normalize_row_keys(row)
+    finally:
+        # Leave the upload's own file open for its owner to close.
+        if not stream.closed:
+            text.detach()
+
+
+def _xlsx_shared_strings(archive: ZipFile) -> list[str]:
+    if "xl/sharedStrings.xml" not in archive.namelist():
+        return []
+    strings: list[str] = []
+    with archive.open("xl/sharedStrings.xml") as stream:
+        root = None
+        for event, elem in ET.iterparse(stream, events=("start", "end")):
+            if root is None:
+                root = elem
+            if event == "end" and elem.tag == f"{_XLSX_NS}si":
+                strings.append("".join((t.text or "") for t in elem.iter(f"{_XLSX_NS}t")))
+                root.clear()
+    return strings
+
+
+def _xlsx_first_sheet(archive: ZipFile) -> str | None:
+    workbook = ET.fromstring(archive.read("xl/workbook.xml"))
+    rels = ET.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+    rel_map = {node.attrib["Id"]: node.attrib["Target"] for node in rels}
+    sheet = workbook.find(f"{_XLSX_NS}sheets/{_XLSX_NS}sheet")
+    if sheet is None:
+        return None
+    target = rel_map[sheet.attrib[_XLSX_REL_ID]].lstrip("/")
+    return target if target.startswith("xl/") else f"xl/{target}"
+
+
+def iter_xlsx_rows(stream: BinaryIO) -> Iterator[dict[str, str]]:
+    """Rows of the first sheet of an XLSX upload, parsed with iterparse one <row> at a time."""
+    with ZipFile(stream) as archive:
+        shared = _xlsx_shared_strings(archive)
+        sheet_path = _xlsx_first_sheet(archive)
+        if sheet_path is None:
+            return
+        headers: list[str] | None = None
+        with archive.open(sheet_path) as sheet:
+            sheet_data = None
+            for event, elem in ET.iterparse(sheet, events=("start", "end")):
+                if event == "start":
+                    if elem.tag == f"{_XLSX_NS}sheetData":
+                        sheet_data = elem
+                    continue
+                if elem.tag != f"{_XLSX_NS}row":
+                    continue
+
+                values: list[str] = []
+                for cell in elem.findall(f"{_XLSX_NS}c"):
+                    node = cell.find(f"{_XLSX_NS}v")
+                    if node is None:
+                        values.append("")
+                        continue
+                    raw = node.text or ""
+                    if cell.attrib.get("t") == "s":
+                        idx = int(raw) if raw else 0
+                        values.append(shared[idx] if idx < len(shared) else "")
+                    else:
+                        values.append(raw)
+                # Drop the finished row (and anything before it) from the partial tree.
+                sheet_data.clear()
+
+                if not any(values):
+                    continue
+                if headers is None:
+                    headers = [h.strip().lower().replace(" ", "_") for h in values]
+                    continue
+                yield {head: (values[idx].strip() if idx < len(values) else "") for idx, head in enumerate(headers) if head}
+
+
+def header_problem(first_row: dict[str, str] | None) -> str | None:
+    """Why an upload whose first data row is `first_row` cannot be imported, or None."""
+    if first_row is None:
+        return "No data rows found"
+    missing_columns = REQUIRED_COLUMNS - set(first_row.keys())
+    if missing_columns:
+        return f"Missing required columns: {', '.join(sorted(missing_columns))}"
+    return None
+
+
+def _parse_date(value: str) -> date:
+    value = value.strip()
+    if value.replace(".", "", 1).isdigit():
+        serial = int(float(value))
+        return date(1899, 12, 30) + timedelta(days=serial)
+    for fmt in ("%Y-%m-%d", "%d-%m-%Y", "%d/%m/%Y", "%Y/%m/%d"):
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Invalid date '{value}'. Use YYYY-MM-DD")
+
+
+def _chunks(rows: Iterable[dict[str, str]], size: int) -> Iterator[list[dict[str, str]]]:
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+def _insert_returning(db: Session, model, values: list[dict], *columns) -> list[tuple]:
+    """Multi-row INSERT … RETURNING `columns`, with the returned rows in `values` order."""
+    if not values:
+        return []
+    stmt = insert(model).returning(*columns, sort_by_parameter_order=True)
+    return [tuple(row) for row in db.execute(stmt, values)]
+
+
+def _prefetch(db: Session, batch_nos: set[str], drug_keys: set[str], supplier_ids: set[int], supplier_keys: set[str]):
+    existing_batch_nos: set[str] = set()
+    if batch_nos:
+        existing_batch_nos = {
+            batch_no for (batch_no,) in db.query(DrugBatch.batch_no).filter(DrugBatch.batch_no.in_(batch_nos))
+        }
+
+    # Lowest id wins when several drugs or suppliers share a name case-insensitively.
+    drugs: dict[str, tuple[int, str]] = {}
+    if drug_keys:
+        rows = (
+            db.query(Drug.drug_id, Drug.drug_name)
+            .filter(func.lower(Drug.drug_name).in_(drug_keys))
+            .order_by(Drug.drug_id.desc())
+        )
+        drugs = {name.lower(): (drug_id, name) for drug_id, name in rows}
+
+    known_supplier_ids: set[int] = set()
+    suppliers: dict[str, int] = {}
+    if supplier_ids or supplier_keys:
+        rows = (
+            db.query(Supplier.supplier_id, Supplier.name)
+            .filter(or_(Supplier.supplier_id.in_(supplier_ids), func.lower(Supplier.name).in_(supplier_keys)))
+            .order_by(Supplier.supplier_id.desc())
+        )
+        for supplier_id, name in rows:
+            known_supplier_ids.add(supplier_id)
+            suppliers[name.lower()] = supplier_id
+    return existing_batch_nos, drugs, known_supplier_ids, suppliers
+
+
+def import_chunk(
+    db: Session,
+    rows: list[dict[str, str]],
+    seen_batch_nos: set[str],
+    actor_user_id: int | None = None,
+    first_row: int = 2,
+) -> dict:
+    """Import one chunk of upload rows; returns its counts and per-row errors. The caller commits.
+
+    `first_row` is the row number of rows[0] in the upload and `seen_batch_nos` carries the batch
+    numbers of earlier chunks, so duplicates across chunks are still reported as in-file duplicates.
+    The chunk's batch numbers are only added to it once every insert has succeeded.
+    """
+    errors: list[dict[str, str]] = []
+    candidates: list[tuple[int, dict[str, str], str, str]] = []
+    chunk_batch_nos: set[str] = set()
+    drug_keys: set[str] = set()
+    supplier_ids: set[int] = set()
+    supplier_keys: set[str] = set()
+
+    for idx, raw in enumerate(rows, start=first_row):
+        drug_name = raw.get("drug_name", "").strip()
+        batch_no = raw.get("batch_no", "").strip()
+        if not drug_name:
+            errors.append({"row": str(idx), "error": "drug_name is required"})
+            continue
+        if not batch_no:
+            errors.append({"row": str(idx), "error": "batch_no is required"})
+            continue
+        if batch_no in seen_batch_nos or batch_no in chunk_batch_nos:
+            errors.append({"row": str(idx), "error": "duplicate batch_no in file"})
+            continue
+        chunk_batch_nos.add(batch_no)
+        candidates.append((idx, raw, drug_name, batch_no))
+        drug_keys.add(drug_name.lower())
+
+        supplier_id_raw = raw.get("supplier_id", "").strip()
+        supplier_name_raw = raw.get("supplier_name", "").strip()
+        if supplier_id_raw:
+            try:
+                supplier_ids.add(int(float(supplier_id_raw)))
+            except ValueError:
+                pass
+        elif supplier_name_raw:
+            supplier_keys.add(supplier_name_raw.lower())
+
+    existing_batch_nos, drugs, known_supplier_ids, suppliers = _prefetch(
+        db, chunk_batch_nos, drug_keys, supplier_ids, supplier_keys
+    )
+
+    # New drugs and suppliers are keyed by lower-cased name until their ids come back.
+    new_drugs: dict[str, dict] = {}
+    new_suppliers: dict[str, dict] = {}
+    pending_batches: list[tuple[int, dict, str | int | None, str]] = []
+
+    for idx, raw, drug_name, batch_no in candidates:
+        try:
+            if batch_no in existing_batch_nos:
+                raise ValueError("batch_no already exists")
+
+            expiry_date = _parse_date(raw.get("expiry_date", "").strip())
+            purchase_price = float(raw.get("purchase_price", "").strip())
+            selling_price = float(raw.get("selling_price", "").strip())
+            quantity_available = int(float(raw.get("quantity_available", "").strip()))
+            if purchase_price < 0 or selling_price < 0 or quantity_available < 0:
+                raise ValueError("price/quantity cannot be negative")
+
+            drug_key = drug_name.lower()
+            if drug_key not in drugs and drug_key not in new_drugs:
+                new_drugs[drug_key] = {
+                    "drug_name": drug_name,
+                    "generic_name": raw.get("generic_name") or None,
+                    "formulation": raw.get("formulation") or "Tablet",
+                    "strength": raw.get("strength") or None,
+                    "schedule_type": raw.get("schedule_type") or "OTC",
+                    "low_stock_threshold": int(raw.get("low_stock_threshold") or 50),
+                    "is_active": True,
+                }
+
+            supplier_ref: str | int | None = None
+            supplier_id_raw = raw.get("supplier_id", "").strip()
+            supplier_name_raw = raw.get("supplier_name", "").strip()
+            if supplier_id_raw:
+                supplier_ref = int(float(supplier_id_raw))
+                if supplier_ref not in known_supplier_ids:
+                    raise ValueError(f"supplier_id {supplier_id_raw} not found")
+            elif supplier_name_raw:
+                supplier_ref = supplier_name_raw.lower()
+                if supplier_ref not in suppliers and supplier_ref not in new_suppliers:
+                    new_suppliers[supplier_ref] = {"name": supplier_name_raw, "is_active": True, "created_at": datetime.utcnow()}
+
+            batch = {
+                "batch_no": batch_no,
+                "expiry_date": expiry_date,
+                "purchase_price": purchase_price,
+                "selling_price": selling_price,
+                "quantity_available": quantity_available,
+                "is_expired": False,
+            }
+            pending_batches.append((idx, batch, supplier_ref, drug_key))
+        except Exception as exc:
+            errors.append({"row": str(idx), "error": str(exc)})
+
+    for drug_id, name in _insert_returning(db, Drug, list(new_drugs.values()), Drug.drug_id, Drug.drug_name):
+        drugs[name.lower()] = (drug_id, name)
+    for supplier_id, name in _insert_returning(db, Supplier, list(new_suppliers.values()), Supplier.supplier_id, Supplier.name):
+        suppliers[name.lower()] = supplier_id
+
+    batch_values = []
+    for _, batch, supplier_ref, drug_key in pending_batches:
+        batch["drug_id"] = drugs[drug_key][0]
+        batch["supplier_id"] = suppliers[supplier_ref] if isinstance(supplier_ref, str) else supplier_ref
+        batch_values.append(batch)
+    drug_names = {drug_id: name for drug_id, name in drugs.values()}
+    created = _insert_returning(db, DrugBatch, batch_values, DrugBatch.batch_id, DrugBatch.batch_no, DrugBatch.drug_id)
+    refresh_drug_stock(db, {drug_id for _, _, drug_id in created})
+    publish_on_commit(db, "batch", action="imported", count=len(created), drug_ids=sorted({drug_id for _, _, drug_id in created}))
+    log_actions(
+        db,
+        "bulk_add_batch",
+        [(batch_id, {"batch_no": batch_no, "drug_name": drug_names[drug_id]}) for batch_id, batch_no, drug_id in created],
+        actor_user_id=actor_user_id,
+        target_table="drug_batches",
+    )
+
+    seen_batch_nos |= chunk_batch_nos
+    errors.sort(key=lambda entry: int(entry["row"]))
+    return {
+        "total_rows": len(rows),
+        "created_batches": len(created),
+        "created_drugs": len(new_drugs),
+        "created_suppliers": len(new_suppliers),
+        "failed_rows": len(errors),
+        "errors": errors,
+    }
+
+
+def _import_chunk_isolated(
+    db: Session,
+    rows: list[dict[str, str]],
+    seen_batch_nos: set[str],
+    actor_user_id: int | None,
+    first_row: int,
+) -> dict:
+    """import_chunk inside a SAVEPOINT. If the database rejects the chunk (an over-long value, a
+    batch_no inserted concurrently, ...), the chunk is rolled back and replayed one row per
+    savepoint so only the offending rows fail."""
+    try:
+        with db.begin_nested():
+            return import_chunk(db, rows, seen_batch_nos, actor_user_id, first_row)
+    except DBAPIError:
+        logger.warning("Bulk import chunk at row %d rejected by the database, retrying row by row", first_row)
+
+    result = {"total_rows": len(rows), "created_batches": 0, "created_drugs": 0, "created_suppliers": 0, "failed_rows": 0, "errors": []}
+    for idx, raw in enumerate(rows, start=first_row):
+        try:
+            with db.begin_nested():
+                row_result = import_chunk(db, [raw], seen_batch_nos, actor_user_id, idx)
+        except DBAPIError as exc:
+            seen_batch_nos.add(raw.get("batch_no", "").strip())
+            detail = str(exc.orig).strip().splitlines()[0] if exc.orig is not None else str(exc)
+            row_result = {"failed_rows": 1, "errors": [{"row": str(idx), "error": f"database error: {detail}"}]}
+        for key in ("created_batches", "created_drugs", "created_suppliers", "failed_rows"):
+            result[key] += row_result.get(key, 0)
+        result["errors"].extend(row_result["errors"])
+    return result
+
+
+def _remember_batch_nos(seen_batch_nos: set[str], rows: Iterable[dict[str, str]]) -> int:
+    """Add the batch numbers an earlier run already consumed; returns how many rows were skipped."""
+    skipped = 0
+    for raw in rows:
+        skipped += 1
+        batch_no = raw.get("batch_no", "").strip()
+        if raw.get("drug_name", "").strip() and batch_no:
+            seen_batch_nos.add(batch_no)
+    return skipped
+
+
+def import_batches(
+    db: Session,
+    rows: Iterable[dict[str, str]],
+    actor_user_id: int | None = None,
+    on_chunk: Callable[[dict], None] | None = None,
+    first_row: int = 2,
+    seen_batch_nos: set[str] | None = None,
+) -> dict:
+    """Import a stream of upload rows chunk by chunk, each chunk in its own SAVEPOINT.
+
+    `on_chunk` is called with each chunk's result and may commit; otherwise the caller commits.
+    `first_row` and `seen_batch_nos` let a resumed import continue numbering and duplicate
+    detection. Only the first MAX_REPORTED_ERRORS row errors are kept in the summary,
+    `failed_rows` counts all of them.
+    """
+    summary = {"total_rows": 0, "created_batches": 0, "created_drugs": 0, "created_suppliers": 0, "failed_rows": 0, "errors": []}
+    seen_batch_nos = set() if seen_batch_nos is None else seen_batch_nos
+    for chunk in _chunks(rows, CHUNK_ROWS):
+        result = _import_chunk_isolated(db, chunk, seen_batch_nos, actor_user_id, first_row + summary["total_rows"])
+        for key in ("total_rows", "created_batches", "created_drugs", "created_suppliers", "failed_rows"):
+            summary[key] += result[key]
+        summary["errors"].extend(result["errors"][: MAX_REPORTED_ERRORS - len(summary["errors"])])
+        if on_chunk is not None:
+            on_chunk(result)
+    return summary
+
+
+# ─── Background jobs ─────────────────────────────────────────────────────────
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+_submitted: set[int] = set()  # job ids waiting in (or running on) this process's pool
+
+
+class _JobTakenOver(Exception):
+    """Another worker reclaimed the job after its heartbeat went stale."""
+
+
+def _submit(job_id: int) -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=IMPORT_WORKERS, thread_name_prefix="bulk-import")
+        if job_id in _submitted:
+            return
+        _submitted.add(job_id)
+    _executor.submit(_run_submitted, job_id)
+
+
+def _run_submitted(job_id: int) -> None:
+    try:
+        run_import_job(job_id)
+    finally:
+        with _executor_lock:
+            _submitted.discard(job_id)
+
+
+def create_job(db: Session, stream: BinaryIO, filename: str, user_id: int | None) -> BulkImportJob:
+    """Store the upload under IMPORT_DIR and queue it for import; commits the job row."""
+    os.makedirs(IMPORT_DIR, exist_ok=True)
+    path = os.path.join(IMPORT_DIR, f"{uuid.uuid4().hex}{os.path.splitext(filename)[1].lower()}")
+    with open(path, "wb") as out:
+        shutil.copyfileobj(stream, out)
+
+    job = BulkImportJob(filename=filename, file_path=path, status="queued", created_by_user_id=user_id)
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    _submit(job.job_id)
+    return job
+
+
+def run_import_job(job_id: int) -> None:
+    """Import a stored upload, committing every chunk together with the job's progress.
+
+    `rows_parsed` doubles as the resume cursor: a failed or interrupted job that is queued again
+    skips the rows already committed and carries on from the next chunk.
+    """
+    db = SessionLocal()
+    try:
+        claimed = (
+            db.query(BulkImportJob)
+            .filter(BulkImportJob.job_id == job_id, BulkImportJob.status == "queued")
+            .update(
+                {"status": "running", "error": None, "finished_at": None, "owner": WORKER_ID, "heartbeat_at": datetime.utcnow()},
+                synchronize_session=False,
+            )
+        )
+        db.commit()
+        if not claimed:
+            return
+        job = db.get(BulkImportJob, job_id)
+        if job.started_at is None:
+            job.started_at = datetime.utcnow()
+            db.commit()
+
+        def record_chunk(result: dict) -> None:
+            owned = (
+                db.query(BulkImportJob)
+                .filter(BulkImportJob.job_id == job_id, BulkImportJob.owner == WORKER_ID, BulkImportJob.status == "running")
+                .update({"heartbeat_at": datetime.utcnow()}, synchronize_session=False)
+            )
+            if not owned:
+                raise _JobTakenOver()
+            job.rows_parsed += result["total_rows"]
+            job.rows_inserted += result["created_batches"]
+            job.rows_failed += result["failed_rows"]
+            job.created_drugs += result["created_drugs"]
+            job.created_suppliers += result["created_suppliers"]
+            db.add_all(BulkImportError(job_id=job_id, row_no=int(e["row"]), error=e["error"]) for e in result["errors"])
+            db.commit()
+
+        try:
+            reader = iter_xlsx_rows if job.filename.lower().endswith(".xlsx") else iter_csv_rows
+            with open(job.file_path, "rb") as stream:
+                rows = reader(stream)
+                first = next(rows, None)
+                problem = header_problem(first)
+                if problem:
+                    raise ValueError(problem)
+                rows = chain([first], rows)
+                seen_batch_nos: set[str] = set()
+                committed = job.rows_parsed
+                if committed:
+                    _remember_batch_nos(seen_batch_nos, islice(rows, committed))
+                    logger.info("Resuming bulk import job %s after row %d", job_id, committed + 1)
+                import_batches(
+                    db,
+                    rows,
+                    job.created_by_user_id,
+                    on_chunk=record_chunk,
+                    first_row=2 + committed,
+                    seen_batch_nos=seen_batch_nos,
+                )
+            job.status = "completed"
+            os.remove(job.file_path)
+        except _JobTakenOver:
+            # The new owner carries on from the last committed chunk; leave the job row to it.
+            logger.warning("Bulk import job %s was taken over by another worker", job_id)
+            db.rollback()
+            return
+        except Exception as exc:
+            logger.exception("Bulk import job %s failed", job_id)
+            # Only the chunk in flight is lost; the upload is kept so the job can be resumed.
+            db.rollback()
+            job.status = "failed"
+            job.error = str(exc)
+        job.finished_at = datetime.utcnow()
+        db.commit()
+    finally:
+        db.close()
+
+
+def resume_job(db: Session, job: BulkImportJob) -> BulkImportJob:
+    """Queue a failed job again from its last committed chunk; commits."""
+    job.status = "queued"
+    db.commit()
+    db.refresh(job)
+    _submit(job.job_id)
+    return job
+
+
+def resume_interrupted_jobs() -> None:
+    """Requeue queued jobs and running jobs whose worker stopped sending heartbeats.
+
+    Runs at startup and every STALE_SECONDS. Stale jobs are claimed with one conditional UPDATE, so
+    when several workers look at once each job is taken over by exactly one of them; jobs still
+    running in a live worker are left alone.
+    """
+    db = SessionLocal()
+    try:
+        stale_before = datetime.utcnow() - timedelta(seconds=STALE_SECONDS)
+        reclaimed = db.execute(
+            update(BulkImportJob)
+            .where(
+                BulkImportJob.status == "running",
+                or_(BulkImportJob.heartbeat_at.is_(None), BulkImportJob.heartbeat_at < stale_before),
+            )
+            .values(status="queued", owner=WORKER_ID, heartbeat_at=datetime.utcnow())
+            .returning(BulkImportJob.job_id, BulkImportJob.rows_parsed)
+        ).all()
+        queued = db.query(BulkImportJob.job_id).filter(BulkImportJob.status == "queued").all()
+        db.commit()
+        for job_id, rows_parsed in reclaimed:
+            logger.info("Requeueing interrupted bulk import job %s at row %d", job_id, rows_parsed + 2)
+        # run_import_job claims queued jobs atomically, so a job queued in several workers still runs once.
+        for (job_id,) in queued:
+            _submit(job_id)
+    finally:
+        db.close()
@@ -0,0 +1,97 @@
+"""
+Process-wide caches for read-heavy endpoints.
+
+A TTLCache holds one computed value for up to `ttl_seconds` and is shared by every request in the
+process; concurrent misses wait for a single computation instead of each running the query. Writers
+call `invalidate_on_commit(db, cache)` in the transaction that changes the underlying rows, and the
+cache is dropped once that transaction commits. Commits made by other workers reach the cache through
+the change feed (see change_feed.subscribe).
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from change_feed import subscribe
+
+DASHBOARD_SUMMARY_TTL_SECONDS = int(os.getenv("DASHBOARD_SUMMARY_TTL_SECONDS", "30"))
+
+
+class TTLCache:
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._entry: tuple[Any, float, int] | None = None
+
+    def get(self, compute: Callable[[], Any]) -> Any:
+        with self._lock:
+            entry = self._entry
+            if entry is not None and entry[2] == self._generation and time.monotonic() < entry[1]:
+                return entry[0]
+            generation = self._generation
+            value = compute()
+            # An invalidation that landed while computing means the value may already be stale.
+            if generation == self._generation:
+                self._entry = (value, time.monotonic() + self.ttl_seconds, generation)
+            return value
+
+    def invalidate(self) -> None:
+        # Deliberately lock-free so writers never wait behind a running computation.
+        self._generation += 1
+
+
+class KeyedTTLCache:
+    """Up to `max_entries` values by key, each kept for `ttl_seconds`; the least recently used go first."""
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[Any, tuple[Any, float]] = OrderedDict()
+        self.generation = 0
+
+    def get(self, key: Any) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() >= entry[1]:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key: Any, value: Any, generation: int) -> None:
+        """Store `value` unless the cache was invalidated since `generation` was read."""
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+
+dashboard_summary_cache = TTLCache(DASHBOARD_SUMMARY_TTL_SECONDS)
+subscribe(("drug_batches", "drugs", "patients"), lambda _topic: dashboard_summary_cache.invalidate())
+
+
+def invalidate_on_commit(db: Session, *caches: TTLCache) -> None:
+    """Invalidate `caches` once the current transaction of `db` commits."""
+    db.info.setdefault("invalidate_on_commit", set()).update(caches)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session: Session) -> None:
+    for cache in session.info.pop("invalidate_on_commit", ()):
+        cache.invalidate()
@@ -0,0 +1,149 @@
+"""
+Cross-worker cache invalidation over PostgreSQL LISTEN/NOTIFY.
+
+Statement-level triggers (migrations 20261018_0020, 0021 and 0024) send the table name on CHANNEL
+when drug_batches, dispensing_records, purchase_orders, drugs, patients, users or notifications
+change, and every Alembic upgrade sends SCHEMA_TOPIC. Each worker runs one listener thread that hands the topics to the
+callbacks registered with `subscribe`. Notifications sent while the listener is disconnected are
+lost, so after every reconnect all subscribers are called once. Subscribers that already hear about
+this process's own commits another way (the event bus) can subscribe with `include_own=False`;
+notifications sent from this process's pooled connections then skip them.
+"""
+import logging
+import os
+import select
+import threading
+from typing import Callable, Iterable
+
+from sqlalchemy import event
+
+from database import engine
+
+logger = logging.getLogger("healthora.change_feed")
+
+CHANNEL = "healthora_changes"
+SCHEMA_TOPIC = "schema"
+CHANGE_FEED_ENABLED = os.getenv("CHANGE_FEED_ENABLED", "true").lower() == "true"
+RECONNECT_SECONDS = int(os.getenv("CHANGE_FEED_RECONNECT_SECONDS", "5"))
+POLL_SECONDS = 5
+
+_subscribers: dict[str, list[tuple[Callable[[str], None], bool]]] = {}
+_subscribers_lock = threading.Lock()
+_listener: "ChangeListener | None" = None
+# Backend pids of this process's pooled connections, to tell its own notifications apart.
+_own_backends: set[int] = set()
+
+
+@event.listens_for(engine, "connect")
+def _remember_backend(dbapi_connection, connection_record) -> None:
+    connection_record.info["backend_pid"] = dbapi_connection.get_backend_pid()
+    _own_backends.add(connection_record.info["backend_pid"])
+
+
+@event.listens_for(engine, "close")
+def _forget_backend(_dbapi_connection, connection_record) -> None:
+    # The server may hand the pid to another client's backend once this one exits.
+    _own_backends.discard(connection_record.info.pop("backend_pid", None))
+
+
+def subscribe(topics: Iterable[str], callback: Callable[[str], None], include_own: bool = True) -> None:
+    """Call `callback(topic)` whenever a transaction (in any worker) commits a change to a topic.
+
+    With `include_own=False` only commits made outside this process are reported.
+    """
+    with _subscribers_lock:
+        for topic in topics:
+            _subscribers.setdefault(topic, []).append((callback, include_own))
+
+
+def dispatch(topics: Iterable[str], own_only: Iterable[str] = ()) -> None:
+    """Call the subscribers of `topics`; those in `own_only` were changed by this process alone."""
+    own_only = set(own_only)
+    with _subscribers_lock:
+        targets = [
+            (topic, callback)
+            for topic in topics
+            for callback, include_own in _subscribers.get(topic, ())
+            if include_own or topic not in own_only
+        ]
+    called = set()
+    for topic, callback in targets:
+        # A callback subscribed to several of the topics only needs to run once.
+        if callback in called:
+            continue
+        called.add(callback)
+        try:
+            callback(topic)
+        except Exception:
+            logger.exception("Change feed subscriber failed for %s", topic)
+
+
+def _dispatch_all() -> None:
+    with _subscribers_lock:
+        topics = list(_subscribers)
+    dispatch(topics)
+
+
+class ChangeListener(threading.Thread):
+    def __init__(self):
+        super().__init__(name="change-feed", daemon=True)
+        self._stop_event = threading.Event()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    def run(self) -> None:
+        first_attempt = True
+        while not self._stop_event.is_set():
+            connection = None
+            try:
+                # A dedicated connection outside the pool; it stays in LISTEN for the worker's lifetime.
+                cargs, cparams = engine.dialect.create_connect_args(engine.url)
+                connection = engine.dialect.connect(*cargs, **cparams)
+                connection.autocommit = True
+                with connection.cursor() as cursor:
+                    cursor.execute(f"LISTEN {CHANNEL}")
+                logger.info("Listening for changes on %s", CHANNEL)
+                if not first_attempt:
+                    _dispatch_all()
+                self._listen(connection)
+            except Exception:
+                logger.exception("Change feed connection lost; reconnecting in %ss", RECONNECT_SECONDS)
+                self._stop_event.wait(RECONNECT_SECONDS)
+            finally:
+                if connection is not None:
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+            first_attempt = False
+
+    def _listen(self, connection) -> None:
+        while not self._stop_event.is_set():
+            if select.select([connection], [], [], POLL_SECONDS) == ([], [], []):
+                continue
+            connection.poll()
+            topics = []
+            remote = set()
+            while connection.notifies:
+                notify = connection.notifies.pop(0)
+                if notify.payload not in topics:
+                    topics.append(notify.payload)
+                if notify.pid not in _own_backends:
+                    remote.add(notify.payload)
+            dispatch(topics, own_only=[topic for topic in topics if topic not in remote])
+
+
+def start_listener() -> None:
+    global _listener
+    if not CHANGE_FEED_ENABLED or (_listener is not None and _listener.is_alive()):
+        return
+    _listener = ChangeListener()
+    _listener.start()
+
+
+def stop_listener() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -1,38 +1,239 @@
-from datetime import date
+import asyncio
+import json
+import logging
+import os
+from datetime import date, timedelta
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
-from database import get_db
-from deps import ROLE_MODULES, ROLE_PERMISSIONS, get_current_user, require_permission
-from models import DrugBatch, User
-from schemas import DashboardAccess
+from change_feed import subscribe
+from database import SessionLocal, get_db
+from deps import ROLE_MODULES, ROLE_PERMISSIONS, get_current_claims, get_current_user, require_permission
+from events import bus
+from inventory import dashboard_summary
+from models import Drug, DrugBatch, User
+from notifications import recent_notifications
+from schemas import AuthClaims, DashboardAccess
 
 router = APIRouter(prefix="/api", tags=["dashboard"])
+logger = logging.getLogger("healthora.dashboard")
+
+EXPIRY_MAX_LIMIT = int(os.getenv("DASHBOARD_EXPIRY_MAX_LIMIT", "500"))
+STREAM_SNAPSHOT_SECONDS = int(os.getenv("DASHBOARD_STREAM_SNAPSHOT_SECONDS", "30"))
+STREAM_DEBOUNCE_SECONDS = float(os.getenv("DASHBOARD_STREAM_DEBOUNCE_SECONDS", "0.5"))
+STREAM_QUEUE_SIZE = 64
+FEED_TABLES = ("drug_batches", "dispensing_records", "purchase_orders", "drugs", "patients", "notifications")
 
 
 @router.get("/dashboard-expiry", dependencies=[Depends(require_permission("view_dashboard_summary"))])
-def dashboard_expiry_list(db: Session = Depends(get_db)):
+def dashboard_expiry_list(horizon_days: int = 90, limit: int = 10, db: Session = Depends(get_db)):
+    """Unexpired batches expiring within `horizon_days`, soonest first."""
+    if horizon_days < 0 or limit < 1 or limit > EXPIRY_MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"horizon_days must be >= 0 and limit between 1 and {EXPIRY_MAX_LIMIT}")
     today = date.today()
-    batches = db.query(DrugBatch).all()
-    risk_rows = []
-    for batch in batches:
-        if batch.is_expired:
-            continue
-        days_left = (batch.expiry_date - today).days
-        if days_left <= 90:
-            risk_rows.append(
-                {
-                    "batch_id": batch.batch_id,
-                    "drug_name": batch.drug.drug_name,
-                    "batch_no": batch.batch_no,
-                    "expiry_date": batch.expiry_date,
-                    "days_left": days_left,
-                    "quantity_available": batch.quantity_available,
-                }
-            )
-    risk_rows.sort(key=lambda row: row["days_left"])
-    return risk_rows[:10]
+    # `NOT is_expired` (not `IS false`) so the planner can use the partial index ix_drug_batches_unexpired_expiry.
+    rows = (
+        db.query(DrugBatch.batch_id, Drug.drug_name, DrugBatch.batch_no, DrugBatch.expiry_date, DrugBatch.quantity_available)
+        .join(Drug, Drug.drug_id == DrugBatch.drug_id)
+        .filter(~DrugBatch.is_expired, DrugBatch.expiry_date <= today + timedelta(days=horizon_days))
+        .order_by(DrugBatch.expiry_date.asc(), DrugBatch.batch_id.asc())
+        .limit(limit)
+        .all()
+    )
+    return [
+        {
+            "batch_id": row.batch_id,
+            "drug_name": row.drug_name,
+            "batch_no": row.batch_no,
+            "expiry_date": row.expiry_date,
+            "days_left": (row.expiry_date - today).days,
+            "quantity_available": row.quantity_available,
+        }
+        for row in rows
+    ]
+
+
+def _dashboard_snapshot() -> dict:
+    db = SessionLocal()
+    try:
+        return jsonable_encoder({"summary": dashboard_summary(db), "expiry": dashboard_expiry_list(db=db)})
+    finally:
+        db.close()
+
+
+def _user_notifications(user_ids: set[int], generate: bool) -> dict[int, list]:
+    db = SessionLocal()
+    try:
+        return jsonable_encoder(recent_notifications(db, user_ids, generate))
+    finally:
+        db.close()
+
+
+def _snapshot_changes(previous: dict, current: dict) -> dict:
+    changes = {}
+    summary = {key: value for key, value in current["summary"].items() if previous["summary"].get(key) != value}
+    if summary:
+        changes["summary"] = summary
+    if current["expiry"] != previous["expiry"]:
+        changes["expiry"] = current["expiry"]
+    return changes
+
+
+class DashboardFeed:
+    """Fans one snapshot computation out to every open /api/dashboard/stream connection.
+
+    Committed bus events wake a single task on the event loop, which recomputes the snapshot once
+    (after a short debounce), reads the notifications of every connected user in one query, and
+    sends each client only the fields that changed. Every STREAM_SNAPSHOT_SECONDS the full snapshot
+    is sent as well, after generating any due notifications. The task stops when the last client
+    disconnects.
+    """
+
+    def __init__(self):
+        self._clients: dict[asyncio.Queue, int] = {}  # queue -> user_id
+        self._notifications: dict[asyncio.Queue, list] = {}  # notifications last sent to each client
+        self._events: list[dict] = []
+        self._snapshot: dict | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wake: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._start_lock: asyncio.Lock | None = None
+        bus.subscribe(self._on_event)
+        # Commits in other workers only reach this process through the change feed; this process's
+        # own commits already arrived on the bus.
+        subscribe(
+            FEED_TABLES, lambda table: self._on_event({"type": "table_changed", "table": table}), include_own=False
+        )
+
+    def _on_event(self, event: dict) -> None:
+        # Called on the committing (worker) thread.
+        loop = self._loop
+        if loop is not None and self._clients:
+            loop.call_soon_threadsafe(self._queue_event, event)
+
+    def _queue_event(self, event: dict) -> None:
+        self._events.append(event)
+        self._wake.set()
+
+    async def connect(self, user_id: int) -> asyncio.Queue:
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+        async with self._start_lock:
+            notifications = await asyncio.to_thread(_user_notifications, {user_id}, True)
+            if self._task is None or self._task.done():
+                self._loop = asyncio.get_running_loop()
+                self._wake = asyncio.Event()
+                self._events = []
+                self._snapshot = await asyncio.to_thread(_dashboard_snapshot)
+                self._task = asyncio.create_task(self._run())
+            # No await from here on: the task must not see an empty client set before this one is added.
+            queue = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+            self._clients[queue] = user_id
+            self._notifications[queue] = notifications.get(user_id, [])
+            queue.put_nowait(("snapshot", self._client_snapshot(queue)))
+        return queue
+
+    def disconnect(self, queue: asyncio.Queue) -> None:
+        self._clients.pop(queue, None)
+        self._notifications.pop(queue, None)
+        if not self._clients and self._wake is not None:
+            self._wake.set()
+
+    def _client_snapshot(self, queue: asyncio.Queue) -> dict:
+        return {**self._snapshot, "notifications": self._notifications[queue]}
+
+    def _send(self, queue: asyncio.Queue, event: str, data: dict) -> None:
+        if queue.full():
+            # A client this far behind gets the full state instead of the deltas it missed.
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(("snapshot", self._client_snapshot(queue)))
+        else:
+            queue.put_nowait((event, data))
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        next_snapshot = loop.time() + STREAM_SNAPSHOT_SECONDS
+        while self._clients:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=max(0.0, next_snapshot - loop.time()))
+            except asyncio.TimeoutError:
+                pass
+            if not self._clients:
+                break
+            if self._wake.is_set():
+                await asyncio.sleep(STREAM_DEBOUNCE_SECONDS)  # fold a burst of commits into one recompute
+                self._wake.clear()
+            full = loop.time() >= next_snapshot
+            if not self._events and not full:
+                continue
+            if full:
+                next_snapshot = loop.time() + STREAM_SNAPSHOT_SECONDS
+            events, self._events = self._events, []
+            clients = dict(self._clients)
+            try:
+                snapshot = await asyncio.to_thread(_dashboard_snapshot)
+                notifications = await asyncio.to_thread(_user_notifications, set(clients.values()), full)
+            except Exception:
+                logger.exception("Dashboard snapshot failed")
+                continue
+            previous, self._snapshot = self._snapshot, snapshot
+            changes = _snapshot_changes(previous, snapshot)
+            for queue, user_id in clients.items():
+                if queue not in self._clients:
+                    continue
+                # Notification events only concern their recipient.
+                client_events = [e for e in events if e.get("recipient_user_id", user_id) == user_id]
+                client_changes = dict(changes)
+                mine = notifications.get(user_id, [])
+                if mine != self._notifications[queue]:
+                    client_changes["notifications"] = mine
+                    self._notifications[queue] = mine
+                if client_events or "notifications" in client_changes:
+                    self._send(queue, "delta", {"events": client_events, "changes": client_changes})
+                if full:
+                    self._send(queue, "snapshot", self._client_snapshot(queue))
+
+
+dashboard_feed = DashboardFeed()
+
+
+async def _sse_messages(queue: asyncio.Queue):
+    try:
+        while True:
+            event, data = await queue.get()
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    finally:
+        dashboard_feed.disconnect(queue)
+
+
+def _stream_claims(
+    access_token: str | None = None,
+    authorization: str | None = Header(default=None),
+    db: Session = Depends(get_db),
+) -> AuthClaims:
+    # EventSource cannot set headers, so browsers pass the bearer token as a query parameter.
+    if not authorization and access_token:
+        authorization = f"Bearer {access_token}"
+    claims = get_current_claims(authorization, db)
+    return require_permission("view_dashboard_summary")(claims)
+
+
+@router.get("/dashboard/stream")
+async def dashboard_stream(claims: AuthClaims = Depends(_stream_claims), db: Session = Depends(get_db)):
+    """Server-sent events: a `snapshot` (summary, expiry and the user's notifications) on connect and
+    periodically, and a `delta` after stock or notification changes."""
+    # Hand the auth session's connection back to the pool; the stream can stay open for hours.
+    db.close()
+    queue = await dashboard_feed.connect(claims.user_id)
+    return StreamingResponse(
+        _sse_messages(queue),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.get("/dashboard-notifications")
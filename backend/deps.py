@@ -1,12 +1,20 @@
+import os
+import time
 from collections.abc import Callable
 
 from fastapi import Depends, Header, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 
+from cache import KeyedTTLCache
+from change_feed import subscribe
 from database import get_db
 from models import User
+from schemas import AuthClaims
 from security import decode_token
 
+AUTH_CLAIMS_TTL_SECONDS = int(os.getenv("AUTH_CLAIMS_TTL_SECONDS", "60"))
+AUTH_CLAIMS_CACHE_SIZE = int(os.getenv("AUTH_CLAIMS_CACHE_SIZE", "10000"))
+
 
 ROLE_PERMISSIONS = {
     "system_admin": {
@@ -19,6 +27,7 @@ ROLE_PERMISSIONS = {
         "view_dispensing",
         "dispense_drugs",
         "manage_inventory",
+        "recompute_reorder",
         "view_audit_logs",
         "view_suppliers",
         "manage_suppliers",
@@ -40,6 +49,7 @@ ROLE_PERMISSIONS = {
         "view_inventory",
         "update_inventory",
         "manage_inventory",
+        "recompute_reorder",
         "view_prescriptions",
         "view_dispensing",
         "dispense_drugs",
@@ -97,26 +107,59 @@ ROLE_MODULES = {
 }
 
 
-def get_current_user(authorization: str | None = Header(default=None), db: Session = Depends(get_db)) -> User:
+# One bit per permission and one mask per role, so a permission check is a single AND.
+PERMISSION_BITS = {name: 1 << index for index, name in enumerate(sorted(set().union(*ROLE_PERMISSIONS.values())))}
+ROLE_PERMISSION_MASKS = {
+    role: sum(PERMISSION_BITS[name] for name in permissions) for role, permissions in ROLE_PERMISSIONS.items()
+}
+
+# Verified claims (with the token's exp) by token. Role changes, deactivation and password resets bump token_version and
+# clear it in every worker via the change feed.
+claims_cache = KeyedTTLCache(AUTH_CLAIMS_TTL_SECONDS, AUTH_CLAIMS_CACHE_SIZE)
+subscribe(("users",), lambda _topic: claims_cache.invalidate())
+
+
+def get_current_claims(authorization: str | None = Header(default=None), db: Session = Depends(get_db)) -> AuthClaims:
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing Bearer token")
 
     token_value = authorization.split(" ", 1)[1]
+    cached = claims_cache.get(token_value)
+    # An entry outlives its token when the token expires first; decode_token then rejects it below.
+    if cached is not None and time.time() < cached[1]:
+        return cached[0]
+
+    generation = claims_cache.generation
     payload = decode_token(token_value)
-    username = payload.get("sub")
+    user = db.query(User).options(joinedload(User.role)).filter(User.username == payload.get("sub")).first()
+    if not user or not user.is_active:
+        raise HTTPException(status_code=401, detail="User not found or inactive")
+    if payload.get("ver", 0) != user.token_version:
+        raise HTTPException(status_code=401, detail="Token has been revoked")
+
+    claims = AuthClaims(
+        user_id=user.user_id,
+        username=user.username,
+        role=user.role.name if user.role else "",
+        token_version=user.token_version,
+    )
+    claims_cache.set(token_value, (claims, float(payload.get("exp", 0))), generation)
+    return claims
 
-    user = db.query(User).filter(User.username == username).first()
+
+def get_current_user(claims: AuthClaims = Depends(get_current_claims), db: Session = Depends(get_db)) -> User:
+    user = db.get(User, claims.user_id)
     if not user or not user.is_active:
         raise HTTPException(status_code=401, detail="User not found or inactive")
     return user
 
 
 def require_permission(permission: str) -> Callable:
-    def checker(current_user: User = Depends(get_current_user)) -> User:
-        role_name = current_user.role.name if current_user.role else ""
-        allowed = ROLE_PERMISSIONS.get(role_name, set())
-        if permission not in allowed:
+    bit = PERMISSION_BITS.get(permission, 0)
+
+    def checker(claims: AuthClaims = Depends(get_current_claims)) -> AuthClaims:
+        if not ROLE_PERMISSION_MASKS.get(claims.role, 0) & bit:
             raise HTTPException(status_code=403, detail="Insufficient permission")
-        return current_user
+        return claims
 
     return checker
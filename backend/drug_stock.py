@@ -0,0 +1,103 @@
+"""
+Per-drug stock counters — keeps drug_stock in step with drug_batches.
+
+Call refresh_drug_stock from any route or job that changes a batch's quantity or expired flag (or
+adds a batch), in the same transaction, so readers can look up a drug's stock in one row; the cached
+dashboard summary is dropped when that transaction commits. Run `python drug_stock.py` to report and
+repair any drift.
+"""
+import argparse
+import logging
+from datetime import datetime
+from typing import Iterable
+
+from sqlalchemy import DateTime, and_, func, literal, or_, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from cache import dashboard_summary_cache, invalidate_on_commit
+from models import DrugBatch, DrugStock
+
+logger = logging.getLogger("healthora.drug_stock")
+
+_STOCK_COLUMNS = ("total_quantity", "usable_quantity", "active_batches", "earliest_expiry", "updated_at")
+
+
+def _stock_select(drug_ids: list[int] | None = None):
+    active = and_(DrugBatch.is_expired.is_(False), DrugBatch.quantity_available > 0)
+    stmt = select(
+        DrugBatch.drug_id,
+        func.coalesce(func.sum(DrugBatch.quantity_available), 0).label("total_quantity"),
+        func.coalesce(func.sum(DrugBatch.quantity_available).filter(DrugBatch.is_expired.is_(False)), 0).label("usable_quantity"),
+        func.count().filter(active).label("active_batches"),
+        func.min(DrugBatch.expiry_date).filter(active).label("earliest_expiry"),
+        literal(datetime.utcnow(), DateTime).label("updated_at"),
+    ).group_by(DrugBatch.drug_id)
+    if drug_ids is not None:
+        stmt = stmt.where(DrugBatch.drug_id.in_(drug_ids))
+    return stmt
+
+
+def _upsert_from(stmt):
+    upsert = insert(DrugStock).from_select(["drug_id", *_STOCK_COLUMNS], stmt)
+    return upsert.on_conflict_do_update(
+        index_elements=[DrugStock.drug_id],
+        set_={col: getattr(upsert.excluded, col) for col in _STOCK_COLUMNS},
+    )
+
+
+def refresh_drug_stock(db: Session, drug_ids: Iterable[int]) -> None:
+    """Recompute the drug_stock rows of `drug_ids` from their batches; the caller commits."""
+    ids = sorted({int(drug_id) for drug_id in drug_ids if drug_id is not None})
+    if not ids:
+        return
+    db.flush()
+    db.execute(insert(DrugStock).values([{"drug_id": drug_id} for drug_id in ids]).on_conflict_do_nothing())
+    # Lock the rows (in id order) before aggregating: a concurrent writer on the same drug commits
+    # first, and the aggregate statement below then starts from a snapshot that includes its batches.
+    db.execute(select(DrugStock.drug_id).where(DrugStock.drug_id.in_(ids)).order_by(DrugStock.drug_id).with_for_update())
+    db.execute(_upsert_from(_stock_select(ids)))
+    invalidate_on_commit(db, dashboard_summary_cache)
+
+
+def reconcile_drug_stock(db: Session) -> int:
+    """Rebuild drug_stock from drug_batches; returns how many drugs had a missing, stale or orphan row."""
+    fresh = _stock_select().subquery()
+    drifted = db.execute(
+        select(func.count())
+        .select_from(fresh.outerjoin(DrugStock, DrugStock.drug_id == fresh.c.drug_id, full=True))
+        .where(
+            or_(
+                DrugStock.drug_id.is_(None),
+                fresh.c.drug_id.is_(None),
+                DrugStock.total_quantity != fresh.c.total_quantity,
+                DrugStock.usable_quantity != fresh.c.usable_quantity,
+                DrugStock.active_batches != fresh.c.active_batches,
+                DrugStock.earliest_expiry.is_distinct_from(fresh.c.earliest_expiry),
+            )
+        )
+    ).scalar()
+    db.query(DrugStock).filter(~DrugStock.drug_id.in_(select(DrugBatch.drug_id))).delete(synchronize_session=False)
+    db.execute(_upsert_from(_stock_select()))
+    invalidate_on_commit(db, dashboard_summary_cache)
+    return int(drifted or 0)
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    parser = argparse.ArgumentParser(description="Reconcile the drug_stock counters with drug_batches.")
+    parser.add_argument("--dry-run", action="store_true", help="report drift without writing the fix")
+    args = parser.parse_args()
+
+    session = SessionLocal()
+    try:
+        drifted = reconcile_drug_stock(session)
+        if args.dry_run:
+            session.rollback()
+        else:
+            session.commit()
+        logger.info("%d drug_stock rows were out of step with drug_batches%s", drifted, " (not fixed)" if args.dry_run else "")
+    finally:
+        session.close()
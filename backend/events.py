@@ -0,0 +1,61 @@
+"""
+In-process event bus for stock and dashboard changes.
+
+Mutating routes call `publish_on_commit(db, kind, **data)`; subscribers receive
+`{"type": kind, **data}` once the transaction commits, on the committing thread, so a callback must
+return quickly and hand the event off (see DashboardFeed in dashboard.py).
+"""
+import logging
+import threading
+from typing import Callable
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger("healthora.events")
+
+
+class EventBus:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: list[Callable[[dict], None]] = []
+
+    def subscribe(self, callback: Callable[[dict], None]) -> None:
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback: Callable[[dict], None]) -> None:
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def publish(self, kind: str, **data) -> None:
+        payload = {"type": kind, **data}
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(payload)
+            except Exception:
+                logger.exception("Event subscriber failed for %s", kind)
+
+
+bus = EventBus()
+
+
+def publish_on_commit(db: Session, kind: str, **data) -> None:
+    """Publish an event on `bus` once the current transaction of `db` commits."""
+    db.info.setdefault("publish_on_commit", []).append((kind, data))
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_committed(session: Session) -> None:
+    for kind, data in session.info.pop("publish_on_commit", ()):
+        bus.publish(kind, **data)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_rolled_back(session: Session, previous_transaction) -> None:
+    # Savepoint rollbacks (bulk import) keep the events of the enclosing transaction.
+    if previous_transaction.parent is None:
+        session.info.pop("publish_on_commit", None)
@@ -0,0 +1,252 @@
+"""
+Streaming forecast state — per-drug running sums behind the reorder forecasts.
+
+A full refit clips the usage window and seeds the sums. After that the window is moved one day at a
+time in O(1) per drug: `slide` drops the oldest day and appends the newest, and `replace_last`
+re-applies a day that is still receiving dispenses. The outlier bound and the error metrics stay
+frozen until the next refit (see REORDER_STATE_REFIT_DAYS in reorder_recommendation). Each saved
+state records the newest dispensing record and prescription item it has seen; a state saved ahead of
+the current history (rows deleted or restored from an older dump) is refitted instead of reused.
+
+A state is a dict of numpy arrays with one entry per drug, all sharing the same window end.
+"""
+import json
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from models import DrugForecastState
+
+TAIL_DAYS = 30
+LAG_DAYS = 7
+SAVE_CHUNK_ROWS = 1000  # keeps each upsert well under the driver's bind-parameter limit
+
+_ROW_FIELDS = ("fitted_on", "refitted_at")
+_SUM_FIELDS = ("clip_upper", "mean", "m2", "sum_ty", "head_sum", "head_sq", "lag_products", "last_raw", "mae", "rmse", "mape")
+
+
+def fit_state(
+    drug_ids: list[int],
+    window_end: date,
+    raw: np.ndarray,
+    cleaned: np.ndarray,
+    clip_upper: np.ndarray,
+    metrics: tuple[np.ndarray, np.ndarray, np.ndarray],
+) -> dict:
+    """Seed the running sums from a full usage window (`raw` and its clipped copy `cleaned`)."""
+    points = cleaned.shape[1]
+    mean = np.mean(cleaned, axis=1)
+    head = cleaned[:, :LAG_DAYS]
+    mae, rmse, mape = metrics
+    return {
+        "drug_ids": list(drug_ids),
+        "window_end": window_end,
+        "points": points,
+        "fitted_on": [window_end] * len(drug_ids),
+        "refitted_at": [datetime.utcnow()] * len(drug_ids),
+        "clip_upper": clip_upper.astype(float),
+        "mean": mean,
+        "m2": np.sum((cleaned - mean[:, None]) ** 2, axis=1),
+        "sum_ty": cleaned @ np.arange(points, dtype=float),
+        "head_sum": np.sum(head, axis=1),
+        "head_sq": np.sum(head**2, axis=1),
+        "lag_products": np.sum(cleaned[:, :-LAG_DAYS] * cleaned[:, LAG_DAYS:], axis=1),
+        "clipped_count": np.sum(raw > clip_upper[:, None], axis=1),
+        "last_raw": raw[:, -1].astype(float),
+        "mae": np.asarray(mae, dtype=float),
+        "rmse": np.asarray(rmse, dtype=float),
+        "mape": np.asarray(mape, dtype=float),
+        "tail": cleaned[:, -TAIL_DAYS:].copy(),
+    }
+
+
+def _replace_value(state: dict, old: np.ndarray, new: np.ndarray) -> np.ndarray:
+    """Welford update for swapping one window value; returns the new mean."""
+    mean = state["mean"]
+    new_mean = mean + (new - old) / state["points"]
+    state["m2"] = np.maximum(0.0, state["m2"] + (new - old) * (new - new_mean + old - mean))
+    state["mean"] = new_mean
+    return new_mean
+
+
+def slide(state: dict, new_raw: np.ndarray, leaving_raw: np.ndarray, head_raw: np.ndarray) -> None:
+    """Move the window forward one day.
+
+    `new_raw` is the usage of the day entering the window, `leaving_raw` the day dropping out and
+    `head_raw` the day that becomes the last of the first week (LAG_DAYS after the leaving day).
+    """
+    upper = state["clip_upper"]
+    points = state["points"]
+    new = np.clip(new_raw, 0.0, upper)
+    old = np.clip(leaving_raw, 0.0, upper)
+    head = np.clip(head_raw, 0.0, upper)
+
+    total = state["mean"] * points
+    state["sum_ty"] = state["sum_ty"] - (total - old) + (points - 1) * new
+    _replace_value(state, old, new)
+    state["lag_products"] = state["lag_products"] + state["tail"][:, -LAG_DAYS] * new - old * head
+    state["head_sum"] = state["head_sum"] + head - old
+    state["head_sq"] = state["head_sq"] + head**2 - old**2
+    state["clipped_count"] = state["clipped_count"] + (new_raw > upper).astype(int) - (leaving_raw > upper).astype(int)
+    state["tail"] = np.hstack([state["tail"][:, 1:], new[:, None]])
+    state["last_raw"] = np.array(new_raw, dtype=float)
+    state["window_end"] = state["window_end"] + timedelta(days=1)
+
+
+def replace_last(state: dict, raw: np.ndarray) -> None:
+    """Re-apply the window's last day after more usage was recorded for it."""
+    upper = state["clip_upper"]
+    previous = state["tail"][:, -1]
+    current = np.clip(raw, 0.0, upper)
+    delta = current - previous
+
+    state["sum_ty"] = state["sum_ty"] + (state["points"] - 1) * delta
+    _replace_value(state, previous, current)
+    state["lag_products"] = state["lag_products"] + state["tail"][:, -1 - LAG_DAYS] * delta
+    state["clipped_count"] = state["clipped_count"] + (raw > upper).astype(int) - (state["last_raw"] > upper).astype(int)
+    state["tail"][:, -1] = current
+    state["last_raw"] = np.array(raw, dtype=float)
+
+
+def features(state: dict) -> dict[str, np.ndarray]:
+    """Trend, variability and level features equivalent to a full-window fit of the same clipped series."""
+    points = state["points"]
+    mean = state["mean"]
+    total = mean * points
+    total_sq = state["m2"] + points * mean**2
+    tail = state["tail"]
+
+    t_sum = points * (points - 1) / 2.0
+    t_sq_sum = (points - 1) * points * (2 * points - 1) / 6.0
+    slope = (points * state["sum_ty"] - t_sum * total) / (points * t_sq_sum - t_sum**2)
+
+    std = np.sqrt(state["m2"] / points)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        volatility = np.where(mean > 0, std / mean, 0.0)
+
+    # Lag-7 autocorrelation: a = usage[:-7], b = usage[7:].
+    pairs = points - LAG_DAYS
+    last_week = tail[:, -LAG_DAYS:]
+    a_mean = (total - np.sum(last_week, axis=1)) / pairs
+    b_mean = (total - state["head_sum"]) / pairs
+    a_var = (total_sq - np.sum(last_week**2, axis=1)) / pairs - a_mean**2
+    b_var = (total_sq - state["head_sq"]) / pairs - b_mean**2
+    cov = state["lag_products"] / pairs - a_mean * b_mean
+    tolerance = 1e-9 * np.maximum(1.0, np.maximum(a_mean, b_mean) ** 2)
+    valid = (a_var > tolerance) & (b_var > tolerance)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        corr = cov / np.sqrt(a_var * b_var)
+    seasonality = np.clip(np.where(valid & ~np.isnan(corr), np.abs(corr), 0.0), 0.0, 1.0)
+
+    return {
+        "slope": slope,
+        "volatility": volatility,
+        "seasonality": seasonality,
+        "clipped": state["clipped_count"],
+        "mae": state["mae"],
+        "rmse": state["rmse"],
+        "mape": state["mape"],
+        "tail": tail,
+    }
+
+
+def combine(states: list[dict], drug_ids: list[int]) -> dict:
+    """Merge states that share a window end into one, with rows ordered like `drug_ids`."""
+    position = {drug_id: idx for idx, drug_id in enumerate(d for state in states for d in state["drug_ids"])}
+    order = np.array([position[drug_id] for drug_id in drug_ids], dtype=int)
+    merged = {
+        "drug_ids": list(drug_ids),
+        "window_end": states[0]["window_end"],
+        "points": states[0]["points"],
+        "tail": np.vstack([state["tail"] for state in states])[order],
+    }
+    for field in _ROW_FIELDS:
+        values = [value for state in states for value in state[field]]
+        merged[field] = [values[idx] for idx in order.tolist()]
+    for field in (*_SUM_FIELDS, "clipped_count"):
+        merged[field] = np.concatenate([state[field] for state in states])[order]
+    return merged
+
+
+def load_states(
+    db: Session,
+    drug_ids: list[int],
+    window_days: int,
+    as_of_date: date,
+    refitted_after: datetime,
+    watermark: tuple[int, int],
+) -> list[dict]:
+    """Reusable stored states for `drug_ids`, grouped by window end.
+
+    Only states fitted with `window_days` and last refitted after `refitted_after` (wall clock), whose
+    window does not run past `as_of_date` and whose usage watermark is not ahead of `watermark`, are
+    returned; every other drug needs a full refit.
+    """
+    if not drug_ids:
+        return []
+    rows = (
+        db.query(DrugForecastState)
+        .filter(
+            DrugForecastState.drug_id.in_(drug_ids),
+            DrugForecastState.window_days == window_days,
+            DrugForecastState.window_end <= as_of_date,
+            DrugForecastState.refitted_at > refitted_after,
+            DrugForecastState.last_record_id <= watermark[0],
+            DrugForecastState.last_item_id <= watermark[1],
+        )
+        .all()
+    )
+    groups: dict[date, list[DrugForecastState]] = {}
+    for row in rows:
+        groups.setdefault(row.window_end, []).append(row)
+
+    states = []
+    for window_end, group in groups.items():
+        state = {
+            "drug_ids": [r.drug_id for r in group],
+            "window_end": window_end,
+            "points": window_days,
+            "fitted_on": [r.fitted_on for r in group],
+            "refitted_at": [r.refitted_at for r in group],
+            "clipped_count": np.array([r.clipped_count for r in group], dtype=int),
+            "tail": np.array([json.loads(r.tail) for r in group], dtype=float),
+        }
+        for field in _SUM_FIELDS:
+            state[field] = np.array([getattr(r, field) for r in group], dtype=float)
+        states.append(state)
+    return states
+
+
+def save_states(db: Session, state: dict, watermark: tuple[int, int]) -> None:
+    """Upsert every row of `state`, brought up to date with usage up to `watermark`; the caller commits."""
+    if not state["drug_ids"]:
+        return
+    now = datetime.utcnow()
+    values = []
+    for row, drug_id in enumerate(state["drug_ids"]):
+        entry = {
+            "drug_id": drug_id,
+            "window_days": state["points"],
+            "window_end": state["window_end"],
+            "fitted_on": state["fitted_on"][row],
+            "refitted_at": state["refitted_at"][row],
+            "last_record_id": watermark[0],
+            "last_item_id": watermark[1],
+            "clipped_count": int(state["clipped_count"][row]),
+            "tail": json.dumps(state["tail"][row].tolist()),
+            "updated_at": now,
+        }
+        for field in _SUM_FIELDS:
+            entry[field] = float(state[field][row])
+        values.append(entry)
+
+    for offset in range(0, len(values), SAVE_CHUNK_ROWS):
+        stmt = insert(DrugForecastState).values(values[offset : offset + SAVE_CHUNK_ROWS])
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[DrugForecastState.drug_id],
+                set_={col: getattr(stmt.excluded, col) for col in values[0] if col != "drug_id"},
+            )
+        )
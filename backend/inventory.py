@@ -1,17 +1,25 @@
-import csv
-from datetime import date, datetime, timedelta
-from io import BytesIO, StringIO
-from zipfile import ZipFile
+import os
+from datetime import date, timedelta
+from itertools import chain
+from zipfile import BadZipFile
 from xml.etree import ElementTree as ET
 
 from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, or_, select
 from sqlalchemy.orm import Session
 
 from audit import log_action
-from database import get_db
+from bulk_import import create_job, header_problem, import_batches, iter_csv_rows, iter_xlsx_rows, resume_job
+from cache import dashboard_summary_cache, invalidate_on_commit
+from database import SessionLocal, get_db
 from deps import get_current_user, require_permission
-from models import Drug, DrugBatch, Patient, Supplier, User
+from drug_stock import refresh_drug_stock
+from events import publish_on_commit
+from models import BulkImportError, BulkImportJob, Drug, DrugBatch, DrugStock, Patient, Supplier, User
 from schemas import (
+    BulkImportErrorRead,
+    BulkImportJobRead,
     DrugBatchCreate,
     DrugBatchRead,
     DrugCreate,
@@ -22,105 +30,42 @@ from schemas import (
     PatientRead,
     PatientUpdate,
 )
+from search import SEARCH_MAX_LIMIT, _escape_like, ranked_search
 
 router = APIRouter(prefix="/api", tags=["inventory"])
 
-
-REQUIRED_BULK_COLUMNS = {
-    "drug_name",
-    "batch_no",
-    "expiry_date",
-    "purchase_price",
-    "selling_price",
-    "quantity_available",
-}
-
-
-def _normalize_row_keys(row: dict[str, str]) -> dict[str, str]:
-    normalized = {}
-    for key, value in row.items():
-        norm = (key or "").strip().lower().replace(" ", "_")
-        normalized[norm] = (value or "").strip()
-    return normalized
+INVENTORY_MAX_LIMIT = int(os.getenv("INVENTORY_MAX_LIMIT", "1000"))
+PATIENT_STREAM_CHUNK_ROWS = int(os.getenv("PATIENT_STREAM_CHUNK_ROWS", "1000"))
+
+# Exactly the columns DrugBatchRead needs, labelled with its field names.
+BATCH_READ_COLUMNS = (
+    DrugBatch.batch_id,
+    DrugBatch.drug_id,
+    Drug.drug_name,
+    DrugBatch.batch_no,
+    DrugBatch.expiry_date,
+    DrugBatch.purchase_price,
+    DrugBatch.selling_price,
+    DrugBatch.quantity_available,
+    DrugBatch.is_expired,
+    DrugBatch.supplier_id,
+    Supplier.name.label("supplier_name"),
+)
 
 
-def _parse_date(value: str) -> date:
-    value = value.strip()
-    if value.replace(".", "", 1).isdigit():
-        serial = int(float(value))
-        return date(1899, 12, 30) + timedelta(days=serial)
-    for fmt in ("%Y-%m-%d", "%d-%m-%Y", "%d/%m/%Y", "%Y/%m/%d"):
-        try:
-            return datetime.strptime(value, fmt).date()
-        except ValueError:
-            continue
-    raise ValueError(f"Invalid date '{value}'. Use YYYY-MM-DD")
-
-
-def _parse_csv(content: bytes) -> list[dict[str, str]]:
-    text = content.decode("utf-8-sig")
-    reader = csv.DictReader(StringIO(text))
-    if not reader.fieldnames:
-        return []
-    return [_normalize_row_keys(row) for row in reader]
-
-
-def _xlsx_shared_strings(archive: ZipFile) -> list[str]:
-    ns = {"m": "http://schemas.openxmlformats.org/spreadsheetml/2006/main"}
-    if "xl/sharedStrings.xml" not in archive.namelist():
-        return []
-    root = ET.fromstring(archive.read("xl/sharedStrings.xml"))
-    return ["".join((t.text or "") for t in item.findall(".//m:t", ns)) for item in root.findall("m:si", ns)]
-
-
-def _parse_xlsx(content: bytes) -> list[dict[str, str]]:
-    ns = {
-        "m": "http://schemas.openxmlformats.org/spreadsheetml/2006/main",
-        "r": "http://schemas.openxmlformats.org/officeDocument/2006/relationships",
-    }
-    with ZipFile(BytesIO(content)) as archive:
-        shared = _xlsx_shared_strings(archive)
-        workbook = ET.fromstring(archive.read("xl/workbook.xml"))
-        rels = ET.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
-        rel_map = {node.attrib["Id"]: node.attrib["Target"] for node in rels}
-        sheet = workbook.find("m:sheets/m:sheet", ns)
-        if sheet is None:
-            return []
-        rid = sheet.attrib["{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"]
-        target = rel_map[rid].lstrip("/")
-        sheet_path = target if target.startswith("xl/") else f"xl/{target}"
-        root = ET.fromstring(archive.read(sheet_path))
-
-        rows: list[list[str]] = []
-        for row in root.findall(".//m:sheetData/m:row", ns):
-            values: list[str] = []
-            for cell in row.findall("m:c", ns):
-                node = cell.find("m:v", ns)
-                if node is None:
-                    values.append("")
-                    continue
-                raw = node.text or ""
-                if cell.attrib.get("t") == "s":
-                    idx = int(raw) if raw else 0
-                    values.append(shared[idx] if idx < len(shared) else "")
-                else:
-                    values.append(raw)
-            if any(values):
-                rows.append(values)
-
-    if not rows:
-        return []
-    headers = [h.strip().lower().replace(" ", "_") for h in rows[0]]
-    out: list[dict[str, str]] = []
-    for row in rows[1:]:
-        row_map = {}
-        for idx, head in enumerate(headers):
-            if not head:
-                continue
-            row_map[head] = row[idx].strip() if idx < len(row) else ""
-        out.append(row_map)
-    return out
-
+PATIENT_READ_COLUMNS = (
+    Patient.patient_id,
+    Patient.name,
+    Patient.address,
+    Patient.gender,
+    Patient.contact,
+    Patient.dob,
+    Patient.blood_group,
+    Patient.created_by_user_id,
+    User.username.label("created_by"),
+    Patient.created_at,
+    Patient.is_archived,
+)
 
 def to_batch_read(batch: DrugBatch) -> DrugBatchRead:
     return DrugBatchRead(
@@ -170,23 +115,83 @@ def to_drug_read(drug: Drug, total_quantity: int = 0, active_batches: int = 0) -
 
 
 @router.get("/inventory", response_model=list[DrugBatchRead], dependencies=[Depends(require_permission("view_inventory"))])
-def get_inventory(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    batches = db.query(DrugBatch).join(Drug).order_by(DrugBatch.batch_id.asc()).offset(skip).limit(limit).all()
-    return [to_batch_read(batch) for batch in batches]
+def get_inventory(
+    skip: int = 0,
+    limit: int = 100,
+    after_id: int | None = None,
+    drug_id: int | None = None,
+    supplier_id: int | None = None,
+    expiry_from: date | None = None,
+    expiry_to: date | None = None,
+    expired: bool | None = None,
+    max_quantity: int | None = None,
+    db: Session = Depends(get_db),
+):
+    """Batches ordered by batch_id. Page with `after_id` (the last batch_id of the previous page)
+    rather than `skip`, so deep pages cost the same as the first one."""
+    if skip < 0 or limit < 1 or limit > INVENTORY_MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"skip must be >= 0 and limit between 1 and {INVENTORY_MAX_LIMIT}")
+
+    query = (
+        db.query(*BATCH_READ_COLUMNS)
+        .join(Drug, Drug.drug_id == DrugBatch.drug_id)
+        .outerjoin(Supplier, Supplier.supplier_id == DrugBatch.supplier_id)
+    )
+    if after_id is not None:
+        query = query.filter(DrugBatch.batch_id > after_id)
+    if drug_id is not None:
+        query = query.filter(DrugBatch.drug_id == drug_id)
+    if supplier_id is not None:
+        query = query.filter(DrugBatch.supplier_id == supplier_id)
+    if expiry_from is not None:
+        query = query.filter(DrugBatch.expiry_date >= expiry_from)
+    if expiry_to is not None:
+        query = query.filter(DrugBatch.expiry_date <= expiry_to)
+    if expired is not None:
+        query = query.filter(DrugBatch.is_expired.is_(expired))
+    if max_quantity is not None:
+        query = query.filter(DrugBatch.quantity_available <= max_quantity)
+
+    rows = query.order_by(DrugBatch.batch_id.asc()).offset(skip).limit(limit).all()
+    return [DrugBatchRead(**row._mapping) for row in rows]
+
+
+def _drugs_with_stock(db: Session):
+    """Drugs with their total quantity and active batch count from drug_stock."""
+    return db.query(
+        Drug,
+        func.coalesce(DrugStock.total_quantity, 0),
+        func.coalesce(DrugStock.active_batches, 0),
+    ).outerjoin(DrugStock, DrugStock.drug_id == Drug.drug_id)
+
+
+def _drug_read(db: Session, drug_id: int) -> DrugRead:
+    drug, total_quantity, active_batches = _drugs_with_stock(db).filter(Drug.drug_id == drug_id).one()
+    return to_drug_read(drug, total_quantity, active_batches)
 
 
 @router.get("/drugs", response_model=list[DrugRead], dependencies=[Depends(require_permission("view_drugs"))])
-def list_drugs(db: Session = Depends(get_db)):
-    drugs = db.query(Drug).order_by(Drug.drug_id.asc()).all()
-    batches = db.query(DrugBatch).all()
-    stats: dict[int, tuple[int, int]] = {}
-    for batch in batches:
-        total_qty, active_count = stats.get(batch.drug_id, (0, 0))
-        total_qty += batch.quantity_available
-        if not batch.is_expired and batch.quantity_available > 0:
-            active_count += 1
-        stats[batch.drug_id] = (total_qty, active_count)
-    return [to_drug_read(drug, *(stats.get(drug.drug_id, (0, 0)))) for drug in drugs]
+def list_drugs(skip: int = 0, limit: int | None = None, q: str | None = None, db: Session = Depends(get_db)):
+    if skip < 0 or (limit is not None and limit < 1):
+        raise HTTPException(status_code=400, detail="skip must be >= 0 and limit >= 1")
+    query = _drugs_with_stock(db)
+    if q and q.strip():
+        pattern = f"%{_escape_like(q.strip())}%"
+        query = query.filter(or_(Drug.drug_name.ilike(pattern, escape="\\"), Drug.generic_name.ilike(pattern, escape="\\")))
+    query = query.order_by(Drug.drug_id.asc()).offset(skip)
+    if limit is not None:
+        query = query.limit(limit)
+    return [to_drug_read(drug, total_quantity, active_batches) for drug, total_quantity, active_batches in query]
+
+
+@router.get("/drugs/search", response_model=list[DrugRead], dependencies=[Depends(require_permission("view_drugs"))])
+def search_drugs(q: str, limit: int = 10, db: Session = Depends(get_db)):
+    """Typeahead match on drug and generic name, best matches first."""
+    term = q.strip()
+    if not term or limit < 1 or limit > SEARCH_MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"q is required and limit must be between 1 and {SEARCH_MAX_LIMIT}")
+    query = ranked_search(db, _drugs_with_stock(db), [Drug.drug_name, Drug.generic_name], term, [Drug.drug_name.asc(), Drug.drug_id.asc()], limit)
+    return [to_drug_read(drug, total_quantity, active_batches) for drug, total_quantity, active_batches in query]
 
 
 @router.post("/drugs", response_model=DrugRead, dependencies=[Depends(require_permission("add_drug"))])
@@ -203,6 +208,8 @@ def add_drug(payload: DrugCreate, db: Session = Depends(get_db), current_user: U
     db.add(drug)
     db.flush()
     log_action(db, "add_drug", actor_user_id=current_user.user_id, target_table="drugs", target_id=drug.drug_id, detail={"drug_name": drug.drug_name})
+    invalidate_on_commit(db, dashboard_summary_cache)
+    publish_on_commit(db, "drug", action="added", drug_ids=[drug.drug_id])
     db.commit()
     db.refresh(drug)
     return to_drug_read(drug)
@@ -229,12 +236,10 @@ def update_drug(drug_id: int, payload: DrugUpdate, db: Session = Depends(get_db)
     if payload.is_active is not None:
         drug.is_active = payload.is_active
 
+    invalidate_on_commit(db, dashboard_summary_cache)
+    publish_on_commit(db, "drug", action="updated", drug_ids=[drug_id])
     db.commit()
-    db.refresh(drug)
-    related = db.query(DrugBatch).filter(DrugBatch.drug_id == drug.drug_id).all()
-    total_qty = sum(row.quantity_available for row in related)
-    active_count = sum(1 for row in related if not row.is_expired and row.quantity_available > 0)
-    return to_drug_read(drug, total_qty, active_count)
+    return _drug_read(db, drug_id)
 
 
 @router.patch("/drugs/{drug_id}/disable", response_model=DrugRead, dependencies=[Depends(require_permission("add_drug"))])
@@ -243,12 +248,10 @@ def disable_drug(drug_id: int, db: Session = Depends(get_db)):
     if not drug:
         raise HTTPException(status_code=404, detail="Drug not found")
     drug.is_active = False
+    invalidate_on_commit(db, dashboard_summary_cache)
+    publish_on_commit(db, "drug", action="disabled", drug_ids=[drug_id])
     db.commit()
-    db.refresh(drug)
-    related = db.query(DrugBatch).filter(DrugBatch.drug_id == drug.drug_id).all()
-    total_qty = sum(row.quantity_available for row in related)
-    active_count = sum(1 for row in related if not row.is_expired and row.quantity_available > 0)
-    return to_drug_read(drug, total_qty, active_count)
+    return _drug_read(db, drug_id)
 
 
 @router.post("/drug-batches", response_model=DrugBatchRead, dependencies=[Depends(require_permission("add_batch"))])
@@ -273,6 +276,8 @@ def add_batch(payload: DrugBatchCreate, db: Session = Depends(get_db), current_u
     )
     db.add(batch)
     db.flush()
+    refresh_drug_stock(db, [batch.drug_id])
+    publish_on_commit(db, "batch", action="added", batch_ids=[batch.batch_id], drug_ids=[batch.drug_id])
     log_action(db, "add_batch", actor_user_id=current_user.user_id, target_table="drug_batches", target_id=batch.batch_id, detail={"drug_id": payload.drug_id, "batch_no": payload.batch_no})
     db.commit()
     db.refresh(batch)
@@ -282,130 +287,84 @@ def add_batch(payload: DrugBatchCreate, db: Session = Depends(get_db), current_u
 @router.post("/drug-batches/bulk-upload", dependencies=[Depends(require_permission("add_batch"))])
 async def bulk_upload_batches(
     file: UploadFile = File(...),
+    async_mode: bool = False,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
     name = (file.filename or "").lower()
-    content = await file.read()
-    if not content:
+    if not await file.read(1):
         raise HTTPException(status_code=400, detail="Uploaded file is empty")
+    await file.seek(0)
 
     if name.endswith(".csv"):
-        rows = _parse_csv(content)
+        rows = iter_csv_rows(file.file)
+        first = next(rows, None)
     elif name.endswith(".xlsx"):
+        rows = iter_xlsx_rows(file.file)
         try:
-            rows = _parse_xlsx(content)
+            first = next(rows, None)
         except Exception as exc:
             raise HTTPException(status_code=400, detail=f"Invalid XLSX format: {exc}") from exc
     else:
         raise HTTPException(status_code=400, detail="Only .csv or .xlsx files are supported")
 
-    if not rows:
-        raise HTTPException(status_code=400, detail="No data rows found")
+    problem = header_problem(first)
+    if problem:
+        raise HTTPException(status_code=400, detail=problem)
 
-    missing_columns = REQUIRED_BULK_COLUMNS - set(rows[0].keys())
-    if missing_columns:
-        raise HTTPException(status_code=400, detail=f"Missing required columns: {', '.join(sorted(missing_columns))}")
+    if async_mode:
+        await file.seek(0)
+        job = create_job(db, file.file, file.filename or name, current_user.user_id)
+        return {"job_id": job.job_id, "status": job.status}
 
-    created_batches = 0
-    created_drugs = 0
-    created_suppliers = 0
-    errors: list[dict[str, str]] = []
-    seen_batch_nos: set[str] = set()
+    try:
+        summary = import_batches(db, chain([first], rows), actor_user_id=current_user.user_id)
+    except (BadZipFile, ET.ParseError) as exc:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=f"Invalid XLSX format: {exc}") from exc
+    db.commit()
+    return summary
 
-    for idx, raw in enumerate(rows, start=2):
-        try:
-            drug_name = raw.get("drug_name", "").strip()
-            batch_no = raw.get("batch_no", "").strip()
-            expiry_raw = raw.get("expiry_date", "").strip()
-            purchase_raw = raw.get("purchase_price", "").strip()
-            selling_raw = raw.get("selling_price", "").strip()
-            qty_raw = raw.get("quantity_available", "").strip()
-
-            if not drug_name:
-                raise ValueError("drug_name is required")
-            if not batch_no:
-                raise ValueError("batch_no is required")
-            if batch_no in seen_batch_nos:
-                raise ValueError("duplicate batch_no in file")
-            seen_batch_nos.add(batch_no)
-
-            existing_batch = db.query(DrugBatch).filter(DrugBatch.batch_no == batch_no).first()
-            if existing_batch:
-                raise ValueError("batch_no already exists")
-
-            expiry_date = _parse_date(expiry_raw)
-            purchase_price = float(purchase_raw)
-            selling_price = float(selling_raw)
-            quantity_available = int(float(qty_raw))
-            if purchase_price < 0 or selling_price < 0 or quantity_available < 0:
-                raise ValueError("price/quantity cannot be negative")
-
-            drug = db.query(Drug).filter(Drug.drug_name.ilike(drug_name)).first()
-            if not drug:
-                drug = Drug(
-                    drug_name=drug_name,
-                    generic_name=raw.get("generic_name") or None,
-                    formulation=raw.get("formulation") or "Tablet",
-                    strength=raw.get("strength") or None,
-                    schedule_type=raw.get("schedule_type") or "OTC",
-                    low_stock_threshold=int(raw.get("low_stock_threshold") or 50),
-                    is_active=True,
-                )
-                db.add(drug)
-                db.flush()
-                created_drugs += 1
-
-            supplier_id: int | None = None
-            supplier_id_raw = raw.get("supplier_id", "").strip()
-            supplier_name_raw = raw.get("supplier_name", "").strip()
-            if supplier_id_raw:
-                supplier = db.query(Supplier).filter(Supplier.supplier_id == int(float(supplier_id_raw))).first()
-                if not supplier:
-                    raise ValueError(f"supplier_id {supplier_id_raw} not found")
-                supplier_id = supplier.supplier_id
-            elif supplier_name_raw:
-                supplier = db.query(Supplier).filter(Supplier.name.ilike(supplier_name_raw)).first()
-                if not supplier:
-                    supplier = Supplier(name=supplier_name_raw, is_active=True)
-                    db.add(supplier)
-                    db.flush()
-                    created_suppliers += 1
-                supplier_id = supplier.supplier_id
-
-            batch = DrugBatch(
-                drug_id=drug.drug_id,
-                batch_no=batch_no,
-                expiry_date=expiry_date,
-                purchase_price=purchase_price,
-                selling_price=selling_price,
-                quantity_available=quantity_available,
-                supplier_id=supplier_id,
-                is_expired=False,
-            )
-            db.add(batch)
-            db.flush()
-            created_batches += 1
-            log_action(
-                db,
-                "bulk_add_batch",
-                actor_user_id=current_user.user_id,
-                target_table="drug_batches",
-                target_id=batch.batch_id,
-                detail={"batch_no": batch.batch_no, "drug_name": drug.drug_name},
-            )
-        except Exception as exc:
-            errors.append({"row": str(idx), "error": str(exc)})
 
-    db.commit()
-    return {
-        "total_rows": len(rows),
-        "created_batches": created_batches,
-        "created_drugs": created_drugs,
-        "created_suppliers": created_suppliers,
-        "failed_rows": len(errors),
-        "errors": errors[:100],
-    }
+def _get_import_job(db: Session, job_id: int) -> BulkImportJob:
+    job = db.query(BulkImportJob).filter(BulkImportJob.job_id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job
+
+
+@router.get("/drug-batches/bulk-upload/jobs", response_model=list[BulkImportJobRead], dependencies=[Depends(require_permission("add_batch"))])
+def list_import_jobs(skip: int = 0, limit: int = 20, db: Session = Depends(get_db)):
+    return db.query(BulkImportJob).order_by(BulkImportJob.job_id.desc()).offset(skip).limit(limit).all()
+
+
+@router.get("/drug-batches/bulk-upload/jobs/{job_id}", response_model=BulkImportJobRead, dependencies=[Depends(require_permission("add_batch"))])
+def get_import_job(job_id: int, db: Session = Depends(get_db)):
+    return _get_import_job(db, job_id)
+
+
+@router.post("/drug-batches/bulk-upload/jobs/{job_id}/resume", response_model=BulkImportJobRead, dependencies=[Depends(require_permission("add_batch"))])
+def resume_import_job(job_id: int, db: Session = Depends(get_db)):
+    job = _get_import_job(db, job_id)
+    if job.status != "failed":
+        raise HTTPException(status_code=400, detail=f"Only failed jobs can be resumed (job is {job.status})")
+    if not os.path.exists(job.file_path):
+        raise HTTPException(status_code=400, detail="Stored upload for this job is no longer available")
+    return resume_job(db, job)
+
+
+@router.get("/drug-batches/bulk-upload/jobs/{job_id}/errors", response_model=list[BulkImportErrorRead], dependencies=[Depends(require_permission("add_batch"))])
+def list_import_job_errors(job_id: int, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    _get_import_job(db, job_id)
+    errors = (
+        db.query(BulkImportError)
+        .filter(BulkImportError.job_id == job_id)
+        .order_by(BulkImportError.row_no.asc(), BulkImportError.error_id.asc())
+        .offset(skip)
+        .limit(limit)
+        .all()
+    )
+    return [BulkImportErrorRead(row=e.row_no, error=e.error) for e in errors]
 
 
 @router.patch("/drug-batches/{batch_id}/mark-expired", response_model=DrugBatchRead, dependencies=[Depends(require_permission("add_batch"))])
@@ -414,6 +373,8 @@ def mark_batch_expired(batch_id: int, db: Session = Depends(get_db)):
     if not batch:
         raise HTTPException(status_code=404, detail="Batch not found")
     batch.is_expired = True
+    refresh_drug_stock(db, [batch.drug_id])
+    publish_on_commit(db, "expiry", batch_ids=[batch.batch_id], drug_ids=[batch.drug_id])
     db.commit()
     db.refresh(batch)
     return to_batch_read(batch)
@@ -426,26 +387,80 @@ def update_inventory(batch_id: int, payload: InventoryUpdate, db: Session = Depe
         raise HTTPException(status_code=404, detail="Batch not found")
 
     batch.quantity_available = payload.quantity_available
+    refresh_drug_stock(db, [batch.drug_id])
+    publish_on_commit(db, "batch", action="updated", batch_ids=[batch.batch_id], drug_ids=[batch.drug_id])
     db.commit()
     db.refresh(batch)
     return to_batch_read(batch)
 
 
 @router.get("/patients", response_model=list[PatientRead], dependencies=[Depends(require_permission("view_patients"))])
-def list_patients(db: Session = Depends(get_db)):
-    patients = db.query(Patient).filter(Patient.is_archived.is_(False)).order_by(Patient.patient_id.asc()).all()
-    creator_ids = {row.created_by_user_id for row in patients if row.created_by_user_id is not None}
-    creators = db.query(User).filter(User.user_id.in_(creator_ids)).all() if creator_ids else []
-    creator_map = {user.user_id: user.username for user in creators}
-    return [to_patient_read(row, creator_map.get(row.created_by_user_id)) for row in patients]
+def list_patients(
+    skip: int = 0,
+    limit: int | None = None,
+    after_id: int | None = None,
+    created_by: int | None = None,
+    created_from: date | None = None,
+    created_to: date | None = None,
+    blood_group: str | None = None,
+    stream: bool = False,
+    db: Session = Depends(get_db),
+):
+    """Non-archived patients ordered by patient_id. Page with `after_id` (the last patient_id of the
+    previous page); `stream=true` sends every match as NDJSON from a server-side cursor instead."""
+    if skip < 0 or (limit is not None and limit < 1):
+        raise HTTPException(status_code=400, detail="skip must be >= 0 and limit >= 1")
+
+    stmt = (
+        select(*PATIENT_READ_COLUMNS)
+        .outerjoin(User, User.user_id == Patient.created_by_user_id)
+        .where(Patient.is_archived.is_(False))
+    )
+    if after_id is not None:
+        stmt = stmt.where(Patient.patient_id > after_id)
+    if created_by is not None:
+        stmt = stmt.where(Patient.created_by_user_id == created_by)
+    if created_from is not None:
+        stmt = stmt.where(Patient.created_at >= created_from)
+    if created_to is not None:
+        stmt = stmt.where(Patient.created_at < created_to + timedelta(days=1))
+    if blood_group:
+        stmt = stmt.where(Patient.blood_group == blood_group.strip())
+    stmt = stmt.order_by(Patient.patient_id.asc()).offset(skip)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+
+    if stream:
+        return StreamingResponse(_stream_patients(stmt), media_type="application/x-ndjson")
+    return [PatientRead(**row._mapping) for row in db.execute(stmt)]
+
+
+def _stream_patients(stmt):
+    # The request's session is closed once the route returns, so the export reads through its own.
+    db = SessionLocal()
+    try:
+        for row in db.execute(stmt.execution_options(yield_per=PATIENT_STREAM_CHUNK_ROWS)):
+            yield PatientRead(**row._mapping).model_dump_json() + "\n"
+    finally:
+        db.close()
+
+
+@router.get("/patients/search", response_model=list[PatientRead], dependencies=[Depends(require_permission("view_patients"))])
+def search_patients(q: str, limit: int = 10, include_archived: bool = False, db: Session = Depends(get_db)):
+    """Typeahead match on patient name and contact, best matches first."""
+    term = q.strip()
+    if not term or limit < 1 or limit > SEARCH_MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"q is required and limit must be between 1 and {SEARCH_MAX_LIMIT}")
+    query = db.query(Patient, User.username).outerjoin(User, User.user_id == Patient.created_by_user_id)
+    if not include_archived:
+        query = query.filter(Patient.is_archived.is_(False))
+    query = ranked_search(db, query, [Patient.name, Patient.contact], term, [Patient.name.asc(), Patient.patient_id.asc()], limit)
+    return [to_patient_read(patient, username) for patient, username in query]
 
 
 @router.post("/patients", response_model=PatientRead, dependencies=[Depends(require_permission("add_patients"))])
 def add_patient(payload: PatientCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    max_patient = db.query(Patient.patient_id).order_by(Patient.patient_id.desc()).first()
-    next_patient_id = (max_patient[0] if max_patient else 10000) + 1
     patient = Patient(
-        patient_id=next_patient_id,
         name=payload.name,
         address=payload.address,
         gender=payload.gender,
@@ -456,6 +471,8 @@ def add_patient(payload: PatientCreate, db: Session = Depends(get_db), current_u
         is_archived=False,
     )
     db.add(patient)
+    invalidate_on_commit(db, dashboard_summary_cache)
+    publish_on_commit(db, "patient", action="added")
     db.commit()
     db.refresh(patient)
     return to_patient_read(patient, current_user.username)
@@ -491,35 +508,49 @@ def archive_patient(patient_id: int, db: Session = Depends(get_db)):
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
     patient.is_archived = True
+    invalidate_on_commit(db, dashboard_summary_cache)
+    publish_on_commit(db, "patient", action="archived", patient_id=patient_id)
     db.commit()
     db.refresh(patient)
     creator = db.query(User).filter(User.user_id == patient.created_by_user_id).first() if patient.created_by_user_id else None
     return to_patient_read(patient, creator.username if creator else None)
 
 
-def count_expiry_risk(batches: list[DrugBatch]) -> int:
+def _dashboard_summary_statement():
     today = date.today()
-    return sum(1 for row in batches if not row.is_expired and 0 <= (row.expiry_date - today).days <= 60)
+    batch_totals = (
+        select(
+            func.count().label("total_stock"),
+            func.count()
+            .filter(
+                DrugBatch.is_expired.is_(False),
+                DrugBatch.expiry_date >= today,
+                DrugBatch.expiry_date <= today + timedelta(days=60),
+            )
+            .label("expiry_risk"),
+        )
+        .select_from(DrugBatch)
+        .subquery()
+    )
+    usable_stock = select(func.coalesce(func.sum(DrugStock.usable_quantity), 0)).scalar_subquery()
+    low_stock_alerts = (
+        select(func.count())
+        .select_from(Drug)
+        .outerjoin(DrugStock, DrugStock.drug_id == Drug.drug_id)
+        .where(func.coalesce(DrugStock.total_quantity, 0) < Drug.low_stock_threshold)
+        .scalar_subquery()
+    )
+    total_patients = select(func.count()).select_from(Patient).where(Patient.is_archived.is_(False)).scalar_subquery()
+    return select(
+        usable_stock.label("usable_stock"),
+        batch_totals.c.total_stock,
+        batch_totals.c.expiry_risk,
+        low_stock_alerts.label("low_stock_alerts"),
+        total_patients.label("total_patients"),
+    )
 
 
 @router.get("/dashboard-summary", dependencies=[Depends(require_permission("view_dashboard_summary"))])
 def dashboard_summary(db: Session = Depends(get_db)):
-    batches = db.query(DrugBatch).all()
-    usable_stock = sum(row.quantity_available for row in batches if not row.is_expired)
-    total_stock = len(batches)
-    expiry_risk = count_expiry_risk(batches)
-
-    drugs = db.query(Drug).all()
-    by_drug = {}
-    for row in batches:
-        by_drug[row.drug_id] = by_drug.get(row.drug_id, 0) + row.quantity_available
-    low_stock_alerts = sum(1 for drug in drugs if by_drug.get(drug.drug_id, 0) < drug.low_stock_threshold)
-
-    total_patients = db.query(Patient).filter(Patient.is_archived.is_(False)).count()
-    return {
-        "usable_stock": usable_stock,
-        "total_stock": total_stock,
-        "expiry_risk": expiry_risk,
-        "low_stock_alerts": low_stock_alerts,
-        "total_patients": total_patients,
-    }
+    """Headline counts in one statement, shared across requests through dashboard_summary_cache."""
+    return dashboard_summary_cache.get(lambda: dict(db.execute(_dashboard_summary_statement()).one()._mapping))
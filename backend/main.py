@@ -14,13 +14,21 @@ from auth import router as auth_router
 from ai_report import _ensure_loaded as preload_ai_graph
 from ai_report import router as ai_report_router
 from audit_router import router as audit_log_router
+from backtesting import run_scheduled_backtest
+from bulk_import import STALE_SECONDS as BULK_IMPORT_STALE_SECONDS
+from bulk_import import resume_interrupted_jobs
+from change_feed import start_listener as start_change_feed
+from change_feed import stop_listener as stop_change_feed
 from dashboard import router as dashboard_router
 from database import SessionLocal
+from drug_stock import refresh_drug_stock
+from events import publish_on_commit
 from inventory import router as inventory_router
 from models import DrugBatch
 from notifications import router as notifications_router
 from prescriptions import router as prescriptions_router
 from purchase_orders import router as purchase_orders_router
+from reorder_recommendation import refresh_snapshot as refresh_reorder_snapshot
 from reorder_recommendation import router as reorder_recommendation_router
 from seed import seed_all
 from suppliers import router as suppliers_router
@@ -51,6 +59,8 @@ def auto_expire_batches():
         if expired:
             for batch in expired:
                 batch.is_expired = True
+            refresh_drug_stock(db, {batch.drug_id for batch in expired})
+            publish_on_commit(db, "expiry", batch_ids=[batch.batch_id for batch in expired], drug_ids=sorted({batch.drug_id for batch in expired}))
             db.commit()
             logger.info("Auto-expired %d drug batches", len(expired))
     except Exception:
@@ -85,13 +95,26 @@ async def lifespan(app: FastAPI):
     scheduler.add_job(
         auto_expire_batches, "cron", hour=0, minute=5
     )  # Run at 00:05 every day
+    scheduler.add_job(
+        run_scheduled_backtest, "cron", hour=23, minute=30
+    )  # Backtest forecasts nightly so the 00:20 refresh publishes fresh error estimates
+    scheduler.add_job(
+        refresh_reorder_snapshot, "cron", hour=0, minute=20
+    )  # Recompute reorder recommendations at 00:20, after batch expiry
+    scheduler.add_job(refresh_reorder_snapshot)  # Warm the snapshot once without blocking startup
+    scheduler.add_job(resume_interrupted_jobs)  # Pick up bulk imports cut off by the last shutdown
+    scheduler.add_job(
+        resume_interrupted_jobs, "interval", seconds=BULK_IMPORT_STALE_SECONDS
+    )  # Take over imports whose worker died while this one keeps running
     scheduler.start()
+    start_change_feed()
     logger.info("Healthora backend started")
 
     yield
 
     # Shutdown
     scheduler.shutdown(wait=False)
+    stop_change_feed()
     logger.info("Healthora backend stopped")
 
 
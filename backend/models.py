@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import Boolean, Column, Date, DateTime, ForeignKey, Integer, Numeric, String, Text
+from sqlalchemy import Boolean, Column, Date, DateTime, Float, ForeignKey, Integer, Numeric, String, Text, UniqueConstraint
 from sqlalchemy.orm import relationship
 
 from database import Base
@@ -33,6 +33,7 @@ class User(Base):
     last_login_at = Column(DateTime, nullable=True)
     password_changed_at = Column(DateTime, nullable=True)
     must_reset_password = Column(Boolean, default=False, nullable=False)
+    token_version = Column(Integer, default=0, nullable=False)  # bumped to revoke issued tokens
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
     role = relationship("Role", back_populates="users")
@@ -83,13 +84,26 @@ class DrugBatch(Base):
     selling_price = Column(Numeric(10, 2), nullable=False)
     quantity_available = Column(Integer, nullable=False, default=0)
     is_expired = Column(Boolean, default=False, nullable=False)
-    supplier_id = Column(Integer, ForeignKey("suppliers.supplier_id"), nullable=True)
+    supplier_id = Column(Integer, ForeignKey("suppliers.supplier_id"), nullable=True, index=True)
 
     drug = relationship("Drug", back_populates="batches")
     supplier = relationship("Supplier", back_populates="batches")
     dispensing_records = relationship("DispensingRecord", back_populates="batch")
 
 
+class DrugStock(Base):
+    __tablename__ = "drug_stock"
+
+    drug_id = Column(Integer, ForeignKey("drugs.drug_id"), primary_key=True)
+    total_quantity = Column(Integer, nullable=False, default=0)    # all batches, expired included
+    usable_quantity = Column(Integer, nullable=False, default=0)   # batches not marked expired
+    active_batches = Column(Integer, nullable=False, default=0)    # not expired and quantity > 0
+    earliest_expiry = Column(Date, nullable=True)                  # soonest expiry among active batches
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    drug = relationship("Drug")
+
+
 # ─── Supplier & Purchase ─────────────────────────────────────────────────────
 
 class Supplier(Base):
@@ -163,7 +177,7 @@ class PrescriptionItem(Base):
 
     item_id = Column(Integer, primary_key=True, index=True)
     prescription_id = Column(Integer, ForeignKey("prescriptions.prescription_id"), nullable=False)
-    drug_id = Column(Integer, ForeignKey("drugs.drug_id"), nullable=False)
+    drug_id = Column(Integer, ForeignKey("drugs.drug_id"), nullable=False, index=True)
     dosage = Column(String(100), nullable=True)
     duration = Column(String(100), nullable=True)
     quantity_prescribed = Column(Integer, nullable=False, default=1)
@@ -178,7 +192,7 @@ class DispensingRecord(Base):
     record_id = Column(Integer, primary_key=True, index=True)
     prescription_id = Column(Integer, ForeignKey("prescriptions.prescription_id"), nullable=True)
     patient_id = Column(Integer, ForeignKey("patients.patient_id"), nullable=False)
-    batch_id = Column(Integer, ForeignKey("drug_batches.batch_id"), nullable=False)
+    batch_id = Column(Integer, ForeignKey("drug_batches.batch_id"), nullable=False, index=True)
     quantity_dispensed = Column(Integer, nullable=False)
     dispensed_by_user_id = Column(Integer, ForeignKey("users.user_id"), nullable=False)
     dispensed_at = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -190,6 +204,132 @@ class DispensingRecord(Base):
     dispensed_by = relationship("User", foreign_keys=[dispensed_by_user_id])
 
 
+class DrugDailyUsage(Base):
+    __tablename__ = "drug_daily_usage"
+
+    drug_id = Column(Integer, ForeignKey("drugs.drug_id"), primary_key=True)
+    usage_date = Column(Date, primary_key=True, index=True)
+    dispensed_quantity = Column(Integer, nullable=False, default=0)
+    dispensed_events = Column(Integer, nullable=False, default=0)
+    prescribed_quantity = Column(Integer, nullable=False, default=0)
+    prescribed_events = Column(Integer, nullable=False, default=0)
+
+    drug = relationship("Drug")
+
+
+# ─── Reorder Recommendation ──────────────────────────────────────────────────
+
+class ReorderSnapshot(Base):
+    __tablename__ = "reorder_snapshots"
+    __table_args__ = (
+        UniqueConstraint("as_of_date", "window_days", "payload_version", "version", name="uq_reorder_snapshots_key_version"),
+    )
+
+    snapshot_id = Column(Integer, primary_key=True, index=True)
+    as_of_date = Column(Date, nullable=False)
+    window_days = Column(Integer, nullable=False)
+    payload_version = Column(Integer, nullable=False)   # bumped when the payload format changes
+    version = Column(Integer, nullable=False)           # increases with every recompute of the same key
+    payload = Column(Text, nullable=False)              # JSON-encoded recommendation payload
+    computed_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class DrugForecastState(Base):
+    __tablename__ = "drug_forecast_state"
+
+    drug_id = Column(Integer, ForeignKey("drugs.drug_id"), primary_key=True)
+    window_days = Column(Integer, nullable=False)
+    window_end = Column(Date, nullable=False)           # last usage day folded into the sums
+    fitted_on = Column(Date, nullable=False)            # window end at the last full refit
+    refitted_at = Column(DateTime)                      # wall-clock time of the last full refit
+    last_record_id = Column(Integer)                    # newest dispensing record / prescription item seen
+    last_item_id = Column(Integer)
+    clip_upper = Column(Float, nullable=False)          # outlier bound frozen at the last refit
+    mean = Column(Float, nullable=False)
+    m2 = Column(Float, nullable=False)                  # Welford sum of squared deviations
+    sum_ty = Column(Float, nullable=False)              # sum of day_index * usage for the trend slope
+    head_sum = Column(Float, nullable=False)            # first 7 days of the window
+    head_sq = Column(Float, nullable=False)
+    lag_products = Column(Float, nullable=False)        # sum of usage[t] * usage[t + 7]
+    clipped_count = Column(Integer, nullable=False)
+    last_raw = Column(Float, nullable=False)            # unclipped usage of window_end as last applied
+    mae = Column(Float, nullable=False)
+    rmse = Column(Float, nullable=False)
+    mape = Column(Float, nullable=False)
+    tail = Column(Text, nullable=False)                 # JSON list of the latest clipped daily usage
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    drug = relationship("Drug")
+
+
+class ForecastBacktestMetric(Base):
+    __tablename__ = "forecast_backtest_metrics"
+
+    drug_id = Column(Integer, ForeignKey("drugs.drug_id"), primary_key=True)
+    horizon_days = Column(Integer, primary_key=True)
+    model = Column(String(30), primary_key=True, default="trend")  # forecaster registry name
+    as_of_date = Column(Date, nullable=False)           # last usage day available to the evaluation
+    window_days = Column(Integer, nullable=False)       # training window length at each cutoff
+    cutoffs = Column(Integer, nullable=False)           # rolling origins that contributed errors
+    mae = Column(Float, nullable=False)
+    rmse = Column(Float, nullable=False)
+    mape = Column(Float, nullable=False)
+    evaluated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    drug = relationship("Drug")
+
+
+class DrugForecastModel(Base):
+    __tablename__ = "drug_forecast_models"
+
+    drug_id = Column(Integer, ForeignKey("drugs.drug_id"), primary_key=True)
+    model = Column(String(30), nullable=False)          # forecaster chosen by the backtest
+    window_days = Column(Integer, nullable=False)
+    fitted_through = Column(Date, nullable=False)       # last usage day folded into params
+    clip_upper = Column(Float, nullable=False)          # outlier bound applied to later updates
+    params = Column(Text, nullable=False)               # JSON-encoded fitted parameters / state
+    selection_mae = Column(Float, nullable=False)       # backtest MAE that won the selection
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    drug = relationship("Drug")
+
+
+# ─── Bulk Import Jobs ────────────────────────────────────────────────────────
+
+class BulkImportJob(Base):
+    __tablename__ = "bulk_import_jobs"
+
+    job_id = Column(Integer, primary_key=True, index=True)
+    filename = Column(String(255), nullable=False)
+    file_path = Column(String(500), nullable=False)      # stored copy of the upload
+    status = Column(String(20), nullable=False, default="queued")  # queued, running, completed, failed
+    created_by_user_id = Column(Integer, ForeignKey("users.user_id"), nullable=True)
+    rows_parsed = Column(Integer, nullable=False, default=0)
+    rows_inserted = Column(Integer, nullable=False, default=0)
+    rows_failed = Column(Integer, nullable=False, default=0)
+    created_drugs = Column(Integer, nullable=False, default=0)
+    created_suppliers = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)                  # why the whole job failed, if it did
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    owner = Column(String(100), nullable=True)           # worker process (host:pid) running the job
+    heartbeat_at = Column(DateTime, nullable=True)       # refreshed by the owner after every chunk
+
+    errors = relationship("BulkImportError", back_populates="job")
+
+
+class BulkImportError(Base):
+    __tablename__ = "bulk_import_errors"
+
+    error_id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(Integer, ForeignKey("bulk_import_jobs.job_id"), nullable=False, index=True)
+    row_no = Column(Integer, nullable=False)
+    error = Column(Text, nullable=False)
+
+    job = relationship("BulkImportJob", back_populates="errors")
+
+
 # ─── Audit Log & Notifications ───────────────────────────────────────────────
 
 class AuditLog(Base):
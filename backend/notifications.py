@@ -1,16 +1,20 @@
 from datetime import date
+from typing import Iterable
 
 from fastapi import APIRouter, Depends
-from sqlalchemy import func
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 
 from database import get_db
 from deps import get_current_user
-from models import Drug, DrugBatch, Notification, User
+from events import publish_on_commit
+from models import Drug, DrugBatch, DrugStock, Notification, User
 from schemas import NotificationRead
 
 router = APIRouter(prefix="/api", tags=["notifications"])
 
+NOTIFICATION_LIST_LIMIT = 50
+
 
 def _ensure_notifications_for_user(current_user: User, db: Session) -> None:
     today = date.today()
@@ -50,18 +54,12 @@ def _ensure_notifications_for_user(current_user: User, db: Session) -> None:
                 )
             )
 
+    stock = func.coalesce(DrugStock.total_quantity, 0)
     low_stock = (
-        db.query(
-            Drug.drug_name,
-            func.coalesce(func.sum(DrugBatch.quantity_available), 0).label("stock"),
-        )
-        .outerjoin(DrugBatch, DrugBatch.drug_id == Drug.drug_id)
-        .group_by(Drug.drug_id, Drug.drug_name)
-        .having(
-            func.coalesce(func.sum(DrugBatch.quantity_available), 0)
-            < Drug.low_stock_threshold
-        )
-        .order_by(func.coalesce(func.sum(DrugBatch.quantity_available), 0).asc())
+        db.query(Drug.drug_name, stock.label("stock"))
+        .outerjoin(DrugStock, DrugStock.drug_id == Drug.drug_id)
+        .filter(stock < Drug.low_stock_threshold)
+        .order_by(stock.asc())
         .first()
     )
     if low_stock:
@@ -109,12 +107,42 @@ def list_notifications(
         db.query(Notification)
         .filter(Notification.recipient_user_id == current_user.user_id)
         .order_by(Notification.created_at.desc())
-        .limit(50)
+        .limit(NOTIFICATION_LIST_LIMIT)
         .all()
     )
     return [to_notification_read(n) for n in items]
 
 
+def recent_notifications(db: Session, user_ids: Iterable[int], generate: bool = False) -> dict[int, list[NotificationRead]]:
+    """What `GET /api/notifications` returns for each of `user_ids`, in one query.
+
+    With `generate`, due expiry and low-stock notifications are created first, as that route does.
+    """
+    ids = sorted(set(user_ids))
+    if not ids:
+        return {}
+    if generate:
+        for user in db.query(User).filter(User.user_id.in_(ids)).all():
+            _ensure_notifications_for_user(user, db)
+    rank = func.row_number().over(partition_by=Notification.recipient_user_id, order_by=Notification.created_at.desc())
+    ranked = select(Notification, rank.label("rank")).where(Notification.recipient_user_id.in_(ids)).subquery()
+    rows = db.execute(
+        select(ranked).where(ranked.c.rank <= NOTIFICATION_LIST_LIMIT).order_by(ranked.c.created_at.desc())
+    ).all()
+    result: dict[int, list[NotificationRead]] = {user_id: [] for user_id in ids}
+    for row in rows:
+        result[row.recipient_user_id].append(
+            NotificationRead(
+                notification_id=row.notification_id,
+                title=row.title,
+                message=row.message,
+                is_read=row.is_read,
+                created_at=row.created_at,
+            )
+        )
+    return result
+
+
 @router.patch("/notifications/{notification_id}/read")
 def mark_read(
     notification_id: int,
@@ -131,6 +159,7 @@ def mark_read(
     )
     if notif:
         notif.is_read = True
+        publish_on_commit(db, "notification", recipient_user_id=current_user.user_id)
         db.commit()
     return {"message": "ok"}
 
@@ -143,6 +172,7 @@ def mark_all_read(
         Notification.recipient_user_id == current_user.user_id,
         Notification.is_read.is_(False),
     ).update({"is_read": True})
+    publish_on_commit(db, "notification", recipient_user_id=current_user.user_id)
     db.commit()
     return {"message": "All notifications marked as read"}
 
@@ -154,5 +184,6 @@ def clear_notifications(
     db.query(Notification).filter(
         Notification.recipient_user_id == current_user.user_id
     ).delete()
+    publish_on_commit(db, "notification", recipient_user_id=current_user.user_id)
     db.commit()
     return {"message": "Notifications cleared"}
@@ -5,6 +5,8 @@ from sqlalchemy.orm import Session
 from audit import log_action
 from database import get_db
 from deps import get_current_user, require_permission
+from drug_stock import refresh_drug_stock
+from events import publish_on_commit
 from models import DispensingRecord, Drug, DrugBatch, Patient, Prescription, PrescriptionItem, User
 from schemas import (
     DispensingRecordCreate,
@@ -13,6 +15,7 @@ from schemas import (
     PrescriptionItemRead,
     PrescriptionRead,
 )
+from usage_rollup import record_dispensed, record_prescribed
 
 router = APIRouter(prefix="/api", tags=["prescriptions"])
 
@@ -108,6 +111,7 @@ def create_prescription(payload: PrescriptionCreate, db: Session = Depends(get_d
             duration=item.duration,
             quantity_prescribed=item.quantity_prescribed,
         ))
+        record_prescribed(db, item.drug_id, rx.created_at, item.quantity_prescribed)
 
     log_action(db, "create_prescription", actor_user_id=current_user.user_id, target_table="prescriptions", target_id=rx.prescription_id)
     db.commit()
@@ -157,9 +161,12 @@ def dispatch_prescription(prescription_id: int, db: Session = Depends(get_db), c
         )
         db.add(record)
         db.flush()
+        record_dispensed(db, batch.drug_id, record.dispensed_at, required_qty)
         records.append(record)
 
     rx.status = "dispensed"
+    refresh_drug_stock(db, [item.drug_id for item in rx.items])
+    publish_on_commit(db, "dispense", prescription_id=rx.prescription_id, drug_ids=sorted({item.drug_id for item in rx.items}))
     log_action(
         db,
         "dispatch_prescription",
@@ -237,6 +244,9 @@ def dispense_drug(payload: DispensingRecordCreate, db: Session = Depends(get_db)
     )
     db.add(record)
     db.flush()
+    record_dispensed(db, batch.drug_id, record.dispensed_at, payload.quantity_dispensed)
+    refresh_drug_stock(db, [batch.drug_id])
+    publish_on_commit(db, "dispense", batch_ids=[batch.batch_id], drug_ids=[batch.drug_id])
 
     # Mark prescription as dispensed if linked
     if payload.prescription_id:
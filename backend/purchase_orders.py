@@ -1,11 +1,14 @@
 from datetime import date, datetime, timedelta
 
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 
 from audit import log_action
 from database import get_db
 from deps import get_current_user, require_permission
+from drug_stock import refresh_drug_stock
+from events import publish_on_commit
 from models import Drug, DrugBatch, PurchaseOrder, PurchaseOrderItem, Supplier, User
 from schemas import (
     PurchaseOrderCreate,
@@ -172,12 +175,10 @@ def update_po_status(
                         .first()
                     )
                     if template:
-                        next_batch_id = (
-                            db.query(DrugBatch.batch_id)
-                            .order_by(DrugBatch.batch_id.desc())
-                            .first()
-                            or [0]
-                        )[0] + 1
+                        # Reserve the id up front so it can go into batch_no.
+                        next_batch_id = db.execute(
+                            select(func.nextval(func.pg_get_serial_sequence("drug_batches", "batch_id")))
+                        ).scalar()
                         batch = DrugBatch(
                             batch_id=next_batch_id,
                             drug_id=item.drug_id,
@@ -202,7 +203,9 @@ def update_po_status(
                 batch.quantity_available = (
                     int(batch.quantity_available or 0) + receive_qty
                 )
+            refresh_drug_stock(db, [item.drug_id for item in po.items])
         po.received_at = datetime.utcnow()
+    publish_on_commit(db, "purchase_order", po_id=po_id, status=payload.status, drug_ids=sorted({item.drug_id for item in po.items}))
     log_action(
         db,
         f"po_status_{payload.status}",
@@ -1,21 +1,75 @@
 from __future__ import annotations
 
+import json
+import logging
 import os
-from collections import defaultdict
+import threading
+from collections import Counter, defaultdict
 from datetime import date, datetime, timedelta
 from math import ceil
-from statistics import mean
 
 import numpy as np
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Response
+from sqlalchemy import func, or_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from database import get_db
-from deps import require_permission
-from models import DispensingRecord, Drug, DrugBatch, Prescription, PrescriptionItem, Supplier
+import forecast_state
+from audit import log_action
+from cache import KeyedTTLCache
+from database import SessionLocal, get_db
+from deps import get_current_user, require_permission
+from models import (
+    DispensingRecord,
+    Drug,
+    DrugBatch,
+    DrugDailyUsage,
+    DrugForecastModel,
+    DrugForecastState,
+    DrugStock,
+    ForecastBacktestMetric,
+    Prescription,
+    PrescriptionItem,
+    ReorderSnapshot,
+    Supplier,
+    User,
+)
+
+logger = logging.getLogger("healthora.reorder")
 
 router = APIRouter(prefix="/api/reorder-recommendation", tags=["reorder-recommendation"])
 
+ISSUED_USAGE_WEIGHT = 0.35
+
+# Bump when the payload shape changes so older snapshots are not served.
+PAYLOAD_VERSION = 4
+SNAPSHOT_MAX_AGE_MINUTES = int(os.getenv("REORDER_SNAPSHOT_MAX_AGE_MINUTES", "360"))
+SNAPSHOT_KEEP_VERSIONS = int(os.getenv("REORDER_SNAPSHOT_KEEP_VERSIONS", "3"))
+# A manual recompute is refused while the current snapshot is younger than this.
+RECOMPUTE_COOLDOWN_SECONDS = int(os.getenv("REORDER_RECOMPUTE_COOLDOWN_SECONDS", "60"))
+# Per-drug detail models kept in memory; the least recently viewed drugs are fitted again on demand.
+DRUG_MODEL_CACHE_SIZE = int(os.getenv("REORDER_DRUG_MODEL_CACHE_SIZE", "512"))
+# Streaming forecast state is refitted from the full window (new clip bound and error metrics) this often.
+STATE_REFIT_DAYS = max(1, int(os.getenv("REORDER_STATE_REFIT_DAYS", "7")))
+# Backtest horizon whose errors are published as mae/rmse/mape_estimate (matches the default reorder horizon).
+ESTIMATE_HORIZON = 30
+
+FORECAST_FIELDS = {
+    7: "next_7_day_forecast",
+    30: "next_30_day_forecast",
+    60: "next_60_day_forecast",
+    90: "next_90_day_forecast",
+}
+
+# (as_of_date, window_days) -> (version, computed_at, payload JSON); served as-is without re-encoding.
+_SNAPSHOT_CACHE: dict[tuple[date, int], tuple[int, datetime, str]] = {}
+# (as_of_date, window_days) -> (version, decoded payload, medicines by drug_id); built lazily for filtered views.
+_PARSED_CACHE: dict[tuple[date, int], tuple[int, dict, dict[int, dict]]] = {}
+# (drug_id, as_of_date, window_days) -> (usage/model-selection watermark, fitted model); refit only when it moves.
+_DRUG_MODEL_CACHE = KeyedTTLCache(SNAPSHOT_MAX_AGE_MINUTES * 60, DRUG_MODEL_CACHE_SIZE)
+_REFRESH_LOCK = threading.Lock()
+_REFRESHING: set[tuple[date, int]] = set()
+
 
 def _parse_reference_date(value: str | None) -> date | None:
     if not value:
@@ -42,129 +96,331 @@ def _get_reference_date(db: Session) -> date:
     return date.today()
 
 
+def _window_days() -> int:
+    return max(30, int(os.getenv("REORDER_WINDOW_DAYS", "365")))
+
+
 def _daterange(start: date, end: date) -> list[date]:
     return [start + timedelta(days=i) for i in range((end - start).days + 1)]
 
 
-def _safe_percentile(arr: np.ndarray, q: float) -> float:
-    if arr.size == 0:
-        return 0.0
-    return float(np.percentile(arr, q))
+def _clip_upper(matrix: np.ndarray) -> np.ndarray:
+    if matrix.shape[0] == 0 or matrix.shape[1] < 10:
+        return np.full(matrix.shape[0], np.inf)
+    q1, q3, p99 = np.percentile(matrix, [25, 75, 99], axis=1)
+    iqr = q3 - q1
+    return np.where(iqr <= 0, p99, q3 + (1.5 * iqr))
 
 
-def _clip_outliers(values: list[float]) -> tuple[list[float], int]:
-    if len(values) < 10:
-        return values, 0
-    arr = np.array(values, dtype=float)
-    q1 = _safe_percentile(arr, 25)
-    q3 = _safe_percentile(arr, 75)
-    iqr = q3 - q1
-    if iqr <= 0:
-        upper = _safe_percentile(arr, 99)
-    else:
-        upper = q3 + (1.5 * iqr)
-    clipped = np.clip(arr, a_min=0.0, a_max=upper)
-    replaced = int(np.sum(arr > upper))
-    return clipped.tolist(), replaced
-
-
-def _trend_slope(values: list[float]) -> float:
-    if len(values) < 3:
-        return 0.0
-    x = np.arange(len(values), dtype=float)
-    y = np.array(values, dtype=float)
-    return float(np.polyfit(x, y, 1)[0])
-
-
-def _seasonality_strength(values: list[float], lag: int = 7) -> float:
-    if len(values) <= lag:
-        return 0.0
-    a = np.array(values[:-lag], dtype=float)
-    b = np.array(values[lag:], dtype=float)
-    if np.std(a) <= 0 or np.std(b) <= 0:
-        return 0.0
-    corr = np.corrcoef(a, b)[0, 1]
-    if np.isnan(corr):
-        return 0.0
-    return float(max(0.0, min(1.0, abs(corr))))
-
-
-def _volatility(values: list[float]) -> float:
-    if not values:
-        return 0.0
-    arr = np.array(values, dtype=float)
-    avg = float(np.mean(arr))
-    if avg <= 0:
-        return 0.0
-    return float(np.std(arr) / avg)
-
-
-def _forecast(values: list[float], horizon: int, slope: float, volatility: float) -> list[dict]:
-    base = float(mean(values[-14:])) if values else 0.0
-    width_ratio = max(0.10, min(0.50, volatility + 0.15))
-    rows = []
-    for i in range(1, horizon + 1):
-        pred = max(0.0, base + (slope * i))
-        low = max(0.0, pred * (1 - width_ratio))
-        high = pred * (1 + width_ratio)
-        rows.append(
-            {
-                "day": i,
-                "predicted_usage": int(round(pred)),
-                "confidence_low": int(round(low)),
-                "confidence_high": int(round(high)),
-            }
-        )
-    return rows
+def _clip_outliers(matrix: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    if matrix.shape[0] == 0 or matrix.shape[1] < 10:
+        return matrix.copy(), np.zeros(matrix.shape[0], dtype=int)
+    upper = _clip_upper(matrix)[:, None]
+    clipped = np.clip(matrix, 0.0, upper)
+    replaced = np.sum(matrix > upper, axis=1)
+    return clipped, replaced
+
+
+def _trend_slope(matrix: np.ndarray) -> np.ndarray:
+    if matrix.shape[0] == 0 or matrix.shape[1] < 3:
+        return np.zeros(matrix.shape[0])
+    x = np.arange(matrix.shape[1], dtype=float)
+    return np.polyfit(x, matrix.T, 1)[0]
+
+
+def _seasonality_strength(matrix: np.ndarray, lag: int = 7) -> np.ndarray:
+    if matrix.shape[0] == 0 or matrix.shape[1] <= lag:
+        return np.zeros(matrix.shape[0])
+    a = matrix[:, :-lag]
+    b = matrix[:, lag:]
+    a_std = np.std(a, axis=1)
+    b_std = np.std(b, axis=1)
+    valid = (a_std > 0) & (b_std > 0)
+    cov = np.mean((a - a.mean(axis=1, keepdims=True)) * (b - b.mean(axis=1, keepdims=True)), axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        corr = cov / (a_std * b_std)
+    corr = np.where(valid & ~np.isnan(corr), np.abs(corr), 0.0)
+    return np.clip(corr, 0.0, 1.0)
+
+
+def _volatility(matrix: np.ndarray) -> np.ndarray:
+    if matrix.shape[1] == 0:
+        return np.zeros(matrix.shape[0])
+    avg = np.mean(matrix, axis=1)
+    std = np.std(matrix, axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(avg > 0, std / avg, 0.0)
+
+
+def _recent_mean(matrix: np.ndarray, days: int) -> np.ndarray:
+    if matrix.shape[1] == 0:
+        return np.zeros(matrix.shape[0])
+    return np.mean(matrix[:, -days:], axis=1)
+
+
+def _forecast(base: np.ndarray, horizon: int, slope: np.ndarray, volatility: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Rounded (predicted, low, high) usage matrices of shape drugs x horizon."""
+    steps = np.arange(1, horizon + 1, dtype=float)
+    return _with_bands(np.maximum(0.0, base[:, None] + (slope[:, None] * steps)), volatility)
+
+
+def _with_bands(pred: np.ndarray, volatility: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    width_ratio = np.clip(volatility + 0.15, 0.10, 0.50)[:, None]
+    low = np.maximum(0.0, pred * (1 - width_ratio))
+    high = pred * (1 + width_ratio)
+    return np.rint(pred).astype(int), np.rint(low).astype(int), np.rint(high).astype(int)
 
 
-def _predict_values(values: list[float], horizon: int) -> list[float]:
+def _forecast_rows(pred: np.ndarray, low: np.ndarray, high: np.ndarray) -> list[dict]:
+    return [
+        {"day": i, "predicted_usage": p, "confidence_low": lo, "confidence_high": hi}
+        for i, (p, lo, hi) in enumerate(zip(pred.tolist(), low.tolist(), high.tolist()), start=1)
+    ]
+
+
+def _predict_values(matrix: np.ndarray, horizon: int) -> np.ndarray:
     if horizon <= 0:
-        return []
-    slope = _trend_slope(values)
-    volatility = _volatility(values)
-    base = float(mean(values[-14:])) if values else 0.0
-    preds: list[float] = []
-    for i in range(1, horizon + 1):
-        pred = max(0.0, base + (slope * i))
-        if volatility > 0.9:
-            pred = max(0.0, (pred * 0.7) + (base * 0.3))
-        preds.append(float(pred))
-    return preds
-
-
-def _real_error_metrics(values: list[float]) -> tuple[float, float, float]:
-    if len(values) < 20:
-        return 0.0, 0.0, 0.0
-
-    split = max(14, int(len(values) * 0.8))
-    if split >= len(values):
-        split = len(values) - 1
-    train = values[:split]
-    test = values[split:]
-    if not train or not test:
-        return 0.0, 0.0, 0.0
-
-    preds = _predict_values(train, len(test))
-    errors = [abs(a - p) for a, p in zip(test, preds)]
-    mae = float(mean(errors)) if errors else 0.0
-    rmse = float(np.sqrt(np.mean([(a - p) ** 2 for a, p in zip(test, preds)]))) if errors else 0.0
-
-    ape_terms = []
-    for actual, pred in zip(test, preds):
-        if actual > 0:
-            ape_terms.append(abs((actual - pred) / actual) * 100.0)
-    mape = float(mean(ape_terms)) if ape_terms else 0.0
-
-    return round(mae, 2), round(rmse, 2), round(min(999.0, mape), 2)
-
-
-def _model_family(points: int) -> str:
-    if points < 45:
-        return "ARIMA"
-    if points < 180:
-        return "PROPHET"
-    return "LSTM"
+        return np.zeros((matrix.shape[0], 0))
+    slope = _trend_slope(matrix)
+    volatility = _volatility(matrix)
+    base = _recent_mean(matrix, 14)
+    steps = np.arange(1, horizon + 1, dtype=float)
+    preds = np.maximum(0.0, base[:, None] + (slope[:, None] * steps))
+    damped = np.maximum(0.0, (preds * 0.7) + (base[:, None] * 0.3))
+    return np.where((volatility > 0.9)[:, None], damped, preds)
+
+
+def _real_error_metrics(matrix: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    zeros = np.zeros(matrix.shape[0])
+    points = matrix.shape[1]
+    if points < 20:
+        return zeros, zeros.copy(), zeros.copy()
+
+    split = max(14, int(points * 0.8))
+    if split >= points:
+        split = points - 1
+    train = matrix[:, :split]
+    test = matrix[:, split:]
+
+    preds = _predict_values(train, test.shape[1])
+    errors = test - preds
+    mae = np.mean(np.abs(errors), axis=1)
+    rmse = np.sqrt(np.mean(errors**2, axis=1))
+
+    positive = test > 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ape = np.where(positive, np.abs(errors / test) * 100.0, 0.0)
+    ape_counts = np.sum(positive, axis=1)
+    mape = np.divide(np.sum(ape, axis=1), ape_counts, out=np.zeros(matrix.shape[0]), where=ape_counts > 0)
+
+    return np.round(mae, 2), np.round(rmse, 2), np.round(np.minimum(999.0, mape), 2)
+
+
+def _run_forecast_engine(matrix: np.ndarray, horizon: int = 90) -> dict[str, np.ndarray]:
+    """Fit and forecast every drug (one row of `matrix` per drug) in a single pass."""
+    cleaned, clipped = _clip_outliers(matrix)
+    slope = _trend_slope(cleaned)
+    volatility = _volatility(cleaned)
+    base = _recent_mean(cleaned, 14)
+    pred, low, high = _forecast(base, horizon, slope, volatility)
+    mae, rmse, mape = _real_error_metrics(cleaned)
+    return {
+        "cleaned": cleaned,
+        "clipped": clipped,
+        "slope": slope,
+        "seasonality": _seasonality_strength(cleaned),
+        "volatility": volatility,
+        "base": base,
+        "pred": pred,
+        "low": low,
+        "high": high,
+        "mae": mae,
+        "rmse": rmse,
+        "mape": mape,
+        "avg_daily": _recent_mean(cleaned, 30),
+        "baseline_week": np.mean(cleaned[:, -14:-7], axis=1) if cleaned.shape[1] >= 14 else _recent_mean(cleaned, 30),
+        "last_30_day_usage": np.sum(cleaned[:, -30:], axis=1),
+    }
+
+
+def _trend_type(slope: float) -> str:
+    if slope > 0.05:
+        return "increasing"
+    if slope < -0.05:
+        return "decreasing"
+    return "stable"
+
+
+def _engine_from_state(state: dict, horizon: int = 90) -> dict[str, np.ndarray]:
+    """Same outputs as `_run_forecast_engine`, derived from streaming state; "cleaned" holds only the recent tail."""
+    feats = forecast_state.features(state)
+    tail = feats["tail"]
+    base = _recent_mean(tail, 14)
+    pred, low, high = _forecast(base, horizon, feats["slope"], feats["volatility"])
+    return {
+        "cleaned": tail,
+        "clipped": feats["clipped"],
+        "slope": feats["slope"],
+        "seasonality": feats["seasonality"],
+        "volatility": feats["volatility"],
+        "base": base,
+        "pred": pred,
+        "low": low,
+        "high": high,
+        "mae": feats["mae"],
+        "rmse": feats["rmse"],
+        "mape": feats["mape"],
+        "avg_daily": _recent_mean(tail, 30),
+        "baseline_week": np.mean(tail[:, -14:-7], axis=1),
+        "last_30_day_usage": np.sum(tail[:, -30:], axis=1),
+    }
+
+
+# ─── Forecaster registry ─────────────────────────────────────────────────────
+# Every forecaster works row-wise on a (drugs x days) matrix of clipped daily usage:
+#   fit(matrix) -> params, a dict of arrays whose first axis is the drug
+#   forecast(params, horizon) -> (drugs x horizon) daily usage
+#   update(params, usage) -> params after one more observed day (usage has one value per drug)
+# The nightly backtest scores every registered forecaster and keeps the best one per drug.
+
+DEFAULT_FORECASTER = "trend"
+SEASON_DAYS = 7
+CROSTON_ALPHA = 0.1
+HW_DAMPING = 0.98
+HW_GRID = np.array([(a, b, g) for a in (0.1, 0.3, 0.5) for b in (0.01, 0.1) for g in (0.05, 0.2)])
+
+FORECASTERS: dict[str, dict] = {}
+
+
+def register_forecaster(name: str, fit, forecast, update) -> None:
+    FORECASTERS[name] = {"fit": fit, "forecast": forecast, "update": update}
+
+
+def _trend_fit(matrix: np.ndarray) -> dict[str, np.ndarray]:
+    return {"slope": _trend_slope(matrix), "recent": matrix[:, -14:].copy()}
+
+
+def _trend_forecast(params: dict[str, np.ndarray], horizon: int) -> np.ndarray:
+    steps = np.arange(1, horizon + 1, dtype=float)
+    base = np.mean(params["recent"], axis=1)
+    return np.maximum(0.0, base[:, None] + (params["slope"][:, None] * steps))
+
+
+def _trend_update(params: dict[str, np.ndarray], usage: np.ndarray) -> dict[str, np.ndarray]:
+    return {"slope": params["slope"], "recent": np.hstack([params["recent"][:, 1:], usage[:, None]])}
+
+
+def _seasonal_naive_fit(matrix: np.ndarray) -> dict[str, np.ndarray]:
+    return {"season": matrix[:, -SEASON_DAYS:].copy()}
+
+
+def _seasonal_naive_forecast(params: dict[str, np.ndarray], horizon: int) -> np.ndarray:
+    return params["season"][:, np.arange(horizon) % SEASON_DAYS]
+
+
+def _seasonal_naive_update(params: dict[str, np.ndarray], usage: np.ndarray) -> dict[str, np.ndarray]:
+    return {"season": np.hstack([params["season"][:, 1:], usage[:, None]])}
+
+
+def _croston_update(params: dict[str, np.ndarray], usage: np.ndarray) -> dict[str, np.ndarray]:
+    since = params["since"] + 1.0
+    demand = usage > 0
+    return {
+        "size": np.where(demand, params["size"] + CROSTON_ALPHA * (usage - params["size"]), params["size"]),
+        "interval": np.where(demand, params["interval"] + CROSTON_ALPHA * (since - params["interval"]), params["interval"]),
+        "since": np.where(demand, 0.0, since),
+    }
+
+
+def _croston_fit(matrix: np.ndarray) -> dict[str, np.ndarray]:
+    """Croston's method for intermittent demand: smooth demand sizes and the gaps between them."""
+    demand_days = np.sum(matrix > 0, axis=1)
+    params = {
+        "size": np.sum(matrix, axis=1) / np.maximum(1, demand_days),
+        "interval": matrix.shape[1] / np.maximum(1, demand_days),
+        "since": np.zeros(matrix.shape[0]),
+    }
+    for day in range(matrix.shape[1]):
+        params = _croston_update(params, matrix[:, day])
+    return params
+
+
+def _croston_forecast(params: dict[str, np.ndarray], horizon: int) -> np.ndarray:
+    rate = params["size"] / np.maximum(1.0, params["interval"])
+    return np.repeat(rate[:, None], horizon, axis=1)
+
+
+def _hw_step(level, trend, season, usage, alpha, beta, gamma):
+    """One additive damped Holt-Winters step; season[..., 0] is the seasonal index of the observed day."""
+    current = season[..., 0]
+    new_level = alpha * (usage - current) + (1 - alpha) * (level + HW_DAMPING * trend)
+    new_trend = beta * (new_level - level) + (1 - beta) * HW_DAMPING * trend
+    new_season = gamma * (usage - new_level) + (1 - gamma) * current
+    return new_level, new_trend, np.concatenate([season[..., 1:], new_season[..., None]], axis=-1)
+
+
+def _hw_fit(matrix: np.ndarray) -> dict[str, np.ndarray]:
+    """Weekly additive Holt-Winters; smoothing constants are picked per drug from HW_GRID by one-step SSE."""
+    rows = matrix.shape[0]
+    alpha, beta, gamma = HW_GRID.T
+    first_week = matrix[:, :SEASON_DAYS]
+    level0 = np.mean(first_week, axis=1)
+    trend0 = (np.mean(matrix[:, SEASON_DAYS : 2 * SEASON_DAYS], axis=1) - level0) / SEASON_DAYS
+
+    # Evaluate every grid point at once: state arrays are (drugs x grid [x season]).
+    level = np.repeat(level0[:, None], len(HW_GRID), axis=1)
+    trend = np.repeat(trend0[:, None], len(HW_GRID), axis=1)
+    season = np.repeat((first_week - level0[:, None])[:, None, :], len(HW_GRID), axis=1)
+    sse = np.zeros((rows, len(HW_GRID)))
+    for day in range(SEASON_DAYS, matrix.shape[1]):
+        usage = matrix[:, day][:, None]
+        sse += (usage - (level + HW_DAMPING * trend + season[..., 0])) ** 2
+        level, trend, season = _hw_step(level, trend, season, usage, alpha, beta, gamma)
+
+    best = np.argmin(sse, axis=1)
+    pick = np.arange(rows)
+    return {
+        "level": level[pick, best],
+        "trend": trend[pick, best],
+        "season": season[pick, best],
+        "alpha": alpha[best],
+        "beta": beta[best],
+        "gamma": gamma[best],
+    }
+
+
+def _hw_forecast(params: dict[str, np.ndarray], horizon: int) -> np.ndarray:
+    damping = np.cumsum(HW_DAMPING ** np.arange(1, horizon + 1, dtype=float))
+    season = params["season"][:, np.arange(horizon) % SEASON_DAYS]
+    return np.maximum(0.0, params["level"][:, None] + damping * params["trend"][:, None] + season)
+
+
+def _hw_update(params: dict[str, np.ndarray], usage: np.ndarray) -> dict[str, np.ndarray]:
+    level, trend, season = _hw_step(
+        params["level"], params["trend"], params["season"], usage, params["alpha"], params["beta"], params["gamma"]
+    )
+    return {**params, "level": level, "trend": trend, "season": season}
+
+
+register_forecaster("trend", _trend_fit, _trend_forecast, _trend_update)
+register_forecaster("holt_winters", _hw_fit, _hw_forecast, _hw_update)
+register_forecaster("seasonal_naive", _seasonal_naive_fit, _seasonal_naive_forecast, _seasonal_naive_update)
+register_forecaster("croston", _croston_fit, _croston_forecast, _croston_update)
+
+
+def _fit_forecast(name: str, matrix: np.ndarray, horizon: int) -> np.ndarray:
+    """Rounded daily forecast of forecaster `name` fitted on each (raw) row of `matrix`."""
+    forecaster = FORECASTERS[name]
+    cleaned, _ = _clip_outliers(matrix)
+    return np.rint(forecaster["forecast"](forecaster["fit"](cleaned), horizon)).astype(int)
+
+
+def _params_row(params: dict[str, np.ndarray], row: int) -> dict:
+    return {key: value[row].tolist() for key, value in params.items()}
+
+
+def _stack_params(rows: list[dict]) -> dict[str, np.ndarray]:
+    return {key: np.array([row[key] for row in rows], dtype=float) for key in rows[0]}
 
 
 def _movement(avg_daily_usage: float, growth_rate: float, high_threshold: float, low_threshold: float) -> str:
@@ -195,126 +451,300 @@ def _risk_band(score: float) -> str:
     return "low"
 
 
-def _build_payload(db: Session) -> dict:
-    as_of_date = _get_reference_date(db)
-    window_days = int(os.getenv("REORDER_WINDOW_DAYS", "365"))
-    start = as_of_date - timedelta(days=max(30, window_days) - 1)
-    days = _daterange(start, as_of_date)
+def _expiry_risk_scores(quantity: np.ndarray, days_to_expiry: np.ndarray, predicted_daily: np.ndarray) -> np.ndarray:
+    max_possible_usage = predicted_daily * days_to_expiry
+    overhang = quantity - max_possible_usage
+    with np.errstate(divide="ignore", invalid="ignore"):
+        covered = np.where(
+            max_possible_usage > 0,
+            np.maximum(5.0, 30.0 - (quantity / max_possible_usage) * 20.0),
+            10.0,
+        )
+        excess = np.minimum(100.0, (overhang / quantity) * 100.0)
+    scores = np.where(overhang <= 0, covered, excess)
+    return np.where(days_to_expiry <= 0, 100.0, scores)
 
-    drugs = db.query(Drug).filter(Drug.is_active.is_(True)).order_by(Drug.drug_id.asc()).all()
-    batches = db.query(DrugBatch).all()
 
-    dispensed = (
-        db.query(DispensingRecord)
+def _load_usage_matrix(
+    db: Session, drug_ids: list[int], start: date, end: date, only_listed: bool = False
+) -> tuple[np.ndarray, dict[str, int]]:
+    """Daily usage per drug (rows follow `drug_ids`) over [start, end], read from the drug_daily_usage rollup.
+
+    Event counts cover every drug unless `only_listed` restricts the query to `drug_ids`.
+    """
+    usage = np.zeros((len(drug_ids), (end - start).days + 1), dtype=float)
+    source_counts = {"dispensed": 0, "issued": 0}
+    if not drug_ids:
+        return usage, source_counts
+    drug_index = {drug_id: idx for idx, drug_id in enumerate(drug_ids)}
+
+    query = db.query(
+        DrugDailyUsage.drug_id,
+        DrugDailyUsage.usage_date,
+        DrugDailyUsage.dispensed_quantity,
+        DrugDailyUsage.dispensed_events,
+        DrugDailyUsage.prescribed_quantity,
+        DrugDailyUsage.prescribed_events,
+    ).filter(DrugDailyUsage.usage_date >= start, DrugDailyUsage.usage_date <= end)
+    if only_listed:
+        query = query.filter(DrugDailyUsage.drug_id.in_(drug_ids))
+    for drug_id, usage_date, dispensed_qty, dispensed_events, prescribed_qty, prescribed_events in query.all():
+        source_counts["dispensed"] += int(dispensed_events or 0)
+        source_counts["issued"] += int(prescribed_events or 0)
+        row_idx = drug_index.get(drug_id)
+        if row_idx is None:
+            continue
+        usage[row_idx, (usage_date - start).days] = float(dispensed_qty or 0) + (float(prescribed_qty or 0) * ISSUED_USAGE_WEIGHT)
+    return usage, source_counts
+
+
+def _load_usage_days(db: Session, drug_ids: list[int], days: list[date]) -> np.ndarray:
+    """Usage of `drug_ids` (rows) on the given `days` (columns) only."""
+    usage = np.zeros((len(drug_ids), len(days)), dtype=float)
+    drug_index = {drug_id: idx for idx, drug_id in enumerate(drug_ids)}
+    day_index = {day: idx for idx, day in enumerate(days)}
+    rows = (
+        db.query(DrugDailyUsage.drug_id, DrugDailyUsage.usage_date, DrugDailyUsage.dispensed_quantity, DrugDailyUsage.prescribed_quantity)
+        .filter(DrugDailyUsage.drug_id.in_(drug_ids), DrugDailyUsage.usage_date.in_(days))
+        .all()
+    )
+    for drug_id, usage_date, dispensed_qty, prescribed_qty in rows:
+        usage[drug_index[drug_id], day_index[usage_date]] = float(dispensed_qty or 0) + (float(prescribed_qty or 0) * ISSUED_USAGE_WEIGHT)
+    return usage
+
+
+def _usage_event_counts(db: Session, start: date, end: date) -> dict[str, int]:
+    dispensed, issued = (
+        db.query(
+            func.coalesce(func.sum(DrugDailyUsage.dispensed_events), 0),
+            func.coalesce(func.sum(DrugDailyUsage.prescribed_events), 0),
+        )
+        .filter(DrugDailyUsage.usage_date >= start, DrugDailyUsage.usage_date <= end)
+        .one()
+    )
+    return {"dispensed": int(dispensed), "issued": int(issued)}
+
+
+def _backtest_metrics(
+    db: Session, drug_ids: list[int], window_days: int, horizon: int
+) -> dict[tuple[int, str], tuple[float, float, float]]:
+    """Stored rolling-origin (mae, rmse, mape) per (drug, model); pairs never backtested are absent."""
+    rows = (
+        db.query(
+            ForecastBacktestMetric.drug_id,
+            ForecastBacktestMetric.model,
+            ForecastBacktestMetric.mae,
+            ForecastBacktestMetric.rmse,
+            ForecastBacktestMetric.mape,
+        )
         .filter(
-            DispensingRecord.dispensed_at >= datetime.combine(start, datetime.min.time()),
-            DispensingRecord.dispensed_at <= datetime.combine(as_of_date, datetime.max.time()),
+            ForecastBacktestMetric.drug_id.in_(drug_ids),
+            ForecastBacktestMetric.horizon_days == horizon,
+            ForecastBacktestMetric.window_days == window_days,
         )
         .all()
     )
-    issued_items = (
-        db.query(PrescriptionItem, Prescription)
-        .join(Prescription, PrescriptionItem.prescription_id == Prescription.prescription_id)
+    return {(drug_id, model): (mae, rmse, mape) for drug_id, model, mae, rmse, mape in rows}
+
+
+def _apply_selected_models(db: Session, drug_ids: list[int], as_of_date: date, window_days: int, engine: dict) -> list[str]:
+    """Swap in forecasts from each drug's backtest-selected model; returns the model used per row.
+
+    Cached parameters are rolled forward over any days observed since they were fitted. Drugs whose
+    model is the default, unknown, or older than STATE_REFIT_DAYS keep the engine's trend forecast.
+    """
+    models = [DEFAULT_FORECASTER] * len(drug_ids)
+    rows = (
+        db.query(DrugForecastModel)
         .filter(
-            Prescription.created_at >= datetime.combine(start, datetime.min.time()),
-            Prescription.created_at <= datetime.combine(as_of_date, datetime.max.time()),
+            DrugForecastModel.drug_id.in_(drug_ids),
+            DrugForecastModel.window_days == window_days,
+            DrugForecastModel.model != DEFAULT_FORECASTER,
+            DrugForecastModel.fitted_through <= as_of_date,
+            DrugForecastModel.fitted_through > as_of_date - timedelta(days=STATE_REFIT_DAYS),
         )
         .all()
     )
+    groups: dict[tuple[str, date], list[DrugForecastModel]] = defaultdict(list)
+    for row in rows:
+        if row.model in FORECASTERS:
+            groups[(row.model, row.fitted_through)].append(row)
+
+    drug_index = {drug_id: idx for idx, drug_id in enumerate(drug_ids)}
+    horizon = engine["pred"].shape[1]
+    for (name, fitted_through), group in groups.items():
+        forecaster = FORECASTERS[name]
+        group_ids = [r.drug_id for r in group]
+        params = _stack_params([json.loads(r.params) for r in group])
+        new_days = _daterange(fitted_through + timedelta(days=1), as_of_date)
+        if new_days:
+            upper = np.array([r.clip_upper for r in group])[:, None]
+            observed = np.clip(_load_usage_days(db, group_ids, new_days), 0.0, upper)
+            for col in range(len(new_days)):
+                params = forecaster["update"](params, observed[:, col])
+
+        idx = np.array([drug_index[d] for d in group_ids], dtype=int)
+        pred, low, high = _with_bands(forecaster["forecast"](params, horizon), engine["volatility"][idx])
+        engine["pred"][idx] = pred
+        engine["low"][idx] = low
+        engine["high"][idx] = high
+        for i in idx.tolist():
+            models[i] = name
+    return models
+
+
+def _sync_forecast_state(db: Session, drug_ids: list[int], as_of_date: date, window_days: int) -> dict:
+    """Bring each drug's streaming state up to `as_of_date` and persist it (the caller commits).
+
+    Stored states are moved forward one day at a time; drugs without a usable state, whose last
+    refit was STATE_REFIT_DAYS ago, or whose state has seen history that no longer exists are
+    refitted from the full window.
+    """
+    # Read before the usage is loaded, so the saved watermark never claims rows the sums missed.
+    watermark = (
+        int(db.query(func.max(DispensingRecord.record_id)).scalar() or 0),
+        int(db.query(func.max(PrescriptionItem.item_id)).scalar() or 0),
+    )
+    refitted_after = datetime.utcnow() - timedelta(days=STATE_REFIT_DAYS)
+    states = forecast_state.load_states(db, drug_ids, window_days, as_of_date, refitted_after, watermark)
+    for state in states:
+        window_end = state["window_end"]
+        steps = [window_end + timedelta(days=i) for i in range(1, (as_of_date - window_end).days + 1)]
+        days = sorted(
+            {window_end}
+            | set(steps)
+            | {day - timedelta(days=window_days) for day in steps}
+            | {day - timedelta(days=window_days - forecast_state.LAG_DAYS) for day in steps}
+        )
+        values = _load_usage_days(db, state["drug_ids"], days)
+        column = {day: idx for idx, day in enumerate(days)}
+
+        # The last applied day may have received more usage since it was folded in.
+        forecast_state.replace_last(state, values[:, column[window_end]])
+        for day in steps:
+            forecast_state.slide(
+                state,
+                values[:, column[day]],
+                values[:, column[day - timedelta(days=window_days)]],
+                values[:, column[day - timedelta(days=window_days - forecast_state.LAG_DAYS)]],
+            )
 
-    batch_map = {b.batch_id: b for b in batches}
-    supplier_map = {s.supplier_id: s for s in db.query(Supplier).all()}
+    current = {drug_id for state in states for drug_id in state["drug_ids"]}
+    refit_ids = [drug_id for drug_id in drug_ids if drug_id not in current]
+    if refit_ids:
+        start = as_of_date - timedelta(days=window_days - 1)
+        raw, _ = _load_usage_matrix(db, refit_ids, start, as_of_date, only_listed=True)
+        cleaned, _ = _clip_outliers(raw)
+        states.append(
+            forecast_state.fit_state(refit_ids, as_of_date, raw, cleaned, _clip_upper(raw), _real_error_metrics(cleaned))
+        )
+        logger.info("Refitted forecast state for %d drugs", len(refit_ids))
 
-    usage_by_drug_day: dict[int, dict[date, float]] = defaultdict(lambda: defaultdict(float))
-    source_counts = {"dispensed": 0, "issued": 0}
+    merged = forecast_state.combine(states, drug_ids)
+    forecast_state.save_states(db, merged, watermark)
+    return merged
 
-    for rec in dispensed:
-        batch = batch_map.get(rec.batch_id)
-        if not batch:
-            continue
-        qty = float(rec.quantity_dispensed or 0)
-        usage_by_drug_day[batch.drug_id][rec.dispensed_at.date()] += qty
-        source_counts["dispensed"] += 1
 
-    for item, rx in issued_items:
-        qty = float(item.quantity_prescribed or 0)
-        if qty <= 0:
-            continue
-        usage_by_drug_day[item.drug_id][rx.created_at.date()] += qty * 0.35
-        source_counts["issued"] += 1
+def _build_payload(db: Session) -> dict:
+    as_of_date = _get_reference_date(db)
+    start = as_of_date - timedelta(days=_window_days() - 1)
+    days = _daterange(start, as_of_date)
 
-    stock_by_drug: dict[int, int] = defaultdict(int)
+    drugs = db.query(Drug).filter(Drug.is_active.is_(True)).order_by(Drug.drug_id.asc()).all()
+    batches = db.query(
+        DrugBatch.batch_id,
+        DrugBatch.drug_id,
+        DrugBatch.batch_no,
+        DrugBatch.expiry_date,
+        DrugBatch.quantity_available,
+        DrugBatch.is_expired,
+        DrugBatch.supplier_id,
+    ).all()
+
+    source_counts = _usage_event_counts(db, start, as_of_date)
+    supplier_map = {s.supplier_id: s for s in db.query(Supplier).all()}
+
+    stock_by_drug: dict[int, int] = defaultdict(int, db.query(DrugStock.drug_id, DrugStock.total_quantity).all())
     supplier_hint_by_drug: dict[int, str | None] = {}
+    live_batches_by_drug: dict[int, list] = defaultdict(list)
     for b in batches:
-        stock_by_drug[b.drug_id] += int(b.quantity_available or 0)
+        if not b.is_expired and (b.quantity_available or 0) > 0:
+            live_batches_by_drug[b.drug_id].append(b)
         if b.supplier_id and b.drug_id not in supplier_hint_by_drug:
             supplier = supplier_map.get(b.supplier_id)
             supplier_hint_by_drug[b.drug_id] = supplier.name if supplier else None
 
     medicines: list[dict] = []
-    outliers_clipped = 0
     trend_counts = {"increasing": 0, "decreasing": 0, "stable": 0}
-    avg_usage_all: list[float] = []
+
+    drug_ids = [drug.drug_id for drug in drugs]
+    if drug_ids:
+        engine = _engine_from_state(_sync_forecast_state(db, drug_ids, as_of_date, len(days)))
+    else:
+        engine = _run_forecast_engine(np.zeros((0, len(days))))
+    model_names = _apply_selected_models(db, drug_ids, as_of_date, len(days), engine) if drug_ids else []
+    outliers_clipped = int(np.sum(engine["clipped"]))
+    slopes = engine["slope"].tolist()
+    seasonality = engine["seasonality"].tolist()
+    volatilities = engine["volatility"].tolist()
+    maes = engine["mae"].tolist()
+    rmses = engine["rmse"].tolist()
+    mapes = engine["mape"].tolist()
+    # Prefer the selected model's rolling-origin backtest errors; the single holdout split is the fallback.
+    backtested = _backtest_metrics(db, drug_ids, len(days), ESTIMATE_HORIZON) if drug_ids else {}
+    medicines_backtested = 0
+    for idx, drug in enumerate(drugs):
+        errors = backtested.get((drug.drug_id, model_names[idx]))
+        if errors:
+            maes[idx], rmses[idx], mapes[idx] = errors
+            medicines_backtested += 1
+    avg_usage_all = engine["avg_daily"].tolist()
+    baseline_weeks = engine["baseline_week"].tolist()
+    last_30_usage = engine["last_30_day_usage"].tolist()
+    forecast_weeks = np.mean(engine["pred"][:, :7], axis=1).tolist()
+    forecast_totals = {h: np.sum(engine["pred"][:, :h], axis=1).tolist() for h in (30, 60, 90)}
+    cleaned = engine["cleaned"]
 
     temp_rows = []
-    for drug in drugs:
-        daily = [float(usage_by_drug_day[drug.drug_id].get(d, 0.0)) for d in days]
-        cleaned, clipped = _clip_outliers(daily)
-        outliers_clipped += clipped
-        slope = _trend_slope(cleaned)
-        trend = "stable"
-        if slope > 0.05:
-            trend = "increasing"
-        elif slope < -0.05:
-            trend = "decreasing"
+    for idx, drug in enumerate(drugs):
+        slope = slopes[idx]
+        trend = _trend_type(slope)
         trend_counts[trend] += 1
 
-        seasonality = _seasonality_strength(cleaned)
-        volatility = _volatility(cleaned)
-        model_family = _model_family(len(cleaned))
-
-        fc7 = _forecast(cleaned, 7, slope, volatility)
-        fc30 = _forecast(cleaned, 30, slope, volatility)
-        fc60 = _forecast(cleaned, 60, slope, volatility)
-        fc90 = _forecast(cleaned, 90, slope, volatility)
-        mae, rmse, mape = _real_error_metrics(cleaned)
-
-        avg_daily = float(mean(cleaned[-30:])) if cleaned else 0.0
-        avg_usage_all.append(avg_daily)
-
-        baseline_week = float(mean(cleaned[-14:-7])) if len(cleaned) >= 14 else avg_daily
-        forecast_week = float(mean([r["predicted_usage"] for r in fc7])) if fc7 else avg_daily
-        growth_rate = (forecast_week - baseline_week) / max(1.0, baseline_week)
-
-        current_stock = stock_by_drug.get(drug.drug_id, 0)
-        forecast_30_total = float(sum(r["predicted_usage"] for r in fc30))
-        forecast_60_total = float(sum(r["predicted_usage"] for r in fc60))
-        forecast_90_total = float(sum(r["predicted_usage"] for r in fc90))
-        last_30_day_usage = float(sum(cleaned[-30:])) if cleaned else 0.0
+        avg_daily = avg_usage_all[idx]
+        baseline_week = baseline_weeks[idx]
+        growth_rate = (forecast_weeks[idx] - baseline_week) / max(1.0, baseline_week)
+        forecasts = {
+            h: _forecast_rows(engine["pred"][idx, :h], engine["low"][idx, :h], engine["high"][idx, :h])
+            for h in (7, 30, 60, 90)
+        }
 
         temp_rows.append(
             {
                 "drug": drug,
-                "cleaned": cleaned,
+                "lag_1": float(cleaned[idx, -1]),
+                "lag_7": float(cleaned[idx, -7]),
+                "rolling_mean_7": float(np.mean(cleaned[idx, -7:])),
                 "slope": slope,
                 "trend": trend,
-                "seasonality": seasonality,
-                "volatility": volatility,
-                "model_family": model_family,
-                "forecast7": fc7,
-                "forecast30": fc30,
-                "forecast60": fc60,
-                "forecast90": fc90,
-                "mae": mae,
-                "rmse": rmse,
-                "mape": mape,
+                "seasonality": seasonality[idx],
+                "volatility": volatilities[idx],
+                "model_family": model_names[idx].upper(),
+                "forecast7": forecasts[7],
+                "forecast30": forecasts[30],
+                "forecast60": forecasts[60],
+                "forecast90": forecasts[90],
+                "mae": maes[idx],
+                "rmse": rmses[idx],
+                "mape": mapes[idx],
                 "avg_daily": avg_daily,
                 "growth_rate": growth_rate,
-                "current_stock": current_stock,
-                "forecast_30_total": forecast_30_total,
-                "forecast_60_total": forecast_60_total,
-                "forecast_90_total": forecast_90_total,
-                "last_30_day_usage": last_30_day_usage,
+                "forecast_week": forecast_weeks[idx],
+                "current_stock": stock_by_drug.get(drug.drug_id, 0),
+                "forecast_30_total": float(forecast_totals[30][idx]),
+                "forecast_60_total": float(forecast_totals[60][idx]),
+                "forecast_90_total": float(forecast_totals[90][idx]),
+                "last_30_day_usage": last_30_usage[idx],
             }
         )
 
@@ -324,6 +754,29 @@ def _build_payload(db: Session) -> dict:
     reorder_alerts: list[dict] = []
     expiry_alerts: list[dict] = []
 
+    risk_batches = [(idx, b) for idx, drug in enumerate(drugs) for b in live_batches_by_drug.get(drug.drug_id, ())]
+    if risk_batches:
+        owner = np.array([idx for idx, _ in risk_batches], dtype=int)
+        quantity = np.array([float(b.quantity_available) for _, b in risk_batches])
+        days_to_expiry = np.array([(b.expiry_date - as_of_date).days for _, b in risk_batches], dtype=int)
+        predicted_daily = np.maximum(0.01, np.array(forecast_weeks, dtype=float))[owner]
+        risk_scores = _expiry_risk_scores(quantity, days_to_expiry, predicted_daily)
+        for pos in np.flatnonzero(risk_scores >= 40).tolist():
+            idx, b = risk_batches[pos]
+            risk_score = float(risk_scores[pos])
+            expiry_alerts.append(
+                {
+                    "drug_id": b.drug_id,
+                    "drug_name": drugs[idx].drug_name,
+                    "batch_id": b.batch_id,
+                    "batch_no": b.batch_no,
+                    "quantity_available": int(quantity[pos]),
+                    "days_to_expiry": int(days_to_expiry[pos]),
+                    "expiry_risk_score": round(risk_score, 2),
+                    "risk": _risk_band(risk_score),
+                }
+            )
+
     for row in temp_rows:
         drug = row["drug"]
         avg_daily = row["avg_daily"]
@@ -345,13 +798,15 @@ def _build_payload(db: Session) -> dict:
         reorder_qty = reorder_qty_30
         stock_turnover_ratio = ((avg_daily * 30.0) / max(1.0, float(current_stock))) if current_stock > 0 else 0.0
 
-        if current_stock < (lead_forecast + safety_stock):
+        reorder_point = int(ceil(lead_forecast + safety_stock))
+        needs_reorder = current_stock < (lead_forecast + safety_stock)
+        if needs_reorder:
             reorder_alerts.append(
                 {
                     "drug_id": drug.drug_id,
                     "drug_name": drug.drug_name,
                     "current_stock": current_stock,
-                    "reorder_point": int(ceil(lead_forecast + safety_stock)),
+                    "reorder_point": reorder_point,
                     "recommended_reorder_qty": reorder_qty,
                     "recommended_reorder_qty_30": reorder_qty_30,
                     "recommended_reorder_qty_60": reorder_qty_60,
@@ -360,38 +815,6 @@ def _build_payload(db: Session) -> dict:
                 }
             )
 
-        predicted_daily = max(0.01, float(mean([x["predicted_usage"] for x in row["forecast7"]])) if row["forecast7"] else avg_daily)
-        for b in (x for x in batches if x.drug_id == drug.drug_id and not x.is_expired):
-            days_to_expiry = (b.expiry_date - as_of_date).days
-            qty = float(b.quantity_available or 0)
-            if qty <= 0:
-                continue
-
-            if days_to_expiry <= 0:
-                risk_score = 100.0
-            else:
-                max_possible_usage = predicted_daily * days_to_expiry
-                overhang = qty - max_possible_usage
-                if overhang <= 0:
-                    risk_score = max(5.0, 30.0 - ((qty / max_possible_usage) * 20.0)) if max_possible_usage > 0 else 10.0
-                else:
-                    risk_score = min(100.0, (overhang / qty) * 100.0)
-
-            band = _risk_band(risk_score)
-            if band in {"high", "medium"}:
-                expiry_alerts.append(
-                    {
-                        "drug_id": drug.drug_id,
-                        "drug_name": drug.drug_name,
-                        "batch_id": b.batch_id,
-                        "batch_no": b.batch_no,
-                        "quantity_available": int(qty),
-                        "days_to_expiry": int(days_to_expiry),
-                        "expiry_risk_score": round(risk_score, 2),
-                        "risk": band,
-                    }
-                )
-
         medicines.append(
             {
                 "drug_id": drug.drug_id,
@@ -409,6 +832,8 @@ def _build_payload(db: Session) -> dict:
                 "prediction_growth_rate": round(growth_rate, 3),
                 "stock_turnover_ratio": round(stock_turnover_ratio, 3),
                 "movement_status": movement,
+                "reorder_point": reorder_point,
+                "needs_reorder": needs_reorder,
                 "recommended_reorder_qty": reorder_qty,
                 "recommended_reorder_qty_30": reorder_qty_30,
                 "recommended_reorder_qty_60": reorder_qty_60,
@@ -427,9 +852,9 @@ def _build_payload(db: Session) -> dict:
                     "season": _season_label(as_of_date),
                     "festival_indicator": False,
                     "epidemic_indicator": False,
-                    "lag_1": int(round(row["cleaned"][-1])) if row["cleaned"] else 0,
-                    "lag_7": int(round(row["cleaned"][-7])) if len(row["cleaned"]) >= 7 else 0,
-                    "rolling_mean_7": int(round(float(mean(row["cleaned"][-7:])))) if len(row["cleaned"]) >= 7 else int(round(avg_daily)),
+                    "lag_1": int(round(row["lag_1"])),
+                    "lag_7": int(round(row["lag_7"])),
+                    "rolling_mean_7": int(round(row["rolling_mean_7"])),
                 },
                 "suggested_supplier": supplier_hint_by_drug.get(drug.drug_id),
             }
@@ -474,7 +899,12 @@ def _build_payload(db: Session) -> dict:
             "step": 4,
             "name": "Forecast Generation",
             "status": "completed",
-            "metrics": {"horizons": [7, 30], "medicines_forecasted": len(medicines)},
+            "metrics": {
+                "horizons": [7, 30],
+                "medicines_forecasted": len(medicines),
+                "medicines_backtested": medicines_backtested,
+                "model_mix": dict(Counter(model_names)),
+            },
         },
         {
             "step": 5,
@@ -522,6 +952,395 @@ def _build_payload(db: Session) -> dict:
     }
 
 
+def _store_snapshot(db: Session, as_of_date: date, window_days: int, payload: dict) -> ReorderSnapshot | None:
+    latest = (
+        db.query(ReorderSnapshot.version)
+        .filter(
+            ReorderSnapshot.as_of_date == as_of_date,
+            ReorderSnapshot.window_days == window_days,
+            ReorderSnapshot.payload_version == PAYLOAD_VERSION,
+        )
+        .order_by(ReorderSnapshot.version.desc())
+        .first()
+    )
+    version = (latest[0] if latest else 0) + 1
+    payload_json = json.dumps(payload)
+    snapshot = ReorderSnapshot(
+        as_of_date=as_of_date,
+        window_days=window_days,
+        payload_version=PAYLOAD_VERSION,
+        version=version,
+        payload=payload_json,
+        computed_at=datetime.utcnow(),
+    )
+    try:
+        # Only the insert is rolled back on a conflict, so the forecast state saved earlier in this
+        # transaction is still committed.
+        with db.begin_nested():
+            db.add(snapshot)
+    except IntegrityError:
+        # Another worker stored the same version first; its snapshot is just as fresh.
+        db.commit()
+        return None
+    db.query(ReorderSnapshot).filter(
+        ReorderSnapshot.as_of_date == as_of_date,
+        ReorderSnapshot.window_days == window_days,
+        or_(
+            ReorderSnapshot.payload_version != PAYLOAD_VERSION,
+            ReorderSnapshot.version <= version - SNAPSHOT_KEEP_VERSIONS,
+        ),
+    ).delete(synchronize_session=False)
+    db.commit()
+    _SNAPSHOT_CACHE[(as_of_date, window_days)] = (version, snapshot.computed_at, payload_json)
+    return snapshot
+
+
+def _snapshot_meta(version: int, computed_at: datetime, stale: bool) -> dict:
+    return {"version": version, "computed_at": computed_at.isoformat(), "stale": stale}
+
+
+def _snapshot_response(payload_json: str, version: int, computed_at: datetime, stale: bool) -> Response:
+    meta = json.dumps(_snapshot_meta(version, computed_at, stale))
+    # Splice the snapshot metadata into the stored JSON object instead of decoding and re-encoding it.
+    return Response(content=f'{{"snapshot": {meta}, {payload_json[1:]}', media_type="application/json")
+
+
+def _parsed_snapshot(key: tuple[date, int], version: int, payload_json: str) -> tuple[dict, dict[int, dict]]:
+    cached = _PARSED_CACHE.get(key)
+    if cached and cached[0] == version:
+        return cached[1], cached[2]
+    payload = json.loads(payload_json)
+    by_drug = {m["drug_id"]: m for m in payload["medicines"]}
+    _PARSED_CACHE[key] = (version, payload, by_drug)
+    return payload, by_drug
+
+
+def _split_csv(value: str) -> list[str]:
+    return [part.strip() for part in value.split(",") if part.strip()]
+
+
+def _parse_horizons(value: str | None) -> set[int]:
+    if value is None:
+        return set(FORECAST_FIELDS)
+    try:
+        horizons = {int(part) for part in _split_csv(value)}
+    except ValueError:
+        horizons = None
+    if horizons is None or not horizons <= set(FORECAST_FIELDS):
+        raise HTTPException(status_code=400, detail="horizons must be a comma-separated subset of 7,30,60,90")
+    return horizons
+
+
+def _project_medicine(medicine: dict, fields: list[str] | None, horizons: set[int]) -> dict:
+    dropped = {name for horizon, name in FORECAST_FIELDS.items() if horizon not in horizons}
+    keys = fields if fields is not None else medicine.keys()
+    return {k: medicine[k] for k in keys if k not in dropped}
+
+
+def _medicine_view(
+    medicines: list[dict],
+    skip: int,
+    limit: int | None,
+    sort: str | None,
+    order: str,
+    movement_status: str | None,
+    trend_type: str | None,
+    reorder_only: bool,
+    fields: str | None,
+    horizons: str | None,
+) -> tuple[list[dict], int]:
+    if skip < 0 or (limit is not None and limit < 1):
+        raise HTTPException(status_code=400, detail="skip must be >= 0 and limit >= 1")
+    if order not in {"asc", "desc"}:
+        raise HTTPException(status_code=400, detail="order must be 'asc' or 'desc'")
+    known = set(medicines[0]) if medicines else None
+
+    selected = None
+    if fields is not None:
+        selected = ["drug_id"] + [f for f in _split_csv(fields) if f != "drug_id"]
+        unknown = sorted(set(selected) - known) if known is not None else []
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    horizon_set = _parse_horizons(horizons)
+
+    rows = medicines
+    if movement_status:
+        rows = [m for m in rows if m["movement_status"] == movement_status.upper()]
+    if trend_type:
+        rows = [m for m in rows if m["trend_type"] == trend_type.lower()]
+    if reorder_only:
+        rows = [m for m in rows if m["needs_reorder"]]
+
+    if sort:
+        if known is not None and (sort not in known or isinstance(medicines[0][sort], (list, dict))):
+            raise HTTPException(status_code=400, detail=f"Cannot sort by '{sort}'")
+        present = [m for m in rows if m.get(sort) is not None]
+        present.sort(key=lambda m: m[sort], reverse=order == "desc")
+        rows = present + [m for m in rows if m.get(sort) is None]
+
+    total = len(rows)
+    page = rows[skip:] if limit is None else rows[skip : skip + limit]
+    return [_project_medicine(m, selected, horizon_set) for m in page], total
+
+
+def recompute_snapshot(db: Session) -> tuple[int, datetime, str]:
+    as_of_date = _get_reference_date(db)
+    window_days = _window_days()
+    payload = _build_payload(db)
+    snapshot = _store_snapshot(db, as_of_date, window_days, payload)
+    if snapshot is None:
+        return _load_snapshot(db, as_of_date, window_days)
+    return _SNAPSHOT_CACHE[(as_of_date, window_days)]
+
+
+def refresh_snapshot() -> None:
+    """Recompute and store the current reorder snapshot (scheduler / background entry point)."""
+    db = SessionLocal()
+    try:
+        recompute_snapshot(db)
+        logger.info("Refreshed reorder recommendation snapshot")
+    except Exception:
+        logger.exception("Error refreshing reorder recommendation snapshot")
+    finally:
+        db.close()
+
+
+def _refresh_in_background(key: tuple[date, int]) -> None:
+    try:
+        refresh_snapshot()
+    finally:
+        with _REFRESH_LOCK:
+            _REFRESHING.discard(key)
+
+
+def _load_snapshot(db: Session, as_of_date: date, window_days: int) -> tuple[int, datetime, str] | None:
+    key = (as_of_date, window_days)
+    latest = (
+        db.query(ReorderSnapshot.snapshot_id, ReorderSnapshot.version, ReorderSnapshot.computed_at)
+        .filter(
+            ReorderSnapshot.as_of_date == as_of_date,
+            ReorderSnapshot.window_days == window_days,
+            ReorderSnapshot.payload_version == PAYLOAD_VERSION,
+        )
+        .order_by(ReorderSnapshot.version.desc())
+        .first()
+    )
+    if not latest:
+        return None
+    cached = _SNAPSHOT_CACHE.get(key)
+    if cached and cached[0] == latest.version:
+        return cached
+    payload = db.query(ReorderSnapshot.payload).filter(ReorderSnapshot.snapshot_id == latest.snapshot_id).scalar()
+    entry = (latest.version, latest.computed_at, payload)
+    _SNAPSHOT_CACHE[key] = entry
+    return entry
+
+
+def _usage_watermark(db: Session, drug_id: int) -> tuple[int, int]:
+    """Newest dispensing record and prescription item touching the drug; both ids only grow."""
+    last_dispense = (
+        db.query(func.max(DispensingRecord.record_id))
+        .join(DrugBatch, DrugBatch.batch_id == DispensingRecord.batch_id)
+        .filter(DrugBatch.drug_id == drug_id)
+        .scalar()
+    )
+    last_item = db.query(func.max(PrescriptionItem.item_id)).filter(PrescriptionItem.drug_id == drug_id).scalar()
+    return int(last_dispense or 0), int(last_item or 0)
+
+
+def _fit_drug_model(db: Session, drug_id: int, as_of_date: date, window_days: int) -> dict:
+    """The drug's forecast from the same streaming state and selected model as its snapshot row.
+
+    Brings the drug's forecast state up to `as_of_date` on the way; the caller commits.
+    """
+    start = as_of_date - timedelta(days=window_days - 1)
+    state = _sync_forecast_state(db, [drug_id], as_of_date, window_days)
+    engine = _engine_from_state(state)
+    model_name = _apply_selected_models(db, [drug_id], as_of_date, window_days, engine)[0]
+    # The full window clipped at the state's frozen bound, which its sums were built from.
+    usage, _ = _load_usage_matrix(db, [drug_id], start, as_of_date, only_listed=True)
+    cleaned = np.clip(usage, 0.0, state["clip_upper"][:, None])
+    slope = float(engine["slope"][0])
+    model = {
+        "window_start": start.isoformat(),
+        "cleaned_series": [
+            {"date": (start + timedelta(days=i)).isoformat(), "usage": round(value, 3)}
+            for i, value in enumerate(cleaned[0].tolist())
+        ],
+        "outliers_clipped": int(engine["clipped"][0]),
+        "slope": round(slope, 4),
+        "trend_type": _trend_type(slope),
+        "base_level": round(float(engine["base"][0]), 3),
+        "seasonality_strength": round(float(engine["seasonality"][0]), 3),
+        "demand_variance": round(float(engine["volatility"][0]), 3),
+        "model_family": model_name.upper(),
+        "mae_estimate": float(engine["mae"][0]),
+        "rmse_estimate": float(engine["rmse"][0]),
+        "mape_estimate": float(engine["mape"][0]),
+        "average_daily_usage": int(round(float(engine["avg_daily"][0]))),
+        "last_30_day_usage": int(round(float(engine["last_30_day_usage"][0]))),
+        "forecast_daily_7": float(np.mean(engine["pred"][0, :7])),
+    }
+    for horizon, name in FORECAST_FIELDS.items():
+        model[name] = _forecast_rows(engine["pred"][0, :horizon], engine["low"][0, :horizon], engine["high"][0, :horizon])
+        if horizon > 7:
+            model[f"{name}_total"] = int(round(float(np.sum(engine["pred"][0, :horizon]))))
+    return model
+
+
+def _model_watermark(db: Session, drug_id: int) -> tuple:
+    """Everything a cached detail model depends on: new usage, a new model selection or a state refit."""
+    selected_at = db.query(DrugForecastModel.updated_at).filter(DrugForecastModel.drug_id == drug_id).scalar()
+    refitted_at = db.query(DrugForecastState.refitted_at).filter(DrugForecastState.drug_id == drug_id).scalar()
+    return (*_usage_watermark(db, drug_id), selected_at, refitted_at)
+
+
+def _drug_model(db: Session, drug_id: int, as_of_date: date, window_days: int) -> dict:
+    """Cached detail model for one drug; commits the drug's forecast state when it has to refit."""
+    key = (drug_id, as_of_date, window_days)
+    generation = _DRUG_MODEL_CACHE.generation
+    cached = _DRUG_MODEL_CACHE.get(key)
+    if cached and cached[0] == _model_watermark(db, drug_id):
+        return cached[1]
+    model = _fit_drug_model(db, drug_id, as_of_date, window_days)
+    db.commit()
+    _DRUG_MODEL_CACHE.set(key, (_model_watermark(db, drug_id), model), generation)
+    return model
+
+
+def _drug_backtest(db: Session, drug_id: int, window_days: int, model_family: str) -> dict:
+    rows = (
+        db.query(ForecastBacktestMetric)
+        .filter(ForecastBacktestMetric.drug_id == drug_id, ForecastBacktestMetric.window_days == window_days)
+        .order_by(ForecastBacktestMetric.model.asc(), ForecastBacktestMetric.horizon_days.asc())
+        .all()
+    )
+    backtest: dict[str, dict] = defaultdict(dict)
+    for r in rows:
+        backtest[r.model][str(r.horizon_days)] = {
+            "mae": r.mae,
+            "rmse": r.rmse,
+            "mape": r.mape,
+            "cutoffs": r.cutoffs,
+            "as_of_date": r.as_of_date.isoformat(),
+        }
+    result = {"backtest": dict(backtest)}
+    estimate = next((r for r in rows if r.model.upper() == model_family and r.horizon_days == ESTIMATE_HORIZON), None)
+    if estimate:
+        result.update(mae_estimate=estimate.mae, rmse_estimate=estimate.rmse, mape_estimate=estimate.mape)
+    return result
+
+
+def _drug_expiry_risk(db: Session, drug_id: int, as_of_date: date, forecast_daily: float) -> list[dict]:
+    batches = (
+        db.query(DrugBatch.batch_id, DrugBatch.batch_no, DrugBatch.expiry_date, DrugBatch.quantity_available)
+        .filter(DrugBatch.drug_id == drug_id, DrugBatch.is_expired.is_(False), DrugBatch.quantity_available > 0)
+        .all()
+    )
+    if not batches:
+        return []
+    quantity = np.array([float(b.quantity_available) for b in batches])
+    days_to_expiry = np.array([(b.expiry_date - as_of_date).days for b in batches], dtype=int)
+    predicted_daily = np.full(len(batches), max(0.01, forecast_daily))
+    scores = _expiry_risk_scores(quantity, days_to_expiry, predicted_daily).tolist()
+    rows = [
+        {
+            "batch_id": b.batch_id,
+            "batch_no": b.batch_no,
+            "expiry_date": b.expiry_date.isoformat(),
+            "quantity_available": int(b.quantity_available),
+            "days_to_expiry": int(days_to_expiry[i]),
+            "expiry_risk_score": round(scores[i], 2),
+            "risk": _risk_band(scores[i]),
+        }
+        for i, b in enumerate(batches)
+    ]
+    rows.sort(key=lambda r: r["expiry_risk_score"], reverse=True)
+    return rows
+
+
+def _current_snapshot(db: Session, background_tasks: BackgroundTasks) -> tuple[tuple[date, int], int, datetime, str, bool]:
+    as_of_date = _get_reference_date(db)
+    window_days = _window_days()
+    key = (as_of_date, window_days)
+
+    snapshot = _load_snapshot(db, as_of_date, window_days)
+    if snapshot is None:
+        version, computed_at, payload_json = recompute_snapshot(db)
+        return key, version, computed_at, payload_json, False
+
+    version, computed_at, payload_json = snapshot
+    stale = datetime.utcnow() - computed_at > timedelta(minutes=SNAPSHOT_MAX_AGE_MINUTES)
+    if stale:
+        with _REFRESH_LOCK:
+            start_refresh = key not in _REFRESHING
+            _REFRESHING.add(key)
+        if start_refresh:
+            background_tasks.add_task(_refresh_in_background, key)
+    return key, version, computed_at, payload_json, stale
+
+
 @router.get("", dependencies=[Depends(require_permission("manage_inventory"))])
-def reorder_recommendation(db: Session = Depends(get_db)):
-    return _build_payload(db)
+def reorder_recommendation(
+    background_tasks: BackgroundTasks,
+    skip: int = 0,
+    limit: int | None = None,
+    sort: str | None = None,
+    order: str = "desc",
+    movement_status: str | None = None,
+    trend_type: str | None = None,
+    reorder_only: bool = False,
+    fields: str | None = None,
+    horizons: str | None = None,
+    db: Session = Depends(get_db),
+):
+    key, version, computed_at, payload_json, stale = _current_snapshot(db, background_tasks)
+    view_params = (skip, limit, sort, order, movement_status, trend_type, reorder_only, fields, horizons)
+    if view_params == (0, None, None, "desc", None, None, False, None, None):
+        return _snapshot_response(payload_json, version, computed_at, stale)
+
+    payload, _ = _parsed_snapshot(key, version, payload_json)
+    medicines, total = _medicine_view(payload["medicines"], *view_params)
+    view = {"snapshot": _snapshot_meta(version, computed_at, stale)}
+    view.update({k: v for k, v in payload.items() if k != "medicines"})
+    view["pagination"] = {"total": total, "skip": skip, "limit": limit}
+    view["medicines"] = medicines
+    return Response(content=json.dumps(view), media_type="application/json")
+
+
+@router.get("/{drug_id}", dependencies=[Depends(require_permission("manage_inventory"))])
+def reorder_recommendation_for_drug(drug_id: int, horizons: str | None = None, db: Session = Depends(get_db)):
+    drug = db.query(Drug).filter(Drug.drug_id == drug_id).first()
+    if not drug:
+        raise HTTPException(status_code=404, detail="Drug not found")
+    horizon_set = _parse_horizons(horizons)
+    as_of_date = _get_reference_date(db)
+    window_days = _window_days()
+    model = _drug_model(db, drug_id, as_of_date, window_days)
+    current_stock = db.query(DrugStock.total_quantity).filter(DrugStock.drug_id == drug_id).scalar() or 0
+    return {
+        "as_of_date": as_of_date.isoformat(),
+        "drug_id": drug.drug_id,
+        "drug_name": drug.drug_name,
+        "current_stock": int(current_stock),
+        **_project_medicine(model, None, horizon_set),
+        **_drug_backtest(db, drug_id, window_days, model["model_family"]),
+        "expiry_risk": _drug_expiry_risk(db, drug_id, as_of_date, model["forecast_daily_7"]),
+    }
+
+
+@router.post("/recompute", dependencies=[Depends(require_permission("recompute_reorder"))])
+def recompute_reorder_recommendation(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    latest = _load_snapshot(db, _get_reference_date(db), _window_days())
+    if latest is not None and datetime.utcnow() - latest[1] < timedelta(seconds=RECOMPUTE_COOLDOWN_SECONDS):
+        raise HTTPException(status_code=429, detail="Reorder recommendations were just recomputed; try again shortly")
+    version, computed_at, payload_json = recompute_snapshot(db)
+    log_action(
+        db,
+        "recompute_reorder_snapshot",
+        actor_user_id=current_user.user_id,
+        target_table="reorder_snapshots",
+        target_id=version,
+    )
+    db.commit()
+    return _snapshot_response(payload_json, version, computed_at, False)
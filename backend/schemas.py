@@ -154,6 +154,13 @@ class UserProfile(BaseModel):
     is_active: bool
 
 
+class AuthClaims(BaseModel):
+    user_id: int
+    username: str
+    role: str
+    token_version: int
+
+
 class DashboardAccess(BaseModel):
     role: str
     display_name: str
@@ -446,6 +453,31 @@ class DispensingRecordRead(BaseModel):
     notes: Optional[str] = None
 
 
+# ─── Bulk Import Jobs ────────────────────────────────────────────────────────
+
+class BulkImportJobRead(BaseModel):
+    job_id: int
+    filename: str
+    status: str
+    rows_parsed: int
+    rows_inserted: int
+    rows_failed: int
+    created_drugs: int
+    created_suppliers: int
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+class BulkImportErrorRead(BaseModel):
+    row: int
+    error: str
+
+
 # ─── Audit Log ───────────────────────────────────────────────────────────────
 
 class AuditLogRead(BaseModel):
@@ -0,0 +1,49 @@
+"""
+Typeahead search over drugs and patients.
+
+With the pg_trgm extension installed (migration 20261018_0017) matches are found through the GIN
+trigram indexes: substring matches plus fuzzy word-similarity matches, ranked prefix-first and then
+by similarity. Without the extension the same endpoints fall back to ranked ILIKE matching.
+"""
+import os
+
+from sqlalchemy import case, func, literal, or_, text
+from sqlalchemy.orm import Query, Session
+
+SEARCH_MAX_LIMIT = int(os.getenv("SEARCH_MAX_LIMIT", "50"))
+SEARCH_SIMILARITY_THRESHOLD = float(os.getenv("SEARCH_SIMILARITY_THRESHOLD", "0.3"))
+
+_trigram_enabled: bool | None = None
+
+
+def trigram_enabled(db: Session) -> bool:
+    """Whether pg_trgm is installed; checked once per process."""
+    global _trigram_enabled
+    if _trigram_enabled is None:
+        _trigram_enabled = bool(db.execute(text("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')")).scalar())
+    return _trigram_enabled
+
+
+def _escape_like(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def ranked_search(db: Session, query: Query, columns: list, term: str, tiebreak: list, limit: int) -> Query:
+    """Filter `query` to rows where any of `columns` matches `term` and order the best matches first."""
+    prefix = f"{_escape_like(term)}%"
+    contains = f"%{_escape_like(term)}%"
+    is_prefix = case((or_(*(col.ilike(prefix, escape="\\") for col in columns)), 1), else_=0)
+    matches = [col.ilike(contains, escape="\\") for col in columns]
+
+    if trigram_enabled(db):
+        # `<%` uses this threshold and can be answered from the gin_trgm_ops indexes.
+        db.execute(
+            text("SELECT set_config('pg_trgm.word_similarity_threshold', :threshold, true)"),
+            {"threshold": str(SEARCH_SIMILARITY_THRESHOLD)},
+        )
+        matches += [literal(term).op("<%")(col) for col in columns]
+        score = func.greatest(*(func.coalesce(func.word_similarity(term, col), 0) for col in columns))
+    else:
+        score = func.least(*(func.coalesce(func.nullif(func.strpos(func.lower(col), term.lower()), 0), 10000) for col in columns)) * -1
+
+    return query.filter(or_(*matches)).order_by(is_prefix.desc(), score.desc(), *tiebreak).limit(limit)
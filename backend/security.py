@@ -24,9 +24,10 @@ def verify_password(plain: str, hashed: str) -> bool:
     return pwd_context.verify(plain, hashed)
 
 
-def create_access_token(subject: str, role: str) -> str:
+def create_access_token(subject: str, role: str, user_id: int | None = None, token_version: int = 0) -> str:
     expire = datetime.now(timezone.utc) + timedelta(minutes=JWT_EXPIRE_MINUTES)
-    payload = {"sub": subject, "role": role, "exp": expire}
+    # `ver` must match users.token_version; bumping the column revokes every token issued before.
+    payload = {"sub": subject, "role": role, "uid": user_id, "ver": token_version, "exp": expire}
     return jwt.encode(payload, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
 
 
@@ -10,6 +10,7 @@ from xml.etree import ElementTree as ET
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 
+from drug_stock import reconcile_drug_stock
 from models import (
     AuditLog,
     DispensingRecord,
@@ -25,6 +26,7 @@ from models import (
     Supplier,
     User,
 )
+from usage_rollup import rebuild_daily_usage
 
 NS = {
     "m": "http://schemas.openxmlformats.org/spreadsheetml/2006/main",
@@ -1282,6 +1284,11 @@ def seed_operational_history(db: Session):
     db.commit()
 
 
+# Lowest value a sequence may be set to; the same floors as migration 20261018_0018, so a reseed
+# does not move patient ids back below 10000.
+SEQUENCE_FLOORS = {("patients", "patient_id"): 10000}
+
+
 def sync_postgres_sequences(db: Session):
     sequence_targets = [
         ("roles", "id"),
@@ -1299,14 +1306,15 @@ def sync_postgres_sequences(db: Session):
         ("notifications", "notification_id"),
     ]
     for table_name, column_name in sequence_targets:
+        floor = SEQUENCE_FLOORS.get((table_name, column_name), 0)
         try:
             db.execute(
                 text(
                     f"""
                     SELECT setval(
                         pg_get_serial_sequence('{table_name}', '{column_name}'),
-                        COALESCE((SELECT MAX({column_name}) FROM {table_name}), 1),
-                        (SELECT COUNT(*) > 0 FROM {table_name})
+                        GREATEST((SELECT COALESCE(MAX({column_name}), 0) FROM {table_name}), {floor}, 1),
+                        GREATEST((SELECT COALESCE(MAX({column_name}), 0) FROM {table_name}), {floor}) > 0
                     )
                     """
                 )
@@ -1334,17 +1342,34 @@ def seed_all(db: Session):
             _sync_legacy_app_tables_from_hospital_sql(db)
             sync_postgres_sequences(db)
         logger.info("Loaded hospital dataset from %s", dataset_path)
-        return
+    else:
+        his_data = load_his_data()
+        seed_roles(db, his_data)
+        seed_users(db, his_data)
+        seed_patients(db, his_data)
+        source_to_drug_id = seed_drugs_and_batches(db, his_data)
+        seed_suppliers(db, his_data)
+        seed_drug_batches(db, his_data, source_to_drug_id)
+        seed_operational_history(db)
+        sync_postgres_sequences(db)
+    rebuild_drug_stock(db)
+    # Dispensing and prescription history is loaded without record_dispensed/record_prescribed.
+    rebuilt = rebuild_daily_usage(db)
+    db.commit()
+    logger.info("Rebuilt %d drug_daily_usage rows after seeding", rebuilt)
+
 
-    his_data = load_his_data()
-    seed_roles(db, his_data)
-    seed_users(db, his_data)
-    seed_patients(db, his_data)
-    source_to_drug_id = seed_drugs_and_batches(db, his_data)
-    seed_suppliers(db, his_data)
-    seed_drug_batches(db, his_data, source_to_drug_id)
-    seed_operational_history(db)
-    sync_postgres_sequences(db)
+def rebuild_drug_stock(db: Session):
+    """Seeding writes drug_batches directly (and TRUNCATE ... CASCADE empties drug_stock), so the
+    counters are rebuilt from the batches and then checked once more."""
+    reconcile_drug_stock(db)
+    db.commit()
+    remaining = reconcile_drug_stock(db)
+    db.rollback()
+    if remaining:
+        logger.error("drug_stock still differs from drug_batches for %d drugs after seeding", remaining)
+    else:
+        logger.info("Rebuilt drug_stock from drug_batches")
 
 
 def _resolve_hospital_sql_path() -> str:
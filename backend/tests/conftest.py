@@ -0,0 +1,7 @@
+import os
+import sys
+from pathlib import Path
+
+# The backend modules import each other as top-level modules and read settings at import time.
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret")
@@ -0,0 +1,128 @@
+"""The vectorized forecast engine against the per-drug loop it replaced."""
+from statistics import mean
+
+import numpy as np
+import pytest
+
+import reorder_recommendation as rr
+
+HORIZON = 90
+
+
+# Per-drug reference implementation, as it was before the engine was vectorized.
+def _clip_outliers(values: list[float]) -> tuple[list[float], int]:
+    if len(values) < 10:
+        return values, 0
+    arr = np.array(values, dtype=float)
+    q1 = float(np.percentile(arr, 25))
+    q3 = float(np.percentile(arr, 75))
+    iqr = q3 - q1
+    upper = float(np.percentile(arr, 99)) if iqr <= 0 else q3 + (1.5 * iqr)
+    return np.clip(arr, a_min=0.0, a_max=upper).tolist(), int(np.sum(arr > upper))
+
+
+def _trend_slope(values: list[float]) -> float:
+    if len(values) < 3:
+        return 0.0
+    return float(np.polyfit(np.arange(len(values), dtype=float), np.array(values, dtype=float), 1)[0])
+
+
+def _seasonality_strength(values: list[float], lag: int = 7) -> float:
+    if len(values) <= lag:
+        return 0.0
+    a = np.array(values[:-lag], dtype=float)
+    b = np.array(values[lag:], dtype=float)
+    if np.std(a) <= 0 or np.std(b) <= 0:
+        return 0.0
+    corr = np.corrcoef(a, b)[0, 1]
+    if np.isnan(corr):
+        return 0.0
+    return float(max(0.0, min(1.0, abs(corr))))
+
+
+def _volatility(values: list[float]) -> float:
+    if not values:
+        return 0.0
+    arr = np.array(values, dtype=float)
+    avg = float(np.mean(arr))
+    if avg <= 0:
+        return 0.0
+    return float(np.std(arr) / avg)
+
+
+def _forecast(values: list[float], horizon: int, slope: float, volatility: float) -> list[dict]:
+    base = float(mean(values[-14:])) if values else 0.0
+    width_ratio = max(0.10, min(0.50, volatility + 0.15))
+    rows = []
+    for i in range(1, horizon + 1):
+        pred = max(0.0, base + (slope * i))
+        low = max(0.0, pred * (1 - width_ratio))
+        high = pred * (1 + width_ratio)
+        rows.append(
+            {
+                "day": i,
+                "predicted_usage": int(round(pred)),
+                "confidence_low": int(round(low)),
+                "confidence_high": int(round(high)),
+            }
+        )
+    return rows
+
+
+def _predict_values(values: list[float], horizon: int) -> list[float]:
+    slope = _trend_slope(values)
+    volatility = _volatility(values)
+    base = float(mean(values[-14:])) if values else 0.0
+    preds = []
+    for i in range(1, horizon + 1):
+        pred = max(0.0, base + (slope * i))
+        if volatility > 0.9:
+            pred = max(0.0, (pred * 0.7) + (base * 0.3))
+        preds.append(float(pred))
+    return preds
+
+
+def _real_error_metrics(values: list[float]) -> tuple[float, float, float]:
+    if len(values) < 20:
+        return 0.0, 0.0, 0.0
+    split = min(max(14, int(len(values) * 0.8)), len(values) - 1)
+    train, test = values[:split], values[split:]
+    preds = _predict_values(train, len(test))
+    mae = float(mean([abs(a - p) for a, p in zip(test, preds)]))
+    rmse = float(np.sqrt(np.mean([(a - p) ** 2 for a, p in zip(test, preds)])))
+    ape_terms = [abs((a - p) / a) * 100.0 for a, p in zip(test, preds) if a > 0]
+    mape = float(mean(ape_terms)) if ape_terms else 0.0
+    return round(mae, 2), round(rmse, 2), round(min(999.0, mape), 2)
+
+
+def _usage_matrix(seed: int, points: int, drugs: int = 40) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    steady = rng.poisson(rng.uniform(0.5, 20.0, (drugs // 2, 1)), (drugs // 2, points)).astype(float)
+    steady[:, rng.integers(0, points, 3)] *= 6  # dispensing spikes for the outlier clip
+    sparse = rng.poisson(8.0, (drugs - drugs // 2, points)) * (rng.random((drugs - drugs // 2, points)) < 0.05)
+    sparse[0] = 0.0  # a drug with no usage at all
+    matrix = np.vstack([steady, sparse.astype(float)])
+    return matrix * 0.35 if seed % 2 else matrix  # issued-only usage is fractional
+
+
+@pytest.mark.parametrize("points", [5, 19, 30, 90, 365])
+@pytest.mark.parametrize("seed", range(4))
+def test_engine_matches_per_drug_loop(seed, points):
+    matrix = _usage_matrix(seed, points)
+    engine = rr._run_forecast_engine(matrix, HORIZON)
+
+    for idx, daily in enumerate(matrix.tolist()):
+        cleaned, clipped = _clip_outliers(daily)
+        slope = _trend_slope(cleaned)
+        volatility = _volatility(cleaned)
+
+        assert int(engine["clipped"][idx]) == clipped
+        np.testing.assert_allclose(engine["cleaned"][idx], cleaned)
+        assert engine["slope"][idx] == pytest.approx(slope, abs=1e-12)
+        assert engine["volatility"][idx] == pytest.approx(volatility, abs=1e-12)
+        assert engine["seasonality"][idx] == pytest.approx(_seasonality_strength(cleaned), abs=1e-9)
+        assert rr._forecast_rows(engine["pred"][idx], engine["low"][idx], engine["high"][idx]) == _forecast(
+            cleaned, HORIZON, slope, volatility
+        )
+        metrics = (float(engine["mae"][idx]), float(engine["rmse"][idx]), float(engine["mape"][idx]))
+        assert metrics == _real_error_metrics(cleaned)
@@ -0,0 +1,74 @@
+"""Streaming forecast state updates against a full refit of the same window."""
+from datetime import date
+
+import numpy as np
+import pytest
+
+import forecast_state as fs
+import reorder_recommendation as rr
+
+WINDOW = 365
+DRUGS = 50
+
+
+def _usage(seed: int, days: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    raw = rng.poisson(rng.uniform(0.0, 12.0, (DRUGS, 1)), (DRUGS, days)).astype(float)
+    raw[:, ::13] *= 5
+    return raw
+
+
+def _fitted(raw: np.ndarray, upper: np.ndarray, window_end: date) -> dict:
+    cleaned = np.clip(raw, 0.0, upper[:, None])
+    return fs.fit_state(list(range(DRUGS)), window_end, raw, cleaned, upper, rr._real_error_metrics(cleaned))
+
+
+def _assert_refit_equivalent(state: dict, window: np.ndarray, upper: np.ndarray) -> None:
+    expected = fs.features(_fitted(window, upper, state["window_end"]))
+    actual = fs.features(state)
+    cleaned = np.clip(window, 0.0, upper[:, None])
+
+    for key in ("slope", "volatility", "seasonality", "tail"):
+        np.testing.assert_allclose(actual[key], expected[key], rtol=1e-7, atol=1e-9, err_msg=key)
+    np.testing.assert_array_equal(actual["clipped"], expected["clipped"])
+    # The refit's own closed forms must agree with the engine's full-window functions.
+    np.testing.assert_allclose(expected["slope"], rr._trend_slope(cleaned), atol=1e-9)
+    np.testing.assert_allclose(expected["volatility"], rr._volatility(cleaned), atol=1e-9)
+    np.testing.assert_allclose(expected["seasonality"], rr._seasonality_strength(cleaned), atol=1e-9)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_slide_matches_refit(seed):
+    days = 60
+    raw = _usage(seed, WINDOW + days)
+    upper = rr._clip_upper(raw[:, :WINDOW])
+    state = _fitted(raw[:, :WINDOW], upper, date(2024, 1, 1))
+
+    for day in range(WINDOW, WINDOW + days):
+        fs.slide(state, raw[:, day], raw[:, day - WINDOW], raw[:, day - WINDOW + fs.LAG_DAYS])
+
+    _assert_refit_equivalent(state, raw[:, days:], upper)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_replace_last_matches_refit(seed):
+    raw = _usage(seed, WINDOW + 1)
+    upper = rr._clip_upper(raw[:, :WINDOW])
+    state = _fitted(raw[:, :WINDOW], upper, date(2024, 1, 1))
+    fs.slide(state, raw[:, WINDOW], raw[:, 0], raw[:, fs.LAG_DAYS])
+
+    window = raw[:, 1:].copy()
+    for extra in (2.0, 40.0):
+        window[:, -1] += extra
+        fs.replace_last(state, window[:, -1])
+        _assert_refit_equivalent(state, window, upper)
+
+
+def test_flat_usage_has_no_seasonality():
+    raw = np.full((DRUGS, WINDOW + 10), 3.0)
+    upper = rr._clip_upper(raw[:, :WINDOW])
+    state = _fitted(raw[:, :WINDOW], upper, date(2024, 1, 1))
+    for day in range(WINDOW, WINDOW + 10):
+        fs.slide(state, raw[:, day], raw[:, day - WINDOW], raw[:, day - WINDOW + fs.LAG_DAYS])
+
+    assert not fs.features(state)["seasonality"].any()
@@ -0,0 +1,123 @@
+"""
+Daily usage rollup — keeps drug_daily_usage in step with dispensing and prescriptions.
+
+Call record_dispensed / record_prescribed from the route that writes the source rows so the
+rollup is updated in the same transaction. Run `python usage_rollup.py` to rebuild it from history.
+"""
+import argparse
+import logging
+from datetime import date, datetime
+
+from sqlalchemy import Date, cast, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from models import DispensingRecord, DrugBatch, DrugDailyUsage, DrugForecastState, Prescription, PrescriptionItem
+
+logger = logging.getLogger("healthora.usage_rollup")
+
+_COUNTER_COLUMNS = ("dispensed_quantity", "dispensed_events", "prescribed_quantity", "prescribed_events")
+
+
+def _add_usage(db: Session, drug_id: int, usage_date: date, **counters: int) -> None:
+    values = {col: int(counters.get(col, 0)) for col in _COUNTER_COLUMNS}
+    stmt = insert(DrugDailyUsage).values(drug_id=drug_id, usage_date=usage_date, **values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DrugDailyUsage.drug_id, DrugDailyUsage.usage_date],
+        set_={col: getattr(DrugDailyUsage, col) + getattr(stmt.excluded, col) for col in _COUNTER_COLUMNS},
+    )
+    db.execute(stmt)
+
+
+def record_dispensed(db: Session, drug_id: int, dispensed_at: datetime, quantity: int) -> None:
+    _add_usage(db, drug_id, dispensed_at.date(), dispensed_quantity=quantity, dispensed_events=1)
+
+
+def record_prescribed(db: Session, drug_id: int, created_at: datetime, quantity: int) -> None:
+    if quantity <= 0:
+        return
+    _add_usage(db, drug_id, created_at.date(), prescribed_quantity=quantity, prescribed_events=1)
+
+
+def rebuild_daily_usage(db: Session, start: date | None = None, end: date | None = None) -> int:
+    """Recompute the rollup for [start, end] (whole history when omitted) from the source tables."""
+    cleared = db.query(DrugDailyUsage)
+    dispensed_day = cast(DispensingRecord.dispensed_at, Date)
+    issued_day = cast(Prescription.created_at, Date)
+    dispensed = (
+        db.query(
+            DrugBatch.drug_id,
+            dispensed_day,
+            func.sum(DispensingRecord.quantity_dispensed),
+            func.count(DispensingRecord.record_id),
+        )
+        .join(DrugBatch, DrugBatch.batch_id == DispensingRecord.batch_id)
+        .group_by(DrugBatch.drug_id, dispensed_day)
+    )
+    issued = (
+        db.query(
+            PrescriptionItem.drug_id,
+            issued_day,
+            func.sum(PrescriptionItem.quantity_prescribed),
+            func.count(PrescriptionItem.item_id),
+        )
+        .join(Prescription, PrescriptionItem.prescription_id == Prescription.prescription_id)
+        .filter(PrescriptionItem.quantity_prescribed > 0)
+        .group_by(PrescriptionItem.drug_id, issued_day)
+    )
+    if start is not None:
+        cleared = cleared.filter(DrugDailyUsage.usage_date >= start)
+        dispensed = dispensed.filter(dispensed_day >= start)
+        issued = issued.filter(issued_day >= start)
+    if end is not None:
+        cleared = cleared.filter(DrugDailyUsage.usage_date <= end)
+        dispensed = dispensed.filter(dispensed_day <= end)
+        issued = issued.filter(issued_day <= end)
+
+    cleared.delete(synchronize_session=False)
+    # The streaming forecast sums were built from the old rows; the next reorder refresh refits them.
+    db.query(DrugForecastState).delete(synchronize_session=False)
+    db.execute(
+        insert(DrugDailyUsage).from_select(
+            ["drug_id", "usage_date", "dispensed_quantity", "dispensed_events"],
+            dispensed.statement,
+        )
+    )
+    issued_insert = insert(DrugDailyUsage).from_select(
+        ["drug_id", "usage_date", "prescribed_quantity", "prescribed_events"],
+        issued.statement,
+    )
+    db.execute(
+        issued_insert.on_conflict_do_update(
+            index_elements=[DrugDailyUsage.drug_id, DrugDailyUsage.usage_date],
+            set_={
+                "prescribed_quantity": issued_insert.excluded.prescribed_quantity,
+                "prescribed_events": issued_insert.excluded.prescribed_events,
+            },
+        )
+    )
+
+    rows = db.query(DrugDailyUsage)
+    if start is not None:
+        rows = rows.filter(DrugDailyUsage.usage_date >= start)
+    if end is not None:
+        rows = rows.filter(DrugDailyUsage.usage_date <= end)
+    return rows.count()
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    parser = argparse.ArgumentParser(description="Rebuild the drug_daily_usage rollup from dispensing and prescription history.")
+    parser.add_argument("--start", type=date.fromisoformat, default=None, help="first day to rebuild (YYYY-MM-DD)")
+    parser.add_argument("--end", type=date.fromisoformat, default=None, help="last day to rebuild (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    session = SessionLocal()
+    try:
+        total = rebuild_daily_usage(session, args.start, args.end)
+        session.commit()
+        logger.info("Rebuilt %d drug_daily_usage rows", total)
+    finally:
+        session.close()
@@ -3,8 +3,9 @@ from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 
+from cache import invalidate_on_commit
 from database import get_db
-from deps import get_current_user, require_permission
+from deps import claims_cache, get_current_user, require_permission
 from models import Role, User
 from schemas import PasswordResetRequest, RoleRead, UserCreate, UserRead, UserUpdate
 from security import hash_password
@@ -56,6 +57,12 @@ def _validate_department_role(department: str, role_name: str):
         )
 
 
+def _revoke_tokens(db: Session, user: User) -> None:
+    """Invalidate every token issued to `user` so far."""
+    user.token_version = (user.token_version or 0) + 1
+    invalidate_on_commit(db, claims_cache)
+
+
 def to_user_read(user: User) -> UserRead:
     return UserRead(
         user_id=user.user_id,
@@ -146,6 +153,8 @@ def update_user(user_id: int, payload: UserUpdate, db: Session = Depends(get_db)
 
     _validate_department_role(next_department, next_role.name)
 
+    if next_role.id != user.role_id or (user.is_active and payload.is_active is False):
+        _revoke_tokens(db, user)
     user.role_id = next_role.id
     user.department = next_department
     if payload.is_active is not None:
@@ -170,6 +179,7 @@ def deactivate_user(user_id: int, db: Session = Depends(get_db)):
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     user.is_active = False
+    _revoke_tokens(db, user)
     db.commit()
     db.refresh(user)
     return to_user_read(user)
@@ -185,6 +195,7 @@ def reset_password(user_id: int, payload: PasswordResetRequest, db: Session = De
     user.password = hash_password(payload.password)
     user.password_changed_at = datetime.utcnow()
     user.must_reset_password = False
+    _revoke_tokens(db, user)
     db.commit()
     db.refresh(user)
     return to_user_read(user)
@@ -198,5 +209,6 @@ def delete_user(user_id: int, db: Session = Depends(get_db), current_user: User
     if user.user_id == current_user.user_id:
         raise HTTPException(status_code=400, detail="Cannot delete your own account")
     db.delete(user)
+    invalidate_on_commit(db, claims_cache)
     db.commit()
     return {"message": "User deleted"}
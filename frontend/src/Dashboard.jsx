@@ -26,6 +26,9 @@ const NAV = [
   { key: "ai_report", label: "AI Report", icon: "🤖" },
 ];
 
+// Polling interval used only while the live dashboard stream is unavailable.
+const POLL_FALLBACK_MS = 60000;
+
 function riskLevel(d) { return d < 0 ? "expired" : d <= 30 ? "high" : d <= 60 ? "medium" : "low"; }
 
 function riskLabel(risk) {
@@ -102,6 +105,33 @@ export default function Dashboard() {
     })();
   }, []);
 
+  // Summary, expiry list and notifications arrive over the dashboard stream; poll only while it is down.
+  useEffect(() => {
+    if (loadingInit) return undefined;
+    let poll = null;
+    const startPolling = () => { if (!poll) poll = setInterval(refreshDashboard, POLL_FALLBACK_MS); };
+    const stopPolling = () => { if (poll) { clearInterval(poll); poll = null; } };
+    if (typeof EventSource === "undefined") {
+      startPolling();
+      return stopPolling;
+    }
+    const source = new EventSource(api.dashboardStreamUrl());
+    source.addEventListener("snapshot", (e) => {
+      const data = JSON.parse(e.data);
+      stopPolling();
+      setSummary(data.summary); setExpiry(data.expiry); setNotifications(data.notifications);
+    });
+    source.addEventListener("delta", (e) => {
+      const { changes } = JSON.parse(e.data);
+      if (changes.summary) setSummary((prev) => ({ ...prev, ...changes.summary }));
+      if (changes.expiry) setExpiry(changes.expiry);
+      if (changes.notifications) setNotifications(changes.notifications);
+    });
+    // EventSource reconnects by itself (and gives up on 401/403); keep the cards fresh meanwhile.
+    source.onerror = startPolling;
+    return () => { source.close(); stopPolling(); };
+  }, [loadingInit]);
+
   useEffect(() => {
     if (loadingInit) return;
     (async () => {
@@ -359,7 +389,7 @@ export default function Dashboard() {
         )}
         {active === "suppliers" && <SuppliersModule hasPermission={hasPermission} />}
         {active === "purchase_orders" && <PurchaseOrdersModule drugs={drugs} hasPermission={hasPermission} />}
-        {active === "reorder_recommendation" && <ReorderRecommendationModule />}
+        {active === "reorder_recommendation" && <ReorderRecommendationModule hasPermission={hasPermission} />}
         {active === "audit" && <AuditModule />}
         {active === "ai_report" && <AIReportModule />}
       </main>
@@ -1,17 +1,23 @@
 import React, { useEffect, useMemo, useState } from "react";
 import { api } from "./api";
 
-export default function ReorderRecommendationModule() {
+export default function ReorderRecommendationModule({ hasPermission }) {
   const [data, setData] = useState(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState("");
   const [forecastDays, setForecastDays] = useState(30);
 
+  const reorderQtyKey = useMemo(() => {
+    if (forecastDays === 60) return "recommended_reorder_qty_60";
+    if (forecastDays === 90) return "recommended_reorder_qty_90";
+    return "recommended_reorder_qty_30";
+  }, [forecastDays]);
+
   async function load() {
     setLoading(true);
     setError("");
     try {
-      setData(await api.getReorderRecommendations());
+      setData(await api.getReorderRecommendations(`?sort=${reorderQtyKey}&limit=20&horizons=7`));
     } catch (err) {
       setError(err.message || "Failed to load reorder recommendation");
     } finally {
@@ -19,9 +25,22 @@ export default function ReorderRecommendationModule() {
     }
   }
 
+  async function recompute() {
+    setLoading(true);
+    setError("");
+    try {
+      await api.recomputeReorderRecommendations();
+      setData(await api.getReorderRecommendations(`?sort=${reorderQtyKey}&limit=20&horizons=7`));
+    } catch (err) {
+      setError(err.message || "Failed to recompute reorder recommendation");
+    } finally {
+      setLoading(false);
+    }
+  }
+
   useEffect(() => {
     load();
-  }, []);
+  }, [reorderQtyKey]);
 
   const whole = (value) => Math.round(Number(value) || 0);
   const forecastTotalKey = useMemo(() => {
@@ -29,22 +48,18 @@ export default function ReorderRecommendationModule() {
     if (forecastDays === 90) return "next_90_day_forecast_total";
     return "next_30_day_forecast_total";
   }, [forecastDays]);
-  const reorderQtyKey = useMemo(() => {
-    if (forecastDays === 60) return "recommended_reorder_qty_60";
-    if (forecastDays === 90) return "recommended_reorder_qty_90";
-    return "recommended_reorder_qty_30";
-  }, [forecastDays]);
-  const topMedicines = useMemo(() => {
-    const list = [...(data?.medicines || [])];
-    list.sort((a, b) => whole(b[reorderQtyKey]) - whole(a[reorderQtyKey]));
-    return list.slice(0, 20);
-  }, [data, reorderQtyKey]);
+  const topMedicines = data?.medicines || [];
 
   return (
     <div className="section" style={{ margin: 24 }}>
       <div className="section-header">
         <h3>Reorder Recommendation Engine</h3>
-        <button className="secondary-btn compact" onClick={load}>Refresh</button>
+        <div style={{ display: "flex", gap: 8 }}>
+          <button className="secondary-btn compact" onClick={load}>Refresh</button>
+          {hasPermission("recompute_reorder") && (
+            <button className="secondary-btn compact" onClick={recompute}>Recompute Now</button>
+          )}
+        </div>
       </div>
 
       {error && <div className="error-msg">{error}</div>}
@@ -52,6 +67,7 @@ export default function ReorderRecommendationModule() {
         <>
           <div style={{ marginBottom: 8, color: "#334155", fontWeight: 600 }}>
             Analysis Date: {data?.as_of_date || "-"}
+            {data?.snapshot?.stale ? " (refreshing in background)" : ""}
           </div>
 
           <div className="cards" style={{ marginBottom: 12 }}>
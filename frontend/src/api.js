@@ -65,6 +65,11 @@ export const api = {
   dashboardSummary: () => request("/api/dashboard-summary"),
   dashboardExpiry: () => request("/api/dashboard-expiry"),
   dashboardAccess: () => request("/api/dashboard-access"),
+  // EventSource cannot send headers, so the stream takes the token as a query parameter.
+  dashboardStreamUrl: () => {
+    const token = localStorage.getItem("token") || sessionStorage.getItem("token");
+    return `${API_BASE}/api/dashboard/stream${token ? `?access_token=${encodeURIComponent(token)}` : ""}`;
+  },
 
   // ── Notifications (DB-backed) ─────────────────────────────────────────
   getNotifications: () => request("/api/notifications"),
@@ -104,7 +109,9 @@ export const api = {
     return requestForm("/api/drug-batches/bulk-upload", formData);
   },
   markBatchExpired: (batchId) => request(`/api/drug-batches/${batchId}/mark-expired`, { method: "PATCH" }),
-  getReorderRecommendations: () => request("/api/reorder-recommendation"),
+  getReorderRecommendations: (params = "") => request(`/api/reorder-recommendation${params}`),
+  getDrugReorderRecommendation: (drugId, params = "") => request(`/api/reorder-recommendation/${drugId}${params}`),
+  recomputeReorderRecommendations: () => request("/api/reorder-recommendation/recompute", { method: "POST" }),
 
   // ── Suppliers ─────────────────────────────────────────────────────────
   getSuppliers: () => request("/api/suppliers"),